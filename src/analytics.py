@@ -0,0 +1,472 @@
+"""Columnar usage analytics.
+
+One row per message, kept as parallel NumPy columns rather than dicts:
+
+    chat       int32    code into the chat id dictionary
+    index      int32    message index within the chat
+    role       int8     code into ROLES, -1 for anything else
+    timestamp  float64  epoch seconds
+    chars      int32    content length
+    model      int16    code into the model dictionary, -1 if unknown
+    latency    float32  seconds from request to finished reply, NaN if unknown
+    ttft       float32  seconds to the first streamed token, NaN if unknown
+
+Model and timings are only known for replies generated while recording;
+rows backfilled from existing chats carry the message facts alone.
+
+On disk, ``usage_analytics/`` holds ``dictionary.json`` (chat ids, model
+names, deleted chats), ``table.npz`` and one ``segment-<n>.npz`` per flush
+of new rows, so recording a message never rewrites the table. Segments are
+merged into the table once there are MAX_SEGMENTS of them; the table names
+the last segment it contains, so a crash mid-merge cannot count rows twice.
+Deleted chats are masked out at query time and dropped by the merge.
+
+The directory has a single writer: the GUI when it runs standalone, or the
+engine when windows share one (they record through engine.RemoteUsage).
+
+``summary`` computes every aggregate with whole-column operations (masks,
+bincount, percentile), which takes milliseconds for millions of rows.
+"""
+import json
+import time
+import queue
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('QuantumChat.Analytics')
+
+ROLES = ('user', 'assistant', 'system')
+ASSISTANT = ROLES.index('assistant')
+
+COLUMNS = {
+    'chat': np.int32,
+    'index': np.int32,
+    'role': np.int8,
+    'timestamp': np.float64,
+    'chars': np.int32,
+    'model': np.int16,
+    'latency': np.float32,
+    'ttft': np.float32
+}
+
+
+class UsageTable:
+    """Per-message facts in growable NumPy columns, persisted as .npz segments"""
+
+    DICTIONARY_FILE = 'dictionary.json'
+    TABLE_FILE = 'table.npz'
+    MAX_SEGMENTS = 32
+
+    def __init__(self, analytics_dir: str = 'usage_analytics'):
+        self.dir = Path(analytics_dir)
+        self.dir.mkdir(exist_ok=True)
+        self.chat_ids: List[str] = []
+        self.models: List[str] = []
+        self.removed = set()
+        self._chat_codes: Dict[str, int] = {}
+        self._model_codes: Dict[str, int] = {}
+        self._columns = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.count = 0
+        self.flushed = 0
+        self.chat_counts: Dict[str, int] = {}
+        self._segment = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    # Persistence
+
+    def _segment_path(self, number: int) -> Path:
+        return self.dir / f"segment-{number:06d}.npz"
+
+    def _segments(self) -> List[Path]:
+        return sorted(self.dir.glob('segment-*.npz'))
+
+    @staticmethod
+    def _segment_number(path: Path) -> int:
+        return int(path.stem.split('-', 1)[1])
+
+    def load(self) -> None:
+        try:
+            dictionary_path = self.dir / self.DICTIONARY_FILE
+            if not dictionary_path.exists():
+                return
+            with open(dictionary_path, 'r') as f:
+                dictionary = json.load(f)
+            self.chat_ids = dictionary.get('chats', [])
+            self.models = dictionary.get('models', [])
+            self._chat_codes = {chat_id: code for code, chat_id in enumerate(self.chat_ids)}
+            self._model_codes = {model: code for code, model in enumerate(self.models)}
+            self.removed = {self._chat_codes[chat_id] for chat_id in dictionary.get('removed', [])
+                            if chat_id in self._chat_codes}
+
+            parts = []
+            merged_through = -1
+            table_path = self.dir / self.TABLE_FILE
+            if table_path.exists():
+                with np.load(table_path) as table:
+                    merged_through = int(table['segments_through'])
+                    parts.append({name: table[name] for name in COLUMNS})
+            for path in self._segments():
+                number = self._segment_number(path)
+                self._segment = max(self._segment, number + 1)
+                if number <= merged_through:
+                    continue
+                with np.load(path) as segment:
+                    parts.append({name: segment[name] for name in COLUMNS})
+            self._segment = max(self._segment, merged_through + 1)
+
+            if parts:
+                self._columns = {
+                    name: np.concatenate([part[name] for part in parts]).astype(dtype, copy=False)
+                    for name, dtype in COLUMNS.items()
+                }
+                self.count = self.flushed = len(self._columns['chat'])
+                self._count_chats()
+            logger.info(f"Usage analytics loaded: {self.count} messages")
+        except Exception as e:
+            logger.error(f"Error loading usage analytics, starting empty: {str(e)}")
+            self.chat_ids, self.models, self.removed = [], [], set()
+            self._chat_codes, self._model_codes = {}, {}
+            self._columns = {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+            self.count = self.flushed = 0
+            self.chat_counts = {}
+
+    def _count_chats(self) -> None:
+        """Messages recorded per chat: one past the highest index seen"""
+        counts = np.zeros(len(self.chat_ids), dtype=np.int64)
+        np.maximum.at(counts, self._columns['chat'][:self.count], self._columns['index'][:self.count] + 1)
+        self.chat_counts = {
+            self.chat_ids[code]: int(count) for code, count in enumerate(counts)
+            if count and code not in self.removed
+        }
+
+    def _save_dictionary(self) -> None:
+        tmp_path = self.dir / f"{self.DICTIONARY_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'chats': self.chat_ids,
+                'models': self.models,
+                'removed': sorted(self.chat_ids[code] for code in self.removed)
+            }, f)
+        tmp_path.replace(self.dir / self.DICTIONARY_FILE)
+
+    @staticmethod
+    def _write_npz(path: Path, **arrays) -> None:
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        tmp_path.replace(path)
+
+    def flush(self) -> None:
+        """Write rows added since the last flush as a new segment"""
+        with self._lock:
+            if self.count == self.flushed:
+                return
+            rows = {name: column[self.flushed:self.count].copy() for name, column in self._columns.items()}
+            number = self._segment
+            self._segment += 1
+            # Codes in the segment must already be in the dictionary
+            self._save_dictionary()
+            flushed = self.count
+        try:
+            self._write_npz(self._segment_path(number), **rows)
+        except Exception as e:
+            logger.error(f"Error writing usage segment: {str(e)}")
+            return
+        with self._lock:
+            self.flushed = max(self.flushed, flushed)
+        if len(self._segments()) >= self.MAX_SEGMENTS:
+            self.compact()
+
+    def compact(self) -> None:
+        """Merge the table and every flushed segment, dropping deleted chats"""
+        with self._lock:
+            keep = self._live_mask(self.flushed)
+            columns = {name: column[:self.flushed][keep] for name, column in self._columns.items()}
+            through = self._segment - 1
+        try:
+            self._write_npz(self.dir / self.TABLE_FILE, segments_through=np.int64(through), **columns)
+        except Exception as e:
+            logger.error(f"Error compacting usage table: {str(e)}")
+            return
+        for path in self._segments():
+            if self._segment_number(path) <= through:
+                path.unlink()
+
+        with self._lock:
+            # Rows recorded meanwhile follow the merged ones
+            pending = {name: column[self.flushed:self.count] for name, column in self._columns.items()}
+            self._columns = {name: np.concatenate([columns[name], pending[name]]) for name in COLUMNS}
+            self.flushed = len(columns['chat'])
+            self.count = self.flushed + len(pending['chat'])
+        logger.info(f"Usage table compacted: {self.flushed} messages")
+
+    # Recording
+
+    def _code(self, codes: Dict[str, int], values: List[str], value: str) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, rows: List[Dict[str, Any]]) -> None:
+        """Add rows of chat_id, index, role, timestamp, chars and optional model, latency, ttft"""
+        if not rows:
+            return
+        with self._lock:
+            needed = self.count + len(rows)
+            if needed > len(self._columns['chat']):
+                # Double capacity so appends are amortized O(1)
+                capacity = max(needed, len(self._columns['chat']) * 2, 1024)
+                for name, column in self._columns.items():
+                    grown = np.zeros(capacity, dtype=column.dtype)
+                    grown[:self.count] = column[:self.count]
+                    self._columns[name] = grown
+
+            start = self.count
+            values = {name: [] for name in COLUMNS}
+            for row in rows:
+                chat_code = self._code(self._chat_codes, self.chat_ids, row['chat_id'])
+                self.removed.discard(chat_code)
+                values['chat'].append(chat_code)
+                values['index'].append(row['index'])
+                values['role'].append(ROLES.index(row['role']) if row['role'] in ROLES else -1)
+                values['timestamp'].append(row['timestamp'])
+                values['chars'].append(row['chars'])
+                model = row.get('model')
+                values['model'].append(self._code(self._model_codes, self.models, model) if model else -1)
+                latency, ttft = row.get('latency'), row.get('ttft')
+                values['latency'].append(np.nan if latency is None else latency)
+                values['ttft'].append(np.nan if ttft is None else ttft)
+                self.chat_counts[row['chat_id']] = max(self.chat_counts.get(row['chat_id'], 0), row['index'] + 1)
+            for name, dtype in COLUMNS.items():
+                self._columns[name][start:needed] = np.asarray(values[name], dtype=dtype)
+            self.count = needed
+
+    def remove_chat(self, chat_id: str) -> None:
+        with self._lock:
+            code = self._chat_codes.get(chat_id)
+            if code is None or code in self.removed:
+                return
+            self.removed.add(code)
+            self.chat_counts.pop(chat_id, None)
+            self._save_dictionary()
+
+    # Queries
+
+    def _live_mask(self, stop: int) -> np.ndarray:
+        chats = self._columns['chat'][:stop]
+        if not self.removed:
+            return np.ones(stop, dtype=bool)
+        return ~np.isin(chats, np.fromiter(self.removed, dtype=np.int32))
+
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """The live rows; appends only write past count, so slices stay valid"""
+        with self._lock:
+            keep = self._live_mask(self.count)
+            columns = {name: column[:self.count] for name, column in self._columns.items()}
+        if keep.all():
+            return columns
+        return {name: column[keep] for name, column in columns.items()}
+
+    def summary(self, days: int = 30, now: Optional[float] = None) -> Dict[str, Any]:
+        """Aggregates over the last `days` local calendar days"""
+        started = time.perf_counter()
+        columns = self.snapshot()
+        models = list(self.models)
+        now = time.time() if now is None else now
+        offset = datetime.fromtimestamp(now).astimezone().utcoffset().total_seconds()
+
+        first_day = int((now + offset) // 86400) - days + 1
+        # Narrow every column to the window once; the rest works on the slice
+        window = columns['timestamp'] >= first_day * 86400 - offset
+        columns = {name: column[window] for name, column in columns.items()}
+        day = np.floor((columns['timestamp'] + offset) / 86400).astype(np.int64) - first_day
+        replies = columns['role'] == ASSISTANT
+        reply_day = day[replies]
+
+        per_day = np.bincount(day, minlength=days)[:days]
+        replies_per_day = np.bincount(reply_day, minlength=days)[:days]
+
+        lengths = columns['chars'][replies]
+        latency = columns['latency'][replies]
+        ttft = columns['ttft'][replies]
+        timed = ~np.isnan(latency)
+
+        # Mean latency per day: sum and count of timed replies via bincount
+        latency_sum = np.bincount(reply_day[timed], weights=latency[timed], minlength=days)[:days]
+        latency_count = np.bincount(reply_day[timed], minlength=days)[:days]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            latency_by_day = latency_sum / latency_count
+
+        reply_models = columns['model'][replies]
+        known = reply_models >= 0
+        model_counts = np.bincount(reply_models[known], minlength=len(models))
+        model_usage = []
+        for code in np.flatnonzero(model_counts):
+            p50, p95 = percentiles(latency[timed & (reply_models == code)], (50, 95))
+            model_usage.append({
+                'model': models[code],
+                'replies': int(model_counts[code]),
+                'latency_p50': p50,
+                'latency_p95': p95
+            })
+        model_usage.sort(key=lambda usage: -usage['replies'])
+
+        # One partition per column for all of its percentiles
+        chars_p50, chars_p90, chars_p99 = percentiles(lengths, (50, 90, 99))
+        latency_p50, latency_p95 = percentiles(latency[timed], (50, 95))
+        ttft_p50, ttft_p95 = percentiles(ttft[~np.isnan(ttft)], (50, 95))
+
+        return {
+            'days': days,
+            'first_day': datetime.fromtimestamp(first_day * 86400 - offset).date().isoformat(),
+            'messages': int(day.size),
+            'replies': int(replies.sum()),
+            'chats': int(np.count_nonzero(np.bincount(columns['chat']))),
+            'messages_per_day': per_day.tolist(),
+            'replies_per_day': replies_per_day.tolist(),
+            'reply_chars': {
+                'mean': float(lengths.mean()) if lengths.size else None,
+                'p50': chars_p50,
+                'p90': chars_p90,
+                'p99': chars_p99
+            },
+            'latency': {
+                'p50': latency_p50,
+                'p95': latency_p95,
+                'ttft_p50': ttft_p50,
+                'ttft_p95': ttft_p95,
+                'by_day': [None if np.isnan(value) else float(value) for value in latency_by_day]
+            },
+            'models': model_usage,
+            'unknown_model_replies': int((~known).sum()),
+            'elapsed_ms': (time.perf_counter() - started) * 1000
+        }
+
+
+def percentiles(values: np.ndarray, qs) -> List[Optional[float]]:
+    if not values.size:
+        return [None] * len(qs)
+    return [float(value) for value in np.percentile(values, qs)]
+
+
+class UsageRecorder:
+    """Appends message facts to a UsageTable on a worker thread and flushes them in batches"""
+
+    FLUSH_WAIT = 5.0  # seconds of quiet before new rows are written
+
+    def __init__(self, settings: Dict[str, Any], analytics_dir: str = 'usage_analytics'):
+        self.table = UsageTable(analytics_dir)
+        self._queue: "queue.Queue" = queue.Queue()
+        self.update_settings(settings)
+        self._worker = threading.Thread(target=self._run, name='UsageRecorder', daemon=True)
+        self._worker.start()
+
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        self.analytics_settings = settings.get('analytics_settings', {})
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.analytics_settings.get('enabled', True))
+
+    def record(self, chat_id: str, index: int, role: str, timestamp: float, chars: int,
+               model: Optional[str] = None, latency: Optional[float] = None,
+               ttft: Optional[float] = None) -> None:
+        if self.enabled:
+            self._queue.put(('add', {
+                'chat_id': chat_id, 'index': index, 'role': role, 'timestamp': timestamp,
+                'chars': chars, 'model': model, 'latency': latency, 'ttft': ttft
+            }))
+
+    def sync(self, chats: Dict[str, Dict[str, Any]],
+             load_messages: Optional[Callable[[Dict[str, Any]], List[Any]]] = None) -> None:
+        """Backfill messages not recorded yet and drop chats that are gone, on the worker thread
+
+        Only messages that exist now are backfilled; ones added later are
+        recorded as they arrive, so queue the sync before recording them.
+        """
+        if self.enabled:
+            chats = [(chat, chat.get('first_loaded', 0) + len(chat.get('messages', []))) for chat in chats.values()]
+            self._queue.put(('sync', chats, load_messages))
+
+    def remove_chat(self, chat_id: str) -> None:
+        self._queue.put(('remove', chat_id))
+
+    def summary(self, days: int = 30) -> Dict[str, Any]:
+        return self.table.summary(days)
+
+    def _sync(self, chats: List[Tuple[Dict[str, Any], int]], load_messages) -> None:
+        present = {chat['id'] for chat, _ in chats}
+        for chat_id in list(self.table.chat_counts):
+            if chat_id not in present:
+                self.table.remove_chat(chat_id)
+
+        backfilled = 0
+        for chat, total in chats:
+            chat_id = chat['id']
+            recorded = self.table.chat_counts.get(chat_id, 0)
+            if total <= recorded:
+                continue
+            try:
+                messages = load_messages(chat) if load_messages else chat.get('messages', [])
+            except Exception as e:
+                logger.error(f"Could not read chat {chat_id} for usage analytics: {str(e)}")
+                continue
+            rows = [
+                {
+                    'chat_id': chat_id,
+                    'index': index,
+                    'role': msg.get('role', ''),
+                    'timestamp': timestamp_of(msg),
+                    'chars': content_length(msg)
+                }
+                for index, msg in enumerate(messages[:total]) if index >= recorded
+            ]
+            self.table.append(rows)
+            backfilled += len(rows)
+        if backfilled:
+            logger.info(f"Usage analytics backfilled {backfilled} messages")
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            while True:
+                try:
+                    if item[0] == 'add':
+                        self.table.append([item[1]])
+                    elif item[0] == 'sync':
+                        self._sync(item[1], item[2])
+                    elif item[0] == 'remove':
+                        self.table.remove_chat(item[1])
+                except Exception as e:
+                    logger.error(f"Usage analytics update failed: {str(e)}")
+                try:
+                    item = self._queue.get(timeout=self.FLUSH_WAIT)
+                except queue.Empty:
+                    break
+            self.table.flush()
+
+
+def timestamp_of(msg: Any) -> float:
+    timestamp = msg.get('timestamp', 0.0)
+    if isinstance(timestamp, str):
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except ValueError:
+            return 0.0
+    return float(timestamp or 0.0)
+
+
+def content_length(msg: Any) -> int:
+    # Blob-backed content knows its length without being read
+    raw = getattr(msg, 'raw_content', None)
+    if raw is not None and not isinstance(raw, str):
+        return raw.size
+    return len(msg.get('content', '') or '')
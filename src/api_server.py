@@ -0,0 +1,412 @@
+"""Local OpenAI-compatible HTTP API over the chat store and configured model.
+
+Endpoints:
+
+    GET  /v1/models
+    POST /v1/chat/completions      ("stream": true answers with SSE)
+    GET  /v1/chats                 chat metadata, favorites first
+    GET  /v1/chats/<id>            one chat in the on-disk schema
+
+Built on asyncio streams so it needs no extra dependency. Completions run on
+worker threads against the shared ClientPool, with the same retries, circuit
+breakers and fallback model as the GUI's replies and under an interactive
+LLMScheduler slot; a semaphore caps concurrent upstream requests, and
+streamed chunks pass through a bounded queue so a slow client slows its own
+upstream read instead of buffering without limit.
+"""
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
+
+from settings import Settings
+from utils import ChatOrderManager, Logger
+from llm import LLM, ClientPool
+from archive import ChatArchive
+from blobs import BlobStore
+from paging import PagedChatStore
+from scheduler import LLMScheduler, INTERACTIVE
+from resilience import LLMError
+
+logger = logging.getLogger('QuantumChat.API')
+
+STATUS_TEXT = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'
+}
+ROLE_MESSAGES = {'user': HumanMessage, 'assistant': AIMessage, 'system': SystemMessage}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class ClientGone(Exception):
+    """Ends a stream whose client disconnected; not retried, unlike connection errors"""
+
+
+class ApiServer:
+    MAX_BODY = 4 * 1024 * 1024
+    STREAM_QUEUE_SIZE = 64
+
+    def __init__(self, settings: Dict[str, Any], pool: Optional[ClientPool] = None,
+                 scheduler: Optional[LLMScheduler] = None, blobs: Optional[BlobStore] = None,
+                 chat_dir: str = 'chats', archive_dir: str = 'chat_archive',
+                 blob_dir: str = 'chat_blobs', index_dir: str = 'chat_pages'):
+        self.settings = settings
+        self.pool = pool or ClientPool()
+        self.scheduler = scheduler or LLMScheduler(settings)
+        self.llm = LLM(settings, pool=self.pool, scheduler=self.scheduler)
+        self.chat_dir = Path(chat_dir)
+        self.archive_dir = archive_dir
+        # Use the owner's store when running inside the GUI or engine process
+        self.blobs = blobs or BlobStore({}, blob_dir)
+        self.store = PagedChatStore(chat_dir, index_dir)
+        api_settings = settings.get('api_server_settings', {})
+        self.host = api_settings.get('host', '127.0.0.1')
+        self.port = int(api_settings.get('port', 8765))
+        self.max_concurrent = int(api_settings.get('max_concurrent', 4))
+        self.max_waiting = int(api_settings.get('max_waiting', 32))
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+
+    # Lifecycle
+
+    async def serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        logger.info(f"API server listening on http://{self.host}:{self.port}")
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self) -> threading.Thread:
+        """Run the server on its own event loop in a daemon thread"""
+        thread = threading.Thread(target=lambda: asyncio.run(self.serve()), name='ApiServer', daemon=True)
+        thread.start()
+        return thread
+
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        self.settings = settings
+        self.llm.update_settings(settings)
+
+    # HTTP plumbing
+
+    async def read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+        request_line = await reader.readline()
+        if not request_line:
+            raise ConnectionResetError
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0) or 0)
+        if length > self.MAX_BODY:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target.split('?', 1)[0], headers, body
+
+    @staticmethod
+    async def write_head(writer: asyncio.StreamWriter, status: int, content_type: str,
+                         length: Optional[int] = None) -> None:
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Type: {content_type}",
+            "Connection: close",
+            "Cache-Control: no-cache"
+        ]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await writer.drain()
+
+    async def write_json(self, writer: asyncio.StreamWriter, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode()
+        await self.write_head(writer, status, 'application/json', len(body))
+        writer.write(body)
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, headers, body = await self.read_request(reader)
+            await self.route(method, path, body, writer)
+        except HttpError as e:
+            await self.write_json(writer, e.status, {'error': {'message': str(e), 'type': 'invalid_request_error'}})
+        except (ConnectionResetError, asyncio.IncompleteReadError, BrokenPipeError):
+            pass
+        except Exception as e:
+            logger.error(f"API request failed: {str(e)}")
+            try:
+                await self.write_json(writer, 500, {'error': {'message': str(e), 'type': 'server_error'}})
+            except Exception:
+                pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        if path == '/v1/chat/completions':
+            if method != 'POST':
+                raise HttpError(405, "Use POST")
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                raise HttpError(400, "Body must be JSON")
+            await self.chat_completions(request, writer)
+        elif path == '/v1/models' and method == 'GET':
+            await self.write_json(writer, 200, self.list_models())
+        elif path == '/v1/chats' and method == 'GET':
+            chats = await asyncio.to_thread(self.list_chats)
+            await self.write_json(writer, 200, {'object': 'list', 'data': chats})
+        elif path.startswith('/v1/chats/') and method == 'GET':
+            chat = await asyncio.to_thread(self.read_chat, path[len('/v1/chats/'):])
+            await self.write_json(writer, 200, chat)
+        else:
+            raise HttpError(404, f"No route for {method} {path}")
+
+    # Chat store endpoints
+
+    def list_models(self) -> Dict[str, Any]:
+        model = self.settings['model_settings']['model']
+        return {'object': 'list', 'data': [{'id': model, 'object': 'model', 'owned_by': 'ollama'}]}
+
+    def list_chats(self) -> List[Dict[str, Any]]:
+        order = ChatOrderManager()
+        position = {chat_id: i for i, chat_id in enumerate(order.get_ordered_chats())}
+        chats = []
+
+        def summary(chat, count):
+            return {
+                'id': chat['id'],
+                'name': chat.get('name'),
+                'timestamp': chat.get('timestamp'),
+                'is_favorite': chat['id'] in order.favorites,
+                'message_count': count
+            }
+
+        for chat_file in self.chat_dir.glob('*.json'):
+            # The .meta sidecar has the metadata and count, so messages are not parsed
+            try:
+                chat, count = self.store.read_summary(chat_file.stem)
+            except Exception as e:
+                logger.error(f"Skipping unreadable chat {chat_file}: {str(e)}")
+                continue
+            chats.append(summary(chat, count))
+        # Archived chats are listed from the archive index without inflating them
+        hot = {chat['id'] for chat in chats}
+        for chat_id, entry in ChatArchive(self.archive_dir).entries.items():
+            if chat_id not in hot:
+                chats.append(summary(entry['chat'], entry['count']))
+        chats.sort(key=lambda c: position.get(c['id'], len(position)))
+        return chats
+
+    def read_chat(self, chat_id: str) -> Dict[str, Any]:
+        chat_file = self.chat_dir / f"{chat_id}.json"
+        # Reject anything that would escape the chat directory
+        if chat_file.parent != self.chat_dir:
+            raise HttpError(404, f"Chat not found: {chat_id}")
+        if chat_file.exists():
+            with open(chat_file, 'r') as f:
+                chat = json.load(f)
+        else:
+            archive = ChatArchive(self.archive_dir)
+            if chat_id not in archive:
+                raise HttpError(404, f"Chat not found: {chat_id}")
+            chat = archive.inflate(chat_id)
+        # Large messages are stored once in the blob store; return them whole
+        return self.blobs.inline(chat)
+
+    # Completions
+
+    def llm_for(self, request: Dict[str, Any]) -> LLM:
+        """The shared LLM, or one with the request's model and sampling overrides"""
+        overrides = {key: request[key] for key in ('model', 'temperature', 'top_p', 'max_tokens', 'frequency_penalty')
+                     if request.get(key) is not None}
+        if not overrides:
+            return self.llm
+        model_settings = dict(self.settings['model_settings'], **overrides)
+        # Clients come from the pool, so this only builds the config
+        return LLM(dict(self.settings, model_settings=model_settings), pool=self.pool, scheduler=self.scheduler)
+
+    def generate(self, llm: LLM, messages: list, on_chunk=None) -> Tuple[str, str]:
+        """Run a completion under an interactive slot with retries; returns (content, model)
+
+        A retry after part of a stream was sent continues from that part.
+        """
+        parts = []
+
+        def request(client, ticket):
+            continued = ''.join(parts)
+            request_messages = messages + [AIMessage(content=continued)] if continued else messages
+            if on_chunk is None:
+                parts.append(client.invoke(request_messages).content)
+                return
+            for chunk in client.stream(request_messages):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    on_chunk(chunk.content)
+
+        model = self.scheduler.run(
+            INTERACTIVE, lambda ticket: llm.call_with_retries(lambda client: request(client, ticket), ticket),
+            name='api'
+        )
+        return ''.join(parts), model
+
+    @staticmethod
+    def to_messages(messages: Any) -> list:
+        if not isinstance(messages, list) or not messages:
+            raise HttpError(400, "'messages' must be a non-empty list")
+        converted = []
+        for msg in messages:
+            message_class = ROLE_MESSAGES.get(msg.get('role'))
+            if message_class is None:
+                raise HttpError(400, f"Unsupported role: {msg.get('role')}")
+            content = msg.get('content')
+            if isinstance(content, list):
+                content = ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+            converted.append(message_class(content=content or ''))
+        return converted
+
+    async def chat_completions(self, request: Dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        messages = self.to_messages(request.get('messages'))
+        llm = self.llm_for(request)
+
+        if self._waiting >= self.max_waiting:
+            raise HttpError(503, "Too many queued requests, retry later")
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            created = int(time.time())
+            if request.get('stream'):
+                await self.stream_completion(llm, messages, completion_id, created, writer)
+            else:
+                try:
+                    content, model = await asyncio.to_thread(self.generate, llm, messages)
+                except LLMError as e:
+                    raise HttpError(503, f"Upstream model failed: {str(e)}")
+                await self.write_json(writer, 200, {
+                    'id': completion_id,
+                    'object': 'chat.completion',
+                    'created': created,
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop'
+                    }]
+                })
+        finally:
+            self._semaphore.release()
+
+    async def stream_completion(self, llm, messages, completion_id, created, writer) -> None:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.STREAM_QUEUE_SIZE)
+        cancelled = threading.Event()
+        loop = self._loop
+        done = object()
+        model = llm.model
+
+        def put(chunk):
+            if cancelled.is_set():
+                raise ClientGone()
+            # Blocks while the queue is full, so the client's pace limits ours
+            asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+
+        def produce():
+            try:
+                self.generate(llm, messages, on_chunk=put)
+            except Exception as e:
+                if not cancelled.is_set():
+                    asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+            payload = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        await self.write_head(writer, 200, 'text/event-stream')
+        producer = loop.run_in_executor(None, produce)
+        try:
+            writer.write(event({'role': 'assistant'}))
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    # No stop event after a failure, so clients cannot take the reply for complete
+                    error = {'error': {'message': str(item), 'type': 'upstream_error'}}
+                    writer.write(f"data: {json.dumps(error)}\n\n".encode())
+                    await writer.drain()
+                    return
+                writer.write(event({'content': item}))
+                await writer.drain()
+            writer.write(event({}, 'stop'))
+            writer.write(b"data: [DONE]\n\n")
+            await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            logger.info("Client disconnected mid-stream")
+        finally:
+            cancelled.set()
+            # Unblock the producer if it is waiting on a full queue
+            while not producer.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantum Chat OpenAI-compatible API server")
+    parser.add_argument('--host')
+    parser.add_argument('--port', type=int)
+    args = parser.parse_args()
+
+    settings = Settings.load_settings()
+    Logger.setup_logging(settings['logging_settings'])
+    api_settings = settings.setdefault('api_server_settings', {})
+    if args.host:
+        api_settings['host'] = args.host
+    if args.port:
+        api_settings['port'] = args.port
+    try:
+        asyncio.run(ApiServer(settings).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,48 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import json
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import datetime
 from pathlib import Path
 import threading
+import time
+import logging
 
 from styles import Styles, COLORS
 from settings import Settings
-from utils import ChatOrderManager
+from utils import ChatOrderManager, BackupManager, BackupScheduler, Logger
 from llm import LLM
+from export import ChatExporter, guess_format
+from search import SearchIndex, NameFilter
+from recall import RecallService
+from messages import Message, chat_from_json
+from markdown_render import IncrementalMarkdown
+from dispatch import UIDispatcher, concat_chunks
+from engine import (
+    EngineClient, RemoteChatOrder, RemoteChatStore, RemoteLLM, RemoteSearchIndex, RemoteRecall, RemoteUsage,
+    StaleChatError
+)
+from api_server import ApiServer
+from paging import PagedChatStore, message_total
+from archive import ChatArchive
+from blobs import BlobStore
+from analytics import UsageRecorder
+from chat_cache import ChatCache
+from message_view import VIEWS, create_message_view
+from compare import CompareRun, variant_label, format_metrics, format_seconds
+from checkpoint import CheckpointStore
+from scheduler import LLMScheduler
+from resilience import LLMError
+from llm import ClientPool
+from branches import (
+    ROOT, active_leaf, active_path, activate, child_map, message_at,
+    parent_index, path_messages, set_active_leaf, sibling_position, switch_sibling
+)
+
+logger = logging.getLogger('QuantumChat.App')
 
 class QuantumChat:
+    # Rows materialized for a sidebar filter
+    FILTER_LIMIT = 50
+
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Quantum Chat AI")
@@ -19,19 +51,69 @@ class QuantumChat:
         self.root.configure(bg=COLORS['bg_main'])
         
         # Initialize components
+        self.dispatcher = UIDispatcher(self.root)
         self.styles = Styles()
         self.style = self.styles.setup_styles(self.root)
         self.settings = Settings.load_settings()
-        self.llm = LLM(self.settings)
-        self.chat_order = ChatOrderManager()
+        Logger.setup_logging(self.settings['logging_settings'])
+        self.engine = EngineClient.connect(self.settings)
+        if self.engine:
+            # The engine owns storage, indexes, backups and model access
+            self.llm = RemoteLLM(self.engine)
+            self.chat_order = RemoteChatOrder(self.engine)
+            self.backup_scheduler = None
+            self.search_index = RemoteSearchIndex(self.engine)
+            self.recall = RemoteRecall(self.engine)
+            # The engine schedules its own model work
+            self.scheduler = None
+            self.engine.on_event = lambda event, data: self.dispatcher.post(self.on_engine_event, event, data)
+        else:
+            # Replies, compare runs and recall embeddings share one priority scheduler
+            self.scheduler = LLMScheduler(self.settings)
+            self.llm = LLM(self.settings, scheduler=self.scheduler)
+            self.chat_order = ChatOrderManager()
+            self.backup_scheduler = BackupScheduler(
+                BackupManager(),
+                self.settings['backup_settings']
+            )
+            self.search_index = SearchIndex()
+            self.recall = RecallService(self.settings, scheduler=self.scheduler)
+        self.api_server = None
+        # Compare mode talks to Ollama directly; with an engine it gets a pool of its own
+        self.compare_pool = getattr(self.llm, 'pool', None) or ClientPool()
+        if self.engine:
+            # Messages are paged in from the engine, which owns the chat files and blobs
+            self.blobs = None
+            self.store = RemoteChatStore(self.engine)
+        else:
+            self.blobs = BlobStore(self.settings)
+            self.store = PagedChatStore(archive=ChatArchive(), blobs=self.blobs)
+        if not self.engine and self.settings['api_server_settings']['enabled']:
+            # Shares the LLM's client pool, scheduler and blob store; with an engine the engine serves the API
+            self.api_server = ApiServer(self.settings, pool=self.llm.pool, scheduler=self.scheduler,
+                                        blobs=self.blobs)
+        self.name_filter = NameFilter()
+        self.loading_older = False
         self.current_chat_id = None
         self.chats = {}
+        self.cache = ChatCache.from_settings(self.chats, self.store, self.settings)
+        self.checkpoints = CheckpointStore(self.settings)
+        # With an engine, usage is recorded there so only one process writes the table
+        self.usage = RemoteUsage(self.engine) if self.engine else UsageRecorder(self.settings)
+        self.streaming_reply = None
         self.svg_images = {}
         
         # Setup UI components
         self.load_svgs()
         self.setup_gui()
         self.load_chats()
+        if self.backup_scheduler:
+            self.backup_scheduler.start()
+        if self.engine:
+            self.engine.call('subscribe')
+        if self.api_server:
+            self.api_server.start_in_thread()
+        self.dispatcher.start()
 
     def load_svgs(self):
         # Get the absolute path to the assets directory
@@ -107,6 +189,35 @@ class QuantumChat:
         )
         new_chat_btn.pack(fill=tk.X, padx=20, pady=(0, 20))
 
+        # Search box
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(
+            self.sidebar,
+            textvariable=self.search_var,
+            style='Search.TEntry'
+        )
+        search_entry.pack(fill=tk.X, padx=20, pady=(0, 15))
+        search_entry.bind('<KeyRelease>', lambda e: self.update_search_results())
+        search_entry.bind('<Escape>', lambda e: self.clear_search())
+
+        # Name filter: ranked fuzzy matches on chat names, one list rebuild per keystroke
+        filter_frame = ttk.Frame(self.sidebar, style='Sidebar.TFrame')
+        filter_frame.pack(fill=tk.X, padx=20, pady=(0, 15))
+        ttk.Label(
+            filter_frame,
+            text="Filter",
+            style='SearchSnippet.TLabel'
+        ).pack(side=tk.LEFT, padx=(0, 8))
+        self.filter_var = tk.StringVar()
+        filter_entry = ttk.Entry(
+            filter_frame,
+            textvariable=self.filter_var,
+            style='Search.TEntry'
+        )
+        filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        filter_entry.bind('<KeyRelease>', lambda e: self.update_chat_list())
+        filter_entry.bind('<Escape>', lambda e: self.clear_filter())
+
         # Chat list container with rounded corners
         self.chat_list_frame = ttk.Frame(self.sidebar, style='ChatList.TFrame')
         self.chat_list_frame.pack(fill=tk.BOTH, expand=True, padx=20)
@@ -120,6 +231,33 @@ class QuantumChat:
         )
         settings_btn.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=20)
 
+        # Export button (text only)
+        export_btn = ttk.Button(
+            self.sidebar,
+            text="Export Chats",
+            command=self.export_chats,
+            style='Settings.TButton'
+        )
+        export_btn.pack(side=tk.BOTTOM, fill=tk.X, padx=20)
+
+        # Compare button (text only)
+        compare_btn = ttk.Button(
+            self.sidebar,
+            text="Compare Models",
+            command=self.show_compare,
+            style='Settings.TButton'
+        )
+        compare_btn.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=(0, 10))
+
+        # Usage button (text only)
+        usage_btn = ttk.Button(
+            self.sidebar,
+            text="Usage",
+            command=self.show_usage,
+            style='Settings.TButton'
+        )
+        usage_btn.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=(0, 10))
+
     def setup_chat_area(self):
         self.chat_area = ttk.Frame(self.paned, style='ChatArea.TFrame')
         self.paned.add(self.chat_area, weight=3)
@@ -132,27 +270,9 @@ class QuantumChat:
         )
         self.current_chat_label.pack(anchor=tk.W, padx=20, pady=(10,0))
         
-        # Messages canvas with rounded corners
-        self.messages_canvas = tk.Canvas(
-            self.chat_area,
-            bg=COLORS['bg_chat'],
-            highlightthickness=0,
-            bd=0
-        )
-        self.messages_canvas.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(
-            self.chat_area,
-            orient=tk.VERTICAL,
-            command=self.messages_canvas.yview
-        )
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.messages_canvas.configure(yscrollcommand=scrollbar.set)
-        
         # Input area with rounded corners
         self.input_frame = ttk.Frame(self.chat_area, style='Input.TFrame')
-        self.input_frame.pack(fill=tk.X, padx=20, pady=(0, 20))
+        self.input_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=(0, 20))
         
         self.input = ttk.Entry(
             self.input_frame,
@@ -169,6 +289,31 @@ class QuantumChat:
         )
         send_btn.pack(side=tk.RIGHT)
 
+        # Add scrollbar
+        self.messages_scrollbar = ttk.Scrollbar(
+            self.chat_area,
+            orient=tk.VERTICAL,
+            command=lambda *args: self.message_view.widget.yview(*args)
+        )
+        self.messages_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Messages view: canvas bubbles or a single Text widget
+        self.message_view = None
+        self.setup_message_view()
+
+    def setup_message_view(self):
+        if self.message_view:
+            self.message_view.widget.destroy()
+        self.message_view = create_message_view(
+            self.settings['ui_settings'].get('message_view', 'canvas'),
+            self.chat_area,
+            self.styles,
+            self.svg_images,
+            self.on_messages_scroll,
+            self.on_message_action
+        )
+        self.message_view.widget.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+
     def create_new_chat(self):
             chat_id = str(datetime.now().timestamp())
             new_chat = {
@@ -181,31 +326,168 @@ class QuantumChat:
             self.chats[chat_id] = new_chat
             self.chat_order.add_chat(chat_id)
             self.save_chat(new_chat)
+            self.search_index.index_chat_name(chat_id, new_chat['name'])
+            self.name_filter.add(chat_id, new_chat['name'])
             self.select_chat(chat_id)
             self.update_chat_list()
 
     def load_chats(self):
-        chat_dir = Path('chats')
-        chat_dir.mkdir(exist_ok=True)
-        
-        for chat_file in chat_dir.glob('*.json'):
-            with open(chat_file, 'r') as f:
-                chat_data = json.load(f)
+        if self.engine:
+            for chat_data in self.engine.call('list_chats'):
+                self.chats[chat_data['id']] = chat_from_json(chat_data)
+            self.recover_replies()
+            self.name_filter.rebuild(self.chats)
+            self.update_chat_list()
+            return
+
+        # Only metadata is read here; messages are paged in when a chat is opened
+        for chat_file in self.store.chat_dir.glob('*.json'):
+            try:
+                chat_data = self.store.load_meta(chat_file)
                 self.chats[chat_data['id']] = chat_data
+            except Exception as e:
+                logger.error(f"Error loading chat {chat_file}: {str(e)}")
+        # Archived chats are listed from the archive index and inflated when opened
+        self.store.load_archived(self.chats)
         
+        self.archive_idle_chats()
+        # Queued before recovered replies are recorded, so it backfills what came before them
+        self.usage.sync(self.chats, self.store.all_messages)
+        self.recover_replies()
+        self.name_filter.rebuild(self.chats)
+        self.search_index.sync(self.chats, self.store.all_messages)
+        self.recall.sync(self.chats, self.store.all_messages)
         self.update_chat_list()
 
+    def archive_idle_chats(self):
+        archive_settings = self.settings['archive_settings']
+        if not archive_settings.get('enabled', True):
+            return
+        try:
+            self.store.archive_idle(self.chats, float(archive_settings.get('inactive_days', 30)))
+            self.store.archive.compact()
+        except Exception as e:
+            logger.error(f"Error archiving idle chats: {str(e)}")
+
+    def recover_replies(self):
+        """Store replies cut short by a crash as incomplete messages"""
+        for entry in self.checkpoints.recover():
+            chat = self.chats.get(entry['chat_id'])
+            if chat is None or entry['prompt_index'] >= message_total(chat):
+                # The chat (or the prompt) is gone
+                self.checkpoints.remove(entry)
+                continue
+            if not self.reply_stored(chat, entry):
+                self.add_message(
+                    'assistant', entry['content'], chat_id=chat['id'],
+                    parent=entry['prompt_index'], incomplete=True
+                )
+            self.checkpoints.remove(entry)
+
+    def reply_stored(self, chat, entry):
+        """Whether a checkpointed reply reached the chat before its journal was removed"""
+        prompt_index = entry['prompt_index']
+        later = self.store.read_messages(chat['id'], prompt_index + 1, message_total(chat))
+        for index, msg in enumerate(later, prompt_index + 1):
+            parent = index - 1 if msg.parent is None else msg.parent
+            if (parent == prompt_index and msg.role == 'assistant'
+                    and msg.timestamp >= (entry['started'] or 0)
+                    and msg.content.startswith(entry['content'])):
+                return True
+        return False
+
     def save_chat(self, chat_data):
-        chat_dir = Path('chats')
-        chat_dir.mkdir(exist_ok=True)
-        
-        with open(chat_dir / f"{chat_data['id']}.json", 'w') as f:
-            json.dump(chat_data, f, indent=2)
+        if self.engine:
+            # Messages only reach the engine through append_message
+            metadata = {key: value for key, value in chat_data.items() if key not in ('messages', 'first_loaded')}
+            # The engine bumps the version the same way unless the save is stale
+            chat_data['version'] = chat_data.get('version', 0) + 1
+            self.engine.submit(
+                'save_chat', chat=metadata,
+                on_error=lambda e: self.dispatcher.post(self.on_engine_save_failed, e)
+            )
+            return
+
+        self.store.save(chat_data)
+
+    def save_active_leaf(self, chat_data):
+        """Persist a branch switch without rewriting the chat file"""
+        if self.engine:
+            self.save_chat(chat_data)
+            return
+
+        self.store.save_active_leaf(chat_data)
+
+    def on_engine_save_failed(self, error):
+        if isinstance(error, StaleChatError) and error.chat:
+            # Another window saved first; take its copy rather than overwrite it
+            logger.warning(str(error))
+            self.on_engine_event('chat_saved', {'chat': error.chat})
+        else:
+            logger.error(f"Error saving chat: {str(error)}")
+
+    def on_engine_event(self, event, data):
+        """Apply a change made by another window sharing the engine"""
+        if event == 'chat_saved':
+            # Metadata only; loaded messages are kept if they still line up
+            update = data['chat']
+            chat = self.chats.get(update['id'])
+            if chat is not None and message_total(chat) == update['first_loaded']:
+                loaded, first_loaded = chat['messages'], chat.get('first_loaded', 0)
+                chat.clear()
+                chat.update(update, messages=loaded, first_loaded=first_loaded)
+            else:
+                chat = self.chats[update['id']] = chat_from_json(update)
+                self.cache.discard(chat['id'])
+            self.name_filter.add(chat['id'], chat['name'])
+            if chat['id'] == self.current_chat_id:
+                self.current_chat_label.config(text=f"Chat: {chat['name']}")
+                self.ensure_loaded(chat)
+                self.update_messages_display()
+        elif event == 'message_appended':
+            chat = self.chats.get(data['chat_id'])
+            if chat is None:
+                return
+            if message_total(chat) == data['index']:
+                message = Message.from_dict(data['message'])
+                chat['messages'].append(message)
+                chat.pop('active_leaf', None)
+                chat['version'] = data['version']
+                if data['branched']:
+                    chat['branched'] = True
+            else:
+                self.unload_chat(chat, data['index'] + 1, data['version'])
+            if chat['id'] == self.current_chat_id:
+                self.ensure_loaded(chat)
+                self.update_messages_display()
+            else:
+                self.cache.resize(chat)
+        elif event == 'chat_deleted':
+            self.chats.pop(data['chat_id'], None)
+            self.name_filter.remove(data['chat_id'])
+            if self.current_chat_id == data['chat_id']:
+                self.current_chat_id = None
+                self.update_messages_display()
+        elif event == 'order_changed':
+            self.chat_order.apply_state(data)
+        self.update_chat_list()
 
     def update_chat_list(self):
         # Clear existing chat tabs
         for widget in self.chat_list_frame.winfo_children():
             widget.destroy()
+
+        if self.search_var.get().strip():
+            self.update_search_results()
+            return
+
+        filter_text = self.filter_var.get().strip()
+        if filter_text:
+            # Only the best matches get widgets, ranked rather than in sidebar order
+            for chat_id in self.name_filter.search(filter_text, limit=self.FILTER_LIMIT):
+                if chat_id in self.chats:
+                    self.add_chat_tab(self.chats[chat_id])
+            return
         
         # Add chats in order (favorites first)
         ordered_chats = self.chat_order.get_ordered_chats()
@@ -233,34 +515,133 @@ class QuantumChat:
         frame.bind('<Button-1>', commands['select_chat'])  # Change this line
 
 
+    def update_search_results(self):
+        query = self.search_var.get().strip()
+        for widget in self.chat_list_frame.winfo_children():
+            widget.destroy()
+
+        if not query:
+            self.update_chat_list()
+            return
+
+        for hit in self.search_index.search(query, limit=30):
+            chat = self.chats.get(hit['chat_id'])
+            if not chat:
+                continue
+            frame = self.styles.create_search_result(
+                self.chat_list_frame,
+                chat['name'],
+                hit['snippet'],
+                lambda h=hit: self.jump_to_message(h['chat_id'], h['message_index'])
+            )
+            frame.pack(fill=tk.X, pady=2)
+
+    def clear_search(self):
+        self.search_var.set('')
+        self.update_chat_list()
+
+    def clear_filter(self):
+        self.filter_var.set('')
+        self.update_chat_list()
+
+    def jump_to_message(self, chat_id, message_index):
+        self.select_chat(chat_id)
+        chat = self.chats.get(chat_id)
+        if chat and chat.get('branched') and message_index >= 0:
+            # Show the branch the hit is on
+            if message_index not in active_path(chat):
+                activate(chat, message_index)
+                self.save_active_leaf(chat)
+                self.update_messages_display()
+        elif chat and 0 <= message_index < chat.get('first_loaded', 0):
+            # Page in everything from a little above the hit
+            self.store.load_older(chat, chat['first_loaded'] - message_index + 5)
+            self.cache.resize(chat)
+            self.update_messages_display()
+        if message_index >= 0:
+            # Wait for the redraw so the scroll region is final
+            self.root.after_idle(lambda: self.scroll_to_message(message_index))
+
+    def scroll_to_message(self, message_index):
+        self.message_view.scroll_to(message_index)
+
     def select_chat(self, chat_id):
+        # The open chat stays resident
+        if self.current_chat_id in self.chats:
+            self.cache.unpin(self.current_chat_id)
         self.current_chat_id = chat_id
-        self.messages_canvas.delete('all')
+        self.message_view.clear()
 
         if chat_id in self.chats:
             chat = self.chats[chat_id]
+            self.cache.pin(chat_id)
+            self.ensure_loaded(chat)
+
             # Update label to show which chat is loaded
             self.current_chat_label.config(text=f"Chat: {chat['name']}")
             self.update_messages_display()
             
-            self.input.focus_set()
-            self.messages_canvas.yview_moveto(1.0)
-
-        
-        # Clear current messages display
-        self.messages_canvas.delete('all')
-        
-        # Load and display chat messages
-        if chat_id in self.chats:
-            chat = self.chats[chat_id]
-            # Update messages display
-            self.update_messages_display()
-            
             # Set focus to input field
             self.input.focus_set()
             
             # Scroll to bottom of messages
-            self.messages_canvas.yview_moveto(1.0)
+            self.message_view.scroll_to_end()
+
+    def ensure_loaded(self, chat):
+        # Only the last page is read, however long the chat is
+        if self.cache.enabled:
+            self.cache.access(chat)
+        elif not chat['messages'] and chat.get('first_loaded'):
+            self.store.load_tail(chat)
+        # Branched chats are kept whole, since any message can be on the active path
+        if chat.get('branched') and chat.get('first_loaded'):
+            self.store.load_older(chat, chat['first_loaded'])
+            self.cache.resize(chat)
+
+    def unload_chat(self, chat, total, version):
+        """Drop a chat's loaded messages once it no longer matches the engine's copy"""
+        chat['messages'] = []
+        chat['first_loaded'] = total
+        chat['version'] = version
+        self.cache.discard(chat['id'])
+
+    def on_messages_scroll(self, first, last):
+        self.messages_scrollbar.set(first, last)
+        chat = self.chats.get(self.current_chat_id)
+        if (chat and chat.get('first_loaded') and not self.loading_older
+                and float(first) < 0.05):
+            self.load_older_messages(chat['id'])
+
+    def load_older_messages(self, chat_id):
+        chat = self.chats[chat_id]
+        first_loaded = chat['first_loaded']
+        self.loading_older = True
+
+        def read_page():
+            try:
+                start = max(first_loaded - self.store.PAGE_SIZE, 0)
+                older = self.store.read_messages(chat_id, start, first_loaded)
+                self.dispatcher.post(self.prepend_messages, chat_id, first_loaded, older)
+            except Exception as e:
+                self.dispatcher.post(self.prepend_messages, chat_id, first_loaded, [])
+                logger.error(f"Error loading older messages: {str(e)}")
+
+        threading.Thread(target=read_page, daemon=True).start()
+
+    def prepend_messages(self, chat_id, first_loaded, older):
+        self.loading_older = False
+        chat = self.chats.get(chat_id)
+        # Drop the page if the chat was reloaded or switched meanwhile
+        if not older or not chat or chat.get('first_loaded') != first_loaded:
+            return
+        chat['messages'][0:0] = older
+        chat['first_loaded'] = first_loaded - len(older)
+        self.cache.resize(chat)
+        if chat_id != self.current_chat_id:
+            return
+
+        # Keep the message that was on top of the view in place
+        self.message_view.prepend(self.message_entries(chat), len(older))
 
     def toggle_favorite(self, chat_id):
         chat = self.chats[chat_id]
@@ -280,22 +661,77 @@ class QuantumChat:
         if new_name:
             chat['name'] = new_name
             self.save_chat(chat)
+            self.search_index.index_chat_name(chat_id, new_name)
+            self.name_filter.add(chat_id, new_name)
             self.update_chat_list()
 
     def delete_chat(self, chat_id):
         if messagebox.askyesno("Delete Chat", "Are you sure you want to delete this chat?"):
-            chat_file = Path('chats') / f"{chat_id}.json"
-            if chat_file.exists():
-                chat_file.unlink()
+            if self.engine:
+                self.engine.call('delete_chat', chat_id=chat_id)
+            else:
+                self.store.delete(chat_id)
             
             self.chat_order.remove_chat(chat_id)
+            self.search_index.remove_chat(chat_id)
+            self.name_filter.remove(chat_id)
+            self.recall.remove_chat(chat_id)
+            self.usage.remove_chat(chat_id)
+            self.cache.discard(chat_id)
             del self.chats[chat_id]
             
             if self.current_chat_id == chat_id:
+                self.cache.unpin(chat_id)
                 self.current_chat_id = None
             
             self.update_chat_list()
 
+    def export_chats(self):
+        output_path = filedialog.asksaveasfilename(
+            parent=self.root,
+            title="Export Chats",
+            defaultextension='.jsonl',
+            filetypes=[
+                ("JSON Lines", "*.jsonl"),
+                ("Markdown", "*.md"),
+                ("Compressed JSON Lines", "*.jsonl.gz"),
+                ("Compressed Markdown", "*.md.gz")
+            ]
+        )
+        if not output_path:
+            return
+
+        favorites_only = messagebox.askyesnocancel(
+            "Export Chats",
+            "Export only favorite chats?",
+            parent=self.root
+        )
+        if favorites_only is None:
+            return
+
+        # Stream from disk in the background so the UI never holds the whole export
+        def run_export():
+            try:
+                count = ChatExporter(blobs=self.blobs).export(
+                    output_path,
+                    favorites_only=favorites_only,
+                    favorites=set(self.chat_order.favorites),
+                    **guess_format(output_path)
+                )
+                self.dispatcher.post(
+                    messagebox.showinfo,
+                    "Export Chats",
+                    f"Exported {count} chats to {output_path}"
+                )
+            except Exception as e:
+                self.dispatcher.post(
+                    messagebox.showerror,
+                    "Error",
+                    f"Failed to export chats: {str(e)}"
+                )
+
+        threading.Thread(target=run_export, daemon=True).start()
+
     def send_message(self, event=None):
         # Get user input and clean it
         user_input = self.input.get().strip()  # Changed from self.input_box to self.input
@@ -307,116 +743,547 @@ class QuantumChat:
         self.input.delete(0, tk.END)  # Changed from self.input_box to self.input
         
         # Display user message
-        self.add_message('user', user_input)
-        
+        self.submit_prompt(user_input)
+
+    def submit_prompt(self, user_input, parent=None):
+        """Add a user message under parent (default: the active leaf) and request a reply"""
+        chat_id = self.current_chat_id
+        prompt_index = self.add_message('user', user_input, parent=parent)
+        if prompt_index is None:
+            return
+        self.request_reply(chat_id, prompt_index)
+
+    def request_reply(self, chat_id, prompt_index, prefix=''):
+        """Generate a reply to the user message at prompt_index on the active branch.
+
+        With prefix the model continues that partial reply instead.
+        """
+        chat = self.chats[chat_id]
+        prompt = message_at(chat, prompt_index).content
+        history = path_messages(chat, upto=prompt_index)
+
         # Disable input while processing
         self.input.config(state=tk.DISABLED)  # Changed from self.input_box to self.input
+
+        # Keep the chat resident until the reply is stored
+        self.cache.pin(chat_id)
+
+        if prefix:
+            # Show the recovered text while the rest streams in after it
+            self.on_reply_chunk(chat_id, prefix)
+        checkpoint = self.checkpoints.begin(chat_id, prompt_index, prefix)
         
         # Get AI response in a separate thread
         threading.Thread(
             target=self.get_ai_response,
-            args=(user_input,),
+            args=(prompt, chat_id, prompt_index, history, prefix, checkpoint),
             daemon=True
         ).start()
 
+    def get_ai_response(self, user_message, chat_id=None, prompt_index=None, history=None,
+                        prefix='', checkpoint=None):
+        started = time.monotonic()
+        usage = {'model': self.settings['model_settings']['model']}
+
+        def on_token(chunk):
+            if 'ttft' not in usage:
+                usage['ttft'] = time.monotonic() - started
+            # Journal writes are batched by the checkpoint, on this thread
+            if checkpoint:
+                checkpoint.add(chunk)
+            # Chunks for the same chat coalesce into one redraw per pump tick
+            self.dispatcher.post(
+                self.on_reply_chunk, chat_id, chunk,
+                key=('reply_chunk', chat_id),
+                merge=concat_chunks
+            )
 
-    def get_ai_response(self, user_message):
         try:
-            response = self.llm.generate_response(user_message)
-            self.root.after(0, lambda: self.add_message('assistant', response))
+            context = self.recall.recall(user_message, exclude_chat_id=chat_id)
+            response = self.llm.generate_response(
+                user_message,
+                context=context,
+                on_token=on_token,
+                history=history,
+                prefix=prefix or None,
+                usage=usage
+            )
+            usage['latency'] = time.monotonic() - started
+            self.dispatcher.post(self.finish_reply, chat_id, prefix + response, prompt_index, checkpoint, usage)
+        except LLMError as e:
+            # Text that did stream in is kept as an incomplete reply that can be resumed
+            partial = prefix + e.partial if e.partial else ''
+            self.dispatcher.post(self.fail_reply, chat_id, str(e), checkpoint, prompt_index, partial)
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror(
-                "Error",
-                f"Failed to get AI response: {str(e)}"
-            ))
+            self.dispatcher.post(self.fail_reply, chat_id, str(e), checkpoint)
 
-    def add_message(self, role, content):
-        if not self.current_chat_id:
-            return
+    def on_reply_chunk(self, chat_id, chunk):
+        if self.streaming_reply is None:
+            self.streaming_reply = {
+                'chat_id': chat_id,
+                'renderer': IncrementalMarkdown()
+            }
+        self.streaming_reply['renderer'].feed(chunk)
+        if chat_id == self.current_chat_id:
+            self.message_view.update_stream(self.streaming_reply['renderer'])
 
-        chat = self.chats[self.current_chat_id]
-        chat['messages'].append({
-            'role': role,
-            'content': content,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        self.save_chat(chat)
+    def finish_reply(self, chat_id, response, prompt_index=None, checkpoint=None, usage=None):
+        self.streaming_reply = None
+        if chat_id == self.current_chat_id:
+            self.message_view.end_stream()
+        self.add_message('assistant', response, chat_id=chat_id, parent=prompt_index, usage=usage)
+        # Only now is the reply safely in the chat file
+        if checkpoint:
+            checkpoint.discard()
+        self.cache.unpin(chat_id)
+        self.input.config(state=tk.NORMAL)
+        self.input.focus_set()
+
+    def fail_reply(self, chat_id, error, checkpoint=None, prompt_index=None, partial=''):
+        self.streaming_reply = None
+        if chat_id == self.current_chat_id:
+            self.message_view.end_stream()
+        if partial:
+            self.add_message('assistant', partial, chat_id=chat_id, parent=prompt_index, incomplete=True)
+        if checkpoint:
+            checkpoint.discard()
+        self.cache.unpin(chat_id)
+        self.input.config(state=tk.NORMAL)
         self.update_messages_display()
+        if partial:
+            error = f"{error}\n\nThe part of the reply received so far was kept; use resume to continue it."
+        messagebox.showerror("Error", f"Failed to get AI response: {error}")
 
-    def update_messages_display(self):
-        self.messages_canvas.delete('all')
-        if not self.current_chat_id or self.current_chat_id not in self.chats:
-            return
+    def add_message(self, role, content, chat_id=None, parent=None, incomplete=False, usage=None):
+        """Append a message under parent (default: the active leaf); returns its index.
 
-        y_pos = 20
-        messages = self.chats[self.current_chat_id]['messages']
+        usage holds the model and timings of a generated reply for analytics.
+        """
+        chat_id = chat_id or self.current_chat_id
+        if not chat_id or chat_id not in self.chats:
+            return None
+
+        chat = self.chats[chat_id]
+        self.ensure_loaded(chat)
+        if parent is None:
+            parent = active_leaf(chat)
+        # Continuing from the last stored message needs no explicit parent
+        forked = parent != message_total(chat) - 1
+        if forked and not chat.get('branched'):
+            chat['branched'] = True
+            self.ensure_loaded(chat)
+        message = Message(role, content, time.time(), parent if forked else None, incomplete)
+        chat['messages'].append(message)
+        # The new message is the last one stored, which is the default leaf
+        chat.pop('active_leaf', None)
         
-        for msg in messages:
-            is_user = msg['role'] == 'user'
-            
-            # Calculate positions
-            canvas_width = self.messages_canvas.winfo_width()
-            bubble_width = min(canvas_width * 0.7, 500)
-            
-            if is_user:
-                bubble_x = canvas_width - bubble_width - 60
-                avatar_x = canvas_width - 40
-            else:
-                bubble_x = 60
-                avatar_x = 30
-            
-            # Add avatar
-            avatar_img = self.svg_images['user'] if is_user else self.svg_images['robot']
-            self.messages_canvas.create_image(
-                avatar_x,
-                y_pos + 25,
-                image=avatar_img
+        message_index = message_total(chat) - 1
+        if self.engine:
+            # Appended by the engine so a message another window added meanwhile is kept
+            chat['version'] = chat.get('version', 0) + 1
+            self.engine.submit(
+                'append_message', chat_id=chat['id'], message=message.to_dict(),
+                parent=parent, expected_index=message_index,
+                on_result=lambda result, version=chat['version']: self.dispatcher.post(
+                    self.on_message_stored, chat_id, message_index, version, result
+                ),
+                on_error=lambda e: logger.error(f"Error storing message: {str(e)}")
             )
-            
-            # Create message bubble
-            bubble = self.styles.create_rounded_rectangle(
-                self.messages_canvas,
-                bubble_x,
-                y_pos,
-                bubble_x + bubble_width,
-                y_pos + 50,
-                fill=COLORS['message_user'] if is_user else COLORS['message_bot'],
-                radius=20
+        else:
+            self.store.append_message(chat, message)
+        self.cache.resize(chat)
+        self.search_index.index_message(chat['id'], message_index, content)
+        self.recall.enqueue(chat['id'], message_index, role, content)
+        self.usage.record(chat['id'], message_index, role, message.timestamp, len(content), **(usage or {}))
+        if chat_id == self.current_chat_id:
+            if forked:
+                self.update_messages_display()
+            else:
+                self.message_view.append(message, message_index)
+        return message_index
+
+    def on_message_stored(self, chat_id, message_index, version, result):
+        """Engine reply to append_message, compared against the optimistic local copy"""
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return
+        if result['index'] == message_index:
+            # A save by another window may have bumped the version meanwhile
+            if chat.get('version') == version:
+                chat['version'] = result['version']
+            return
+        # Another window appended meanwhile; page in the engine's copy
+        self.unload_chat(chat, result['index'] + 1, result['version'])
+        if chat_id == self.current_chat_id:
+            self.ensure_loaded(chat)
+            self.update_messages_display()
+
+    def on_message_action(self, action, index):
+        chat = self.chats.get(self.current_chat_id)
+        # One reply at a time; branches stay put while one is generating
+        if not chat or self.input.instate(['disabled']):
+            return
+
+        if action in ('prev', 'next'):
+            if switch_sibling(chat, index, -1 if action == 'prev' else 1) is not None:
+                self.save_active_leaf(chat)
+                self.update_messages_display()
+        elif action == 'edit':
+            new_content = simpledialog.askstring(
+                "Edit Message",
+                "Edit and resend:",
+                parent=self.root,
+                initialvalue=message_at(chat, index).content
             )
-            
-            # Add message text
-            self.messages_canvas.create_text(
-                bubble_x + 20,
-                y_pos + 25,
-                text=msg['content'],
-                fill=COLORS['text_primary'],
-                anchor=tk.W,
-                width=bubble_width - 40,
-                font=('SF Pro Display', 13)
+            if new_content and new_content.strip():
+                self.submit_prompt(new_content.strip(), parent=parent_index(chat, index))
+        elif action in ('regenerate', 'resume'):
+            prompt_index = parent_index(chat, index)
+            if prompt_index == ROOT or message_at(chat, prompt_index).role != 'user':
+                return
+            # Show the branch up to the prompt while the new reply streams in;
+            # a resumed reply is stored as a sibling of the interrupted one
+            set_active_leaf(chat, prompt_index)
+            self.save_active_leaf(chat)
+            self.update_messages_display()
+            prefix = message_at(chat, index).content if action == 'resume' else ''
+            self.request_reply(chat['id'], prompt_index, prefix)
+
+    def message_entries(self, chat):
+        """(index, message, branch) for each loaded message on the active branch"""
+        children = child_map(chat) if chat.get('branched') else None
+        return [
+            (index, message_at(chat, index),
+             sibling_position(chat, index, children) if children else None)
+            for index in active_path(chat)
+        ]
+
+    def update_messages_display(self, scroll_to_end=True):
+        self.message_view.clear()
+        if not self.current_chat_id or self.current_chat_id not in self.chats:
+            return
+
+        chat = self.chats[self.current_chat_id]
+        self.message_view.render(self.message_entries(chat), scroll_to_end)
+
+        # A reply still streaming into this chat is drawn below the saved messages
+        if self.streaming_reply and self.streaming_reply['chat_id'] == self.current_chat_id:
+            self.message_view.update_stream(self.streaming_reply['renderer'])
+
+    def show_compare(self):
+        compare_window = tk.Toplevel(self.root)
+        compare_window.title("Compare Models")
+        compare_window.geometry("1200x750")
+        compare_window.configure(bg=COLORS['bg_settings'])
+
+        main_frame = ttk.Frame(compare_window, style='Settings.TFrame', padding=20)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Variant rows: model and temperature, checked rows are compared
+        variants_section = ttk.Frame(main_frame, style='SettingsSection.TFrame')
+        variants_section.pack(fill=tk.X)
+
+        ttk.Label(
+            variants_section,
+            text="Models",
+            style='SettingsHeader.TLabel'
+        ).pack(anchor=tk.W)
+
+        rows = []
+        temperature = self.settings['model_settings']['temperature']
+        for i, model in enumerate(Settings.MODELS):
+            row_frame = ttk.Frame(variants_section, style='Settings.TFrame')
+            row_frame.pack(fill=tk.X, pady=4)
+
+            enabled_var = tk.BooleanVar(value=i < 2)
+            ttk.Checkbutton(
+                row_frame,
+                variable=enabled_var,
+                style='Settings.TCheckbutton'
+            ).pack(side=tk.LEFT)
+
+            model_var = tk.StringVar(value=model)
+            ttk.Combobox(
+                row_frame,
+                textvariable=model_var,
+                values=Settings.MODELS,
+                style='Settings.TCombobox',
+                width=20
+            ).pack(side=tk.LEFT, padx=(10, 0))
+
+            ttk.Label(
+                row_frame,
+                text="Temperature:",
+                style='Settings.TLabel'
+            ).pack(side=tk.LEFT, padx=(20, 0))
+
+            temperature_var = tk.StringVar(value=f"{temperature:.2f}")
+            ttk.Entry(
+                row_frame,
+                textvariable=temperature_var,
+                style='Settings.TEntry',
+                width=6
+            ).pack(side=tk.LEFT, padx=(10, 0))
+            rows.append((enabled_var, model_var, temperature_var))
+
+        # Prompt
+        prompt_frame = ttk.Frame(main_frame, style='Input.TFrame')
+        prompt_frame.pack(fill=tk.X, pady=15)
+
+        prompt_entry = ttk.Entry(prompt_frame, style='ChatInput.TEntry')
+        prompt_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+
+        history_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            prompt_frame,
+            text="Include current chat",
+            variable=history_var,
+            style='Settings.TCheckbutton'
+        ).pack(side=tk.LEFT, padx=(0, 10))
+
+        panes_frame = ttk.Frame(main_frame, style='Settings.TFrame')
+        panes_frame.pack(fill=tk.BOTH, expand=True)
+        state = {'run': None, 'panes': []}
+
+        def on_chunk(run, index, text):
+            if run is state['run']:
+                pane_text = state['panes'][index]['text']
+                pane_text.configure(state=tk.NORMAL)
+                pane_text.insert(tk.END, text)
+                pane_text.configure(state=tk.DISABLED)
+                pane_text.see(tk.END)
+
+        def on_done(run, index, metrics):
+            if run is state['run']:
+                state['panes'][index]['metrics'].configure(text=format_metrics(metrics))
+                state['panes'][index]['use'].state(['!disabled'])
+
+        def on_error(run, index, error):
+            if run is state['run']:
+                state['panes'][index]['metrics'].configure(text=f"Error: {error}")
+
+        def use_variant(variant):
+            self.settings['model_settings']['model'] = variant['model']
+            self.settings['model_settings']['temperature'] = variant['temperature']
+            Settings.save_settings(self.settings)
+            self.llm.update_settings(self.settings)
+            messagebox.showinfo("Compare Models", f"Now using {variant_label(variant)}", parent=compare_window)
+
+        def run_compare(event=None):
+            prompt = prompt_entry.get().strip()
+            variants = []
+            try:
+                for enabled_var, model_var, temperature_var in rows:
+                    if enabled_var.get() and model_var.get().strip():
+                        variants.append({
+                            'model': model_var.get().strip(),
+                            'temperature': float(temperature_var.get())
+                        })
+            except ValueError:
+                messagebox.showerror("Compare Models", "Temperatures must be numbers", parent=compare_window)
+                return
+            if not prompt or not variants:
+                return
+
+            if state['run']:
+                state['run'].cancel()
+            for child in panes_frame.winfo_children():
+                child.destroy()
+            state['panes'] = []
+
+            # One pane per variant, side by side
+            for index, variant in enumerate(variants):
+                pane = ttk.Frame(panes_frame, style='SettingsSection.TFrame', padding=5)
+                pane.grid(row=0, column=index, sticky='nsew', padx=5)
+                panes_frame.columnconfigure(index, weight=1, uniform='pane')
+                panes_frame.rowconfigure(0, weight=1)
+
+                ttk.Label(pane, text=variant_label(variant), style='Settings.TLabel').pack(anchor=tk.W)
+                metrics_label = ttk.Label(pane, text="Waiting for first token…", style='Settings.TLabel')
+                metrics_label.pack(anchor=tk.W, pady=(2, 5))
+                pane_text = tk.Text(
+                    pane,
+                    bg=COLORS['bg_chat'],
+                    fg=COLORS['text_primary'],
+                    wrap=tk.WORD,
+                    bd=0,
+                    highlightthickness=0,
+                    font=('SF Pro Display', 12),
+                    state=tk.DISABLED
+                )
+                pane_text.pack(fill=tk.BOTH, expand=True)
+                use_btn = ttk.Button(
+                    pane,
+                    text="Use this model",
+                    command=lambda v=variant: use_variant(v),
+                    style='SettingsButton.TButton'
+                )
+                use_btn.pack(fill=tk.X, pady=(5, 0))
+                use_btn.state(['disabled'])
+                state['panes'].append({'text': pane_text, 'metrics': metrics_label, 'use': use_btn})
+
+            chat = self.chats.get(self.current_chat_id)
+            history = path_messages(chat) if chat and history_var.get() else []
+            run = CompareRun(self.settings, variants, pool=self.compare_pool, scheduler=self.scheduler)
+            state['run'] = run
+            # Chunks per pane coalesce into one insert per pump tick
+            run.start(
+                prompt,
+                history,
+                on_chunk=lambda i, text: self.dispatcher.post(
+                    on_chunk, run, i, text, key=('compare_chunk', id(run), i), merge=concat_chunks
+                ),
+                on_done=lambda i, metrics: self.dispatcher.post(on_done, run, i, metrics),
+                on_error=lambda i, error: self.dispatcher.post(on_error, run, i, error)
             )
-            
-            # Add timestamp
-            timestamp = datetime.fromisoformat(msg['timestamp']).strftime('%H:%M')
-            self.messages_canvas.create_text(
-                bubble_x + bubble_width - 20,
-                y_pos + 60,
-                text=timestamp,
-                fill=COLORS['text_secondary'],
-                anchor=tk.E,
-                font=('SF Pro Display', 10)
+
+        def close():
+            if state['run']:
+                state['run'].cancel()
+            compare_window.destroy()
+
+        prompt_entry.bind('<Return>', run_compare)
+        ttk.Button(
+            prompt_frame,
+            text="Compare",
+            command=run_compare,
+            style='Send.TButton'
+        ).pack(side=tk.RIGHT)
+        compare_window.protocol("WM_DELETE_WINDOW", close)
+        compare_window.transient(self.root)
+        prompt_entry.focus_set()
+
+    def show_usage(self):
+        usage_window = tk.Toplevel(self.root)
+        usage_window.title("Usage")
+        usage_window.geometry("900x750")
+        usage_window.configure(bg=COLORS['bg_settings'])
+
+        main_frame = ttk.Frame(usage_window, style='Settings.TFrame', padding=20)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        controls = ttk.Frame(main_frame, style='Settings.TFrame')
+        controls.pack(fill=tk.X)
+        ttk.Label(controls, text="Last", style='Settings.TLabel').pack(side=tk.LEFT)
+        days_var = tk.StringVar(value=str(self.settings['analytics_settings'].get('dashboard_days', 30)))
+        days_box = ttk.Combobox(
+            controls,
+            textvariable=days_var,
+            values=['7', '30', '90', '365'],
+            style='Settings.TCombobox',
+            width=6
+        )
+        days_box.pack(side=tk.LEFT, padx=10)
+        ttk.Label(controls, text="days", style='Settings.TLabel').pack(side=tk.LEFT)
+        timing_label = ttk.Label(controls, text="", style='Settings.TLabel')
+        timing_label.pack(side=tk.RIGHT)
+
+        def chart(title, height=180):
+            ttk.Label(main_frame, text=title, style='SettingsHeader.TLabel').pack(anchor=tk.W, pady=(15, 5))
+            canvas = tk.Canvas(main_frame, height=height, bg=COLORS['bg_chat'], highlightthickness=0)
+            canvas.pack(fill=tk.X)
+            return canvas
+
+        volume_canvas = chart("Messages per day")
+        latency_canvas = chart("Mean reply latency per day", height=120)
+        ttk.Label(main_frame, text="Replies", style='SettingsHeader.TLabel').pack(anchor=tk.W, pady=(15, 5))
+        details_label = ttk.Label(main_frame, text="", style='Settings.TLabel', justify=tk.LEFT)
+        details_label.pack(anchor=tk.W)
+
+        def draw_bars(canvas, series, colors):
+            canvas.delete('all')
+            width = max(canvas.winfo_width(), 400)
+            height = int(canvas['height'])
+            peak = max((max(values) for values in series if values), default=0) or 1
+            slot = (width - 40) / max(len(series[0]), 1)
+            for values, color, inset in zip(series, colors, (0, slot * 0.25)):
+                for day, value in enumerate(values):
+                    x = 20 + day * slot + inset
+                    bar = (height - 30) * value / peak
+                    canvas.create_rectangle(
+                        x + 1, height - 20 - bar, x + slot - 2 * inset - 1, height - 20,
+                        fill=color, width=0
+                    )
+            canvas.create_text(20, 10, anchor=tk.NW, text=f"max {peak}", fill=COLORS['text_primary'])
+
+        def draw_line(canvas, values, color):
+            canvas.delete('all')
+            width = max(canvas.winfo_width(), 400)
+            height = int(canvas['height'])
+            known = [value for value in values if value is not None]
+            if not known:
+                canvas.create_text(width / 2, height / 2, text="No timed replies yet", fill=COLORS['text_primary'])
+                return
+            peak = max(known) or 1
+            slot = (width - 40) / max(len(values), 1)
+            points = []
+            for day, value in enumerate(values):
+                if value is None:
+                    # Gaps break the line rather than dropping to zero
+                    if len(points) >= 4:
+                        canvas.create_line(*points, fill=color, width=2)
+                    points = []
+                    continue
+                points += [20 + (day + 0.5) * slot, height - 15 - (height - 30) * value / peak]
+                canvas.create_oval(points[-2] - 2, points[-1] - 2, points[-2] + 2, points[-1] + 2,
+                                   fill=color, width=0)
+            if len(points) >= 4:
+                canvas.create_line(*points, fill=color, width=2)
+            canvas.create_text(20, 5, anchor=tk.NW, text=f"max {format_seconds(peak)}", fill=COLORS['text_primary'])
+
+        def refresh(event=None):
+            try:
+                days = max(int(days_var.get()), 1)
+            except ValueError:
+                return
+            summary = self.usage.summary(days)
+            timing_label.configure(text=f"{summary['messages']} messages in {summary['elapsed_ms']:.1f} ms")
+            draw_bars(
+                volume_canvas,
+                [summary['messages_per_day'], summary['replies_per_day']],
+                [COLORS['accent_primary'], COLORS['accent_secondary']]
             )
-            
-            y_pos += 100
+            draw_line(latency_canvas, summary['latency']['by_day'], COLORS['accent_tertiary'])
 
-        # Update scroll region and scroll to bottom
-        self.messages_canvas.configure(scrollregion=self.messages_canvas.bbox("all"))
-        self.messages_canvas.yview_moveto(1.0)
+            chars = summary['reply_chars']
+            latency = summary['latency']
+
+            def count(value):
+                return '–' if value is None else f"{value:.0f}"
+
+            lines = [
+                f"{summary['replies']} replies in {summary['chats']} chats since {summary['first_day']}",
+                f"Reply length (chars): mean {count(chars['mean'])}, p50 {count(chars['p50'])}, "
+                f"p90 {count(chars['p90'])}, p99 {count(chars['p99'])}",
+                f"Latency: p50 {format_seconds(latency['p50'])}, p95 {format_seconds(latency['p95'])}; "
+                f"first token p50 {format_seconds(latency['ttft_p50'])}, p95 {format_seconds(latency['ttft_p95'])}",
+                ""
+            ]
+            for usage in summary['models']:
+                lines.append(
+                    f"{usage['model']}: {usage['replies']} replies, latency p50 "
+                    f"{format_seconds(usage['latency_p50'])}, p95 {format_seconds(usage['latency_p95'])}"
+                )
+            if summary['unknown_model_replies']:
+                lines.append(f"Model not recorded: {summary['unknown_model_replies']} replies")
+            details_label.configure(text="\n".join(lines))
+
+        days_box.bind('<<ComboboxSelected>>', refresh)
+        days_box.bind('<Return>', refresh)
+        ttk.Button(
+            controls,
+            text="Refresh",
+            command=refresh,
+            style='SettingsButton.TButton'
+        ).pack(side=tk.RIGHT, padx=10)
+        usage_window.transient(self.root)
+        # Draw once the canvases have their real width
+        usage_window.after(50, refresh)
 
     def show_settings(self):
         settings_window = tk.Toplevel(self.root)
         settings_window.title("Settings")
-        settings_window.geometry("800x700")
+        settings_window.geometry("800x800")
         settings_window.configure(bg=COLORS['bg_settings'])
         
         # Main container with padding
@@ -460,7 +1327,7 @@ class QuantumChat:
             style='Settings.TLabel'
         ).pack(side=tk.LEFT)
         
-        models = ['qwen2.5:14b', 'qwen1.5:14b', 'qwen1.5:7b', 'qwen1.5:4b']
+        models = Settings.MODELS
         model_var = tk.StringVar(value=self.settings['model_settings']['model'])
         model_dropdown = ttk.Combobox(
             model_frame,
@@ -517,6 +1384,7 @@ class QuantumChat:
                 style='Settings.Horizontal.TScale'
             )
             scale.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(15, 15))
+            scale.value_var = value_var
             setattr(self, f'scale_{key}', scale)
         
         # Memory Settings Section
@@ -560,6 +1428,35 @@ class QuantumChat:
             style='Settings.TCheckbutton'
         )
         summary_check.pack(side=tk.LEFT)
+
+        # Display Section
+        display_section = ttk.Frame(main_frame, style='SettingsSection.TFrame')
+        display_section.pack(fill=tk.X, pady=20)
+
+        ttk.Label(
+            display_section,
+            text="Display",
+            style='SettingsHeader.TLabel'
+        ).pack(anchor=tk.W)
+
+        view_frame = ttk.Frame(display_section, style='Settings.TFrame')
+        view_frame.pack(fill=tk.X, pady=10)
+
+        ttk.Label(
+            view_frame,
+            text="Message View:",
+            style='Settings.TLabel'
+        ).pack(side=tk.LEFT)
+
+        view_var = tk.StringVar(value=self.settings['ui_settings'].get('message_view', 'canvas'))
+        ttk.Combobox(
+            view_frame,
+            textvariable=view_var,
+            values=VIEWS,
+            state='readonly',
+            style='Settings.TCombobox',
+            width=10
+        ).pack(side=tk.LEFT, padx=(15, 0))
         
         # Buttons
         button_frame = ttk.Frame(main_frame, style='Settings.TFrame')
@@ -582,6 +1479,9 @@ class QuantumChat:
                 {
                     'buffer_size': int(buffer_var.get()),
                     'summary_enabled': summary_enabled.get()
+                },
+                {
+                    'message_view': view_var.get()
                 }
             ),
             style='SettingsButton.TButton'
@@ -602,21 +1502,38 @@ class QuantumChat:
         
         # Calculate position
         x = self.root.winfo_x() + (self.root.winfo_width() - 800) // 2
-        y = self.root.winfo_y() + (self.root.winfo_height() - 700) // 2
+        y = self.root.winfo_y() + (self.root.winfo_height() - 800) // 2
         settings_window.geometry(f"+{x}+{y}")
 
-    def save_settings(self, window, api_url, model, model_params, memory_params):
+    def save_settings(self, window, api_url, model, model_params, memory_params, ui_params):
         # Update settings
         self.settings['api_url'] = api_url
         self.settings['model_settings']['model'] = model
         self.settings['model_settings'].update(model_params)
         self.settings['memory_settings'].update(memory_params)
+        view_changed = ui_params['message_view'] != self.settings['ui_settings'].get('message_view', 'canvas')
+        self.settings['ui_settings'].update(ui_params)
         
         # Save to file
         Settings.save_settings(self.settings)
         
         # Update LLM
         self.llm.update_settings(self.settings)
+        self.recall.update_settings(self.settings)
+        self.cache.update_settings(self.settings)
+        self.checkpoints.update_settings(self.settings)
+        if self.blobs:
+            self.blobs.update_settings(self.settings)
+        self.usage.update_settings(self.settings)
+        if self.scheduler:
+            self.scheduler.update_settings(self.settings)
+        if self.backup_scheduler:
+            self.backup_scheduler.update_settings(self.settings['backup_settings'])
+        if self.api_server:
+            self.api_server.update_settings(self.settings)
+        if view_changed:
+            self.setup_message_view()
+            self.update_messages_display()
         
         # Close settings window
         window.destroy()
@@ -0,0 +1,228 @@
+"""Cold storage for chats nobody has touched in a while.
+
+Idle chats are moved out of ``chats/`` into append-only pack files in
+``chat_archive/``:
+
+    pack-<timestamp>.pack   archived chats, one after another
+    index.json              chat id -> pack, offset and length, plus the
+                            chat's metadata and message count
+
+A chat in a pack is its chat file cut into frames of FRAME_SIZE bytes,
+each compressed on its own, followed by the chat's message offsets (see
+paging). Chat files are streamed in frame by frame, and reading a page of
+an archived chat inflates only the frames its byte range falls in. The
+sidebar is built from the index without touching the packs. When an
+archived chat is written to again it is restored as a hot file in
+``chats/`` and dropped from the index. Packs whose chats have mostly been
+restored or deleted are rewritten by ``compact`` without recompressing.
+
+Packs written before frames were introduced hold each chat as a single
+compressed stream without offsets; those chats are inflated whole.
+"""
+import os
+import sys
+import json
+import array
+import zlib
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import BinaryIO, Dict, Any, List, Tuple
+
+logger = logging.getLogger('QuantumChat.Archive')
+
+
+class ChatArchive:
+    INDEX_FILE = 'index.json'
+    COMPACT_BELOW = 0.5  # live share of a pack below which it is rewritten
+    FRAME_SIZE = 128 * 1024  # uncompressed bytes per frame
+    COPY_SIZE = 1024 * 1024
+
+    def __init__(self, archive_dir: str = 'chat_archive'):
+        self.dir = Path(archive_dir)
+        self.index_path = self.dir / self.INDEX_FILE
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def __contains__(self, chat_id: str) -> bool:
+        return chat_id in self.entries
+
+    def load(self) -> None:
+        try:
+            if self.index_path.exists():
+                with open(self.index_path, 'r') as f:
+                    self.entries = json.load(f)
+                logger.info(f"Archive index loaded: {len(self.entries)} chats")
+        except Exception as e:
+            logger.error(f"Error loading archive index: {str(e)}")
+            self.entries = {}
+
+    def _save_index(self) -> None:
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def add(self, chats: List[Tuple[Dict[str, Any], int, int, Path, Path]]) -> None:
+        """Stream chats into a new pack.
+
+        Each item is (metadata, message count, end of the last message, chat
+        file, offsets file). The pack and index are synced before returning,
+        so the caller can delete the hot files afterwards.
+        """
+        if not chats:
+            return
+        self.dir.mkdir(exist_ok=True)
+        pack_name = f"pack-{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.pack"
+        archived = datetime.now().isoformat()
+        new_entries = {}
+        with open(self.dir / pack_name, 'wb') as f:
+            for metadata, count, end, chat_path, offsets_path in chats:
+                offset = f.tell()
+                frames = []
+                size = 0
+                with open(chat_path, 'rb') as src:
+                    for chunk in iter(lambda: src.read(self.FRAME_SIZE), b''):
+                        frame = zlib.compress(chunk, 6)
+                        f.write(frame)
+                        frames.append(len(frame))
+                        size += len(chunk)
+                with open(offsets_path, 'rb') as src:
+                    for chunk in iter(lambda: src.read(self.COPY_SIZE), b''):
+                        f.write(chunk)
+                new_entries[metadata['id']] = {
+                    'pack': pack_name,
+                    'offset': offset,
+                    'length': f.tell() - offset,
+                    'size': size,
+                    'frames': frames,
+                    'frame_size': self.FRAME_SIZE,
+                    'end': end,
+                    'count': count,
+                    'chat': metadata,
+                    'archived': archived
+                }
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self.entries.update(new_entries)
+            self._save_index()
+        logger.info(f"Archived {len(new_entries)} chats into {pack_name}")
+
+    def _entry(self, chat_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return self.entries[chat_id]
+
+    @staticmethod
+    def _frames(entry: Dict[str, Any]) -> List[int]:
+        # Old packs hold one stream covering the whole chat
+        return entry.get('frames') or [entry['length']]
+
+    def _read_frames(self, entry: Dict[str, Any], first: int, last: int) -> bytes:
+        """Inflate frames first..last (inclusive) of an entry"""
+        frames = self._frames(entry)
+        position = entry['offset'] + sum(frames[:first])
+        with open(self.dir / entry['pack'], 'rb') as f:
+            f.seek(position)
+            return b''.join(zlib.decompress(f.read(length)) for length in frames[first:last + 1])
+
+    def _copy_entry(self, entry: Dict[str, Any], out: BinaryIO) -> None:
+        """Copy an entry's bytes as they are, without holding the whole chat"""
+        with open(self.dir / entry['pack'], 'rb') as f:
+            f.seek(entry['offset'])
+            remaining = entry['length']
+            while remaining:
+                chunk = f.read(min(remaining, self.COPY_SIZE))
+                if not chunk:
+                    raise EOFError(f"Archive pack {entry['pack']} is truncated")
+                out.write(chunk)
+                remaining -= len(chunk)
+
+    def inflate(self, chat_id: str) -> Dict[str, Any]:
+        """The archived chat file, parsed"""
+        entry = self._entry(chat_id)
+        return json.loads(self._read_frames(entry, 0, len(self._frames(entry)) - 1))
+
+    def pageable(self, chat_id: str) -> bool:
+        """Whether the chat's offsets are in its pack, so it can be read a page at a time"""
+        return 'frames' in self._entry(chat_id)
+
+    def extent(self, chat_id: str) -> Tuple[int, int]:
+        """Message count and end offset of the last message"""
+        entry = self._entry(chat_id)
+        return entry['count'], entry['end']
+
+    def read_offsets(self, chat_id: str, start: int, stop: int) -> List[int]:
+        """Start offsets of messages [start, stop) in the archived chat file"""
+        entry = self._entry(chat_id)
+        offsets = array.array('Q')
+        with open(self.dir / entry['pack'], 'rb') as f:
+            f.seek(entry['offset'] + sum(entry['frames']) + start * 8)
+            offsets.frombytes(f.read((stop - start) * 8))
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        return offsets.tolist()
+
+    def read_bytes(self, chat_id: str, begin: int, end: int) -> bytes:
+        """Bytes [begin, end) of the archived chat file, inflating only the frames they span"""
+        entry = self._entry(chat_id)
+        if end <= begin:
+            return b''
+        frame_size = entry['frame_size']
+        first = begin // frame_size
+        data = self._read_frames(entry, first, (end - 1) // frame_size)
+        skip = begin - first * frame_size
+        return data[skip:skip + end - begin]
+
+    def extract(self, chat_id: str, chat_file: BinaryIO, offsets_file: BinaryIO) -> None:
+        """Write a pageable chat's file and offsets back out, a frame at a time"""
+        entry = self._entry(chat_id)
+        with open(self.dir / entry['pack'], 'rb') as f:
+            f.seek(entry['offset'])
+            for length in entry['frames']:
+                chat_file.write(zlib.decompress(f.read(length)))
+            remaining = entry['count'] * 8
+            while remaining:
+                chunk = f.read(min(remaining, self.COPY_SIZE))
+                if not chunk:
+                    raise EOFError(f"Archived offsets of {chat_id} are truncated")
+                offsets_file.write(chunk)
+                remaining -= len(chunk)
+
+    def remove(self, chat_id: str) -> None:
+        """Forget a chat that was restored or deleted; its bytes stay until compact()"""
+        with self._lock:
+            if self.entries.pop(chat_id, None) is None:
+                return
+            self._save_index()
+
+    def compact(self) -> None:
+        """Rewrite packs that are mostly dead space and delete packs with no live chats"""
+        with self._lock:
+            live: Dict[str, int] = {}
+            for entry in self.entries.values():
+                live[entry['pack']] = live.get(entry['pack'], 0) + entry['length']
+            packs = sorted(self.dir.glob('pack-*.pack')) if self.dir.exists() else []
+
+            for pack in packs:
+                size = pack.stat().st_size
+                live_bytes = live.get(pack.name, 0)
+                if live_bytes and (not size or live_bytes / size >= self.COMPACT_BELOW):
+                    continue
+                moved = {chat_id: entry for chat_id, entry in self.entries.items()
+                         if entry['pack'] == pack.name}
+                if moved:
+                    new_name = f"pack-{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.pack"
+                    with open(self.dir / new_name, 'wb') as f:
+                        for chat_id, entry in moved.items():
+                            self.entries[chat_id] = dict(entry, pack=new_name, offset=f.tell())
+                            self._copy_entry(entry, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._save_index()
+                pack.unlink()
+                logger.info(f"Compacted archive pack {pack.name} ({len(moved)} chats kept)")
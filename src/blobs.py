@@ -0,0 +1,215 @@
+"""Content-addressed storage for large message bodies.
+
+Message content of ``threshold`` characters or more is not written into the
+chat file. It is compressed into ``chat_blobs/`` under the SHA-256 of its
+text, and the message on disk holds only the hash and length:
+
+    {"role": "user", "blob": "9f86d0...", "size": 48213, "timestamp": ...}
+
+A document pasted into several chats is stored once. In memory such a
+message holds a BlobRef instead of the string, and its text is read (through
+a small LRU cache) only when it is rendered, indexed or sent to the model.
+
+``refs.json`` records which chats reference each blob. The references of a
+chat are replaced whenever its file is rewritten and dropped when it is
+deleted, and a blob nobody references any more is removed. A new blob is
+recorded as referenced before the chat file naming it is written, so a crash
+in between can leak a blob but never lose one.
+
+One process owns the store: the engine when it is running, otherwise the
+GUI. Servers started in the same process share its instance; other
+processes only read. A blob that cannot be read comes back as None, never as
+stand-in text, so nothing made up is saved, exported or sent to the model.
+"""
+import os
+import json
+import zlib
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Optional, Set
+
+logger = logging.getLogger('QuantumChat.Blobs')
+
+
+class BlobRef:
+    """Stand-in for the content of a message kept in the blob store"""
+
+    __slots__ = ('digest', 'size', 'store')
+
+    def __init__(self, digest: str, size: int, store: 'BlobStore'):
+        self.digest = digest
+        self.size = size
+        self.store = store
+
+    def load(self) -> Optional[str]:
+        return self.store.get(self.digest)
+
+
+class BlobStore:
+    REFS_FILE = 'refs.json'
+
+    def __init__(self, settings: Dict[str, Any], blob_dir: str = 'chat_blobs'):
+        self.dir = Path(blob_dir)
+        self.refs_path = self.dir / self.REFS_FILE
+        self.refs: Dict[str, Set[str]] = {}
+        self._by_chat: Dict[str, Set[str]] = {}
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.RLock()
+        self.update_settings(settings)
+        self.load()
+
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        blob_settings = settings.get('blob_settings', {})
+        self.enabled = blob_settings.get('enabled', True)
+        self.threshold = max(int(blob_settings.get('threshold', 8192)), 1)
+        self.cache_bytes = int(float(blob_settings.get('cache_mb', 8)) * 1024 * 1024)
+
+    def load(self) -> None:
+        try:
+            if self.refs_path.exists():
+                with open(self.refs_path, 'r') as f:
+                    refs = json.load(f)
+                self.refs = {digest: set(chat_ids) for digest, chat_ids in refs.items()}
+                for digest, chat_ids in self.refs.items():
+                    for chat_id in chat_ids:
+                        self._by_chat.setdefault(chat_id, set()).add(digest)
+                logger.info(f"Blob references loaded: {len(self.refs)} blobs")
+        except Exception as e:
+            logger.error(f"Error loading blob references: {str(e)}")
+            self.refs = {}
+            self._by_chat = {}
+
+    def _save_refs(self) -> None:
+        self.dir.mkdir(exist_ok=True)
+        tmp_path = self.refs_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({digest: sorted(chat_ids) for digest, chat_ids in self.refs.items()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.refs_path)
+
+    def _path(self, digest: str) -> Path:
+        return self.dir / digest[:2] / digest
+
+    def should_store(self, content: Any) -> bool:
+        return self.enabled and isinstance(content, str) and len(content) >= self.threshold
+
+    def ref(self, digest: str, size: int) -> BlobRef:
+        return BlobRef(digest, size, self)
+
+    # Writing
+
+    def put(self, chat_id: str, content: str) -> BlobRef:
+        """Store content (once per hash) and record that chat_id references it"""
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        path = self._path(digest)
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix('.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(zlib.compress(content.encode('utf-8'), 6))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            holders = self.refs.setdefault(digest, set())
+            if chat_id not in holders:
+                holders.add(chat_id)
+                self._by_chat.setdefault(chat_id, set()).add(digest)
+                self._save_refs()
+            self._remember(digest, content)
+        return BlobRef(digest, len(content), self)
+
+    def set_refs(self, chat_id: str, digests: Iterable[str]) -> None:
+        """Replace the blobs a chat references after its file was rewritten"""
+        digests = set(digests)
+        with self._lock:
+            current = self._by_chat.get(chat_id, set())
+            if digests == current:
+                return
+            for digest in digests - current:
+                self.refs.setdefault(digest, set()).add(chat_id)
+            dropped = current - digests
+            for digest in dropped:
+                self.refs.get(digest, set()).discard(chat_id)
+            if digests:
+                self._by_chat[chat_id] = digests
+            else:
+                self._by_chat.pop(chat_id, None)
+            self._collect(dropped)
+
+    def release(self, chat_id: str) -> None:
+        """A chat was deleted; drop its references"""
+        self.set_refs(chat_id, ())
+
+    def _collect(self, digests: Iterable[str]) -> None:
+        """Save the references, then delete blobs among digests that nobody references"""
+        unreferenced = [digest for digest in digests if not self.refs.get(digest)]
+        for digest in unreferenced:
+            self.refs.pop(digest, None)
+        self._save_refs()
+        for digest in unreferenced:
+            try:
+                self._path(digest).unlink()
+            except FileNotFoundError:
+                pass
+            self._forget(digest)
+        if unreferenced:
+            logger.info(f"Removed {len(unreferenced)} unreferenced blobs")
+
+    # Reading
+
+    def get(self, digest: str) -> Optional[str]:
+        """The content stored under digest, or None if it cannot be read"""
+        with self._lock:
+            content = self._cache.get(digest)
+            if content is not None:
+                self._cache.move_to_end(digest)
+                return content
+        try:
+            with open(self._path(digest), 'rb') as f:
+                content = zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error) as e:
+            logger.error(f"Error reading blob {digest}: {str(e)}")
+            return None
+        with self._lock:
+            self._remember(digest, content)
+        return content
+
+    def inline(self, chat: Dict[str, Any]) -> Dict[str, Any]:
+        """Put the content back into a chat read as plain JSON, in place
+
+        A message whose blob cannot be read keeps its blob and size keys.
+        """
+        for index, msg in enumerate(chat.get('messages', [])):
+            if 'blob' not in msg:
+                continue
+            content = self.get(msg['blob'])
+            if content is None:
+                continue
+            data = {}
+            for key, value in msg.items():
+                if key == 'blob':
+                    data['content'] = content
+                elif key != 'size':
+                    data[key] = value
+            chat['messages'][index] = data
+        return chat
+
+    def _remember(self, digest: str, content: str) -> None:
+        if digest in self._cache or len(content) > self.cache_bytes:
+            return
+        self._cache[digest] = content
+        self._cache_bytes += len(content)
+        while self._cache_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+    def _forget(self, digest: str) -> None:
+        content = self._cache.pop(digest, None)
+        if content is not None:
+            self._cache_bytes -= len(content)
@@ -0,0 +1,106 @@
+"""Conversation branches.
+
+A chat's ``messages`` list is an append-only array of tree nodes. A message
+whose ``parent`` is None continues the message stored just before it, so
+linear chats (every chat written before branching existed) need no extra
+data. Editing a prompt or regenerating a reply appends a new node whose
+``parent`` points at the fork, so every branch shares its common prefix with
+the others instead of copying it.
+
+``chat['active_leaf']`` selects the branch that is shown and sent to the
+model; when absent the last stored message is the leaf. ``chat['branched']``
+marks chats that have forks, which are always fully loaded (see paging)
+because a path can start anywhere in the array.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+
+from paging import message_total
+
+ROOT = -1
+
+
+def parent_index(chat: Dict[str, Any], index: int) -> int:
+    """Absolute index of a message's parent, or ROOT"""
+    parent = message_at(chat, index).get('parent')
+    return index - 1 if parent is None else parent
+
+
+def message_at(chat: Dict[str, Any], index: int) -> Any:
+    return chat['messages'][index - chat.get('first_loaded', 0)]
+
+
+def active_leaf(chat: Dict[str, Any]) -> int:
+    leaf = chat.get('active_leaf')
+    return message_total(chat) - 1 if leaf is None else leaf
+
+
+def set_active_leaf(chat: Dict[str, Any], leaf: int) -> None:
+    # The default (last message) is left implicit so appends keep the metadata unchanged
+    if leaf == message_total(chat) - 1:
+        chat.pop('active_leaf', None)
+    else:
+        chat['active_leaf'] = leaf
+
+
+def active_path(chat: Dict[str, Any]) -> List[int]:
+    """Absolute indices of the active branch's loaded messages, root first"""
+    first_loaded = chat.get('first_loaded', 0)
+    if not chat.get('branched'):
+        return list(range(first_loaded, message_total(chat)))
+
+    path = []
+    index = active_leaf(chat)
+    while index >= first_loaded:
+        path.append(index)
+        index = parent_index(chat, index)
+    path.reverse()
+    return path
+
+
+def child_map(chat: Dict[str, Any]) -> Dict[int, List[int]]:
+    """Children of every loaded node, oldest first"""
+    children: Dict[int, List[int]] = {}
+    for index in range(chat.get('first_loaded', 0), message_total(chat)):
+        children.setdefault(parent_index(chat, index), []).append(index)
+    return children
+
+
+def sibling_position(chat: Dict[str, Any], index: int,
+                     children: Dict[int, List[int]]) -> Optional[Tuple[int, int]]:
+    """(1-based position, count) among alternatives, or None if there are none"""
+    siblings = children.get(parent_index(chat, index), [index])
+    if len(siblings) < 2:
+        return None
+    return siblings.index(index) + 1, len(siblings)
+
+
+def latest_leaf(index: int, children: Dict[int, List[int]]) -> int:
+    """Follow the newest child down to a leaf"""
+    while children.get(index):
+        index = children[index][-1]
+    return index
+
+
+def switch_sibling(chat: Dict[str, Any], index: int, step: int) -> Optional[int]:
+    """Activate the branch through the sibling `step` places from index; returns it"""
+    children = child_map(chat)
+    siblings = children.get(parent_index(chat, index), [index])
+    position = siblings.index(index) + step
+    if not 0 <= position < len(siblings):
+        return None
+    set_active_leaf(chat, latest_leaf(siblings[position], children))
+    return siblings[position]
+
+
+def activate(chat: Dict[str, Any], index: int) -> None:
+    """Make the newest branch through a message the active one"""
+    if chat.get('branched') and index not in active_path(chat):
+        set_active_leaf(chat, latest_leaf(index, child_map(chat)))
+
+
+def path_messages(chat: Dict[str, Any], upto: Optional[int] = None) -> List[Any]:
+    """Messages on the active path, optionally only those above node `upto`"""
+    path = active_path(chat)
+    if upto is not None:
+        path = path[:path.index(upto)] if upto in path else []
+    return [message_at(chat, index) for index in path]
@@ -0,0 +1,126 @@
+import sys
+import logging
+from collections import OrderedDict, Counter
+from typing import Dict, Any, Optional
+
+from paging import PagedChatStore, message_total
+
+logger = logging.getLogger('QuantumChat.Cache')
+
+
+class ChatCache:
+    """Keeps loaded chat bodies within a memory budget, evicting least recently used.
+
+    Chats stay in ``QuantumChat.chats`` as metadata; evicting one drops its
+    loaded messages and marks them all as unloaded (``first_loaded`` equal to
+    the total), so the next access reads the tail page back from the paged
+    store. Pinned chats (the open chat, chats with a reply in flight) are
+    never evicted.
+    """
+
+    def __init__(self, chats: Dict[str, Dict[str, Any]], store: Optional[PagedChatStore], max_bytes: int):
+        self.chats = chats
+        self.store = store
+        self.max_bytes = max_bytes
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: Counter = Counter()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls, chats: Dict[str, Dict[str, Any]], store: Optional[PagedChatStore],
+                      settings: Dict[str, Any]) -> 'ChatCache':
+        return cls(chats, store, cls.budget_bytes(settings))
+
+    @staticmethod
+    def budget_bytes(settings: Dict[str, Any]) -> int:
+        cache_settings = settings.get('cache_settings', {})
+        return int(float(cache_settings.get('max_memory_mb', 64)) * 1024 * 1024)
+
+    @property
+    def enabled(self) -> bool:
+        # Without a store there is nothing to reload from
+        return self.store is not None and self.max_bytes > 0
+
+    @staticmethod
+    def estimate_size(chat: Dict[str, Any]) -> int:
+        messages = chat.get('messages', [])
+        return sys.getsizeof(messages) + sum(
+            # raw_content: content kept in the blob store costs only its reference
+            sys.getsizeof(msg) + sys.getsizeof(msg.raw_content) for msg in messages
+        )
+
+    def access(self, chat: Dict[str, Any]) -> None:
+        """Make sure a chat's recent messages are resident, reloading them if evicted"""
+        if not self.enabled:
+            return
+        if not chat['messages'] and chat.get('first_loaded'):
+            self.misses += 1
+            self.store.load_tail(chat)
+        else:
+            self.hits += 1
+        self.resize(chat)
+
+    def resize(self, chat: Dict[str, Any]) -> None:
+        """Re-account a chat after its loaded messages changed, then enforce the budget"""
+        if not self.enabled:
+            return
+        chat_id = chat['id']
+        self.resident_bytes -= self._sizes.pop(chat_id, 0)
+        size = self.estimate_size(chat)
+        self._sizes[chat_id] = size
+        self.resident_bytes += size
+        self._enforce(chat)
+
+    def _enforce(self, chat: Dict[str, Any]) -> None:
+        # _sizes is in access order, so the front holds the least recently used
+        for chat_id in list(self._sizes):
+            if self.resident_bytes <= self.max_bytes:
+                break
+            if chat_id == chat['id'] or self._pins[chat_id]:
+                continue
+            victim = self.chats.get(chat_id)
+            if victim is None:
+                self.discard(chat_id)
+                continue
+            self.evict(victim)
+
+    def evict(self, chat: Dict[str, Any]) -> None:
+        chat['first_loaded'] = message_total(chat)
+        chat['messages'] = []
+        self.discard(chat['id'])
+        self.evictions += 1
+        stats = self.stats()
+        logger.info(
+            f"Evicted chat {chat['id']}: {stats['resident_bytes']} bytes in "
+            f"{stats['resident_chats']} chats resident, hit rate {stats['hit_rate']:.0%}"
+        )
+
+    def discard(self, chat_id: str) -> None:
+        self.resident_bytes -= self._sizes.pop(chat_id, 0)
+
+    def pin(self, chat_id: str) -> None:
+        self._pins[chat_id] += 1
+
+    def unpin(self, chat_id: str) -> None:
+        self._pins[chat_id] -= 1
+        if self._pins[chat_id] <= 0:
+            del self._pins[chat_id]
+
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        self.max_bytes = self.budget_bytes(settings)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'resident_chats': len(self._sizes),
+            'resident_bytes': self.resident_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'pinned': len(self._pins)
+        }
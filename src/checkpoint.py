@@ -0,0 +1,202 @@
+"""Crash-safe checkpoints of replies while they stream.
+
+Each reply in flight gets a small journal file in ``reply_checkpoints/``:
+
+    {"chat_id": ..., "prompt_index": 3, "prefix": "", "started": 1718000000.0}
+    {"text": "The first few hundred characters"}
+    {"text": " and the next batch"}
+
+Streamed text is buffered and appended at a bounded rate -- when
+``interval`` seconds have passed since the last write or ``max_bytes`` are
+pending, never per token -- and fsynced, so a crash loses at most one
+batch. The file is removed once the finished reply is stored in the chat.
+
+Files are named after the writing process -- its PID and a token for when
+it started -- so a window sharing an engine never recovers a reply another
+live window is still streaming, and a journal is not kept forever because
+its PID was reused by an unrelated process. Whatever is left behind by a
+dead process is returned by ``recover`` on the next start and stored as an
+incomplete message that can be resumed, unless the reply was stored before
+the crash.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import itertools
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger('QuantumChat.Checkpoint')
+
+_counter = itertools.count()
+
+
+def _start_token(pid: int) -> Optional[str]:
+    """When a process started, in clock ticks since boot; None where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22; the command name (field 2) may contain spaces, so count from its closing paren
+    fields = stat.rsplit(')', 1)[-1].split()
+    return fields[19] if len(fields) > 19 else None
+
+
+# Without /proc a random token still tells this process's journals apart
+_OWNER = (os.getpid(), _start_token(os.getpid()) or uuid.uuid4().hex[:12])
+
+
+class ReplyCheckpoint:
+    """Journal of one streaming reply; add() is called from the worker thread"""
+
+    def __init__(self, path: Path, chat_id: str, prompt_index: int, prefix: str = '',
+                 interval: float = 2.0, max_bytes: int = 4096):
+        self.path = path
+        self.header = {
+            'chat_id': chat_id,
+            'prompt_index': prompt_index,
+            'prefix': prefix,
+            'started': time.time()
+        }
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._last_write = time.monotonic()
+        self._file = None
+
+    def add(self, chunk: str) -> None:
+        self._pending.append(chunk)
+        self._pending_bytes += len(chunk)
+        if (self._pending_bytes >= self.max_bytes or
+                time.monotonic() - self._last_write >= self.interval):
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        try:
+            if self._file is None:
+                self.path.parent.mkdir(exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(json.dumps(self.header) + '\n')
+            self._file.write(json.dumps({'text': ''.join(self._pending)}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            # A failed checkpoint must never break the reply itself
+            logger.error(f"Error writing reply checkpoint: {str(e)}")
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_write = time.monotonic()
+
+    def discard(self) -> None:
+        """The reply has been stored (or abandoned); drop the journal"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error removing reply checkpoint: {str(e)}")
+
+
+class CheckpointStore:
+    def __init__(self, settings: Dict[str, Any], checkpoint_dir: str = 'reply_checkpoints'):
+        self.dir = Path(checkpoint_dir)
+        self.update_settings(settings)
+
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        checkpoint_settings = settings.get('checkpoint_settings', {})
+        self.enabled = checkpoint_settings.get('enabled', True)
+        self.interval = float(checkpoint_settings.get('interval', 2.0))
+        self.max_bytes = int(checkpoint_settings.get('max_bytes', 4096))
+
+    def begin(self, chat_id: str, prompt_index: int, prefix: str = '') -> Optional[ReplyCheckpoint]:
+        if not self.enabled:
+            return None
+        pid, token = _OWNER
+        path = self.dir / f"{pid}-{token}-{int(time.time() * 1000)}-{next(_counter)}.journal"
+        return ReplyCheckpoint(path, chat_id, prompt_index, prefix, self.interval, self.max_bytes)
+
+    def recover(self) -> List[Dict[str, Any]]:
+        """Replies left behind by processes that are no longer running.
+
+        Each entry has chat_id, prompt_index, content (prefix plus every
+        checkpointed batch), started and path; call remove(entry) once the
+        content is stored.
+        """
+        recovered = []
+        if not self.dir.exists():
+            return recovered
+        for path in sorted(self.dir.glob('*.journal')):
+            if self._owner_alive(path):
+                continue
+            entry = self._read(path)
+            if entry is None or not entry['content']:
+                self.remove({'path': path})
+                continue
+            recovered.append(entry)
+        return recovered
+
+    def remove(self, entry: Dict[str, Any]) -> None:
+        try:
+            Path(entry['path']).unlink()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _owner_alive(path: Path) -> bool:
+        parts = path.name.split('-')
+        try:
+            pid = int(parts[0])
+        except ValueError:
+            return False
+        # Journals written before the start token was added have three parts
+        token = parts[1] if len(parts) == 4 else None
+        if (pid, token) == _OWNER:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        except OSError:
+            return False
+        # The PID is in use; it is the writer only if it started when the writer did
+        current = _start_token(pid)
+        return token is None or current is None or current == token
+
+    @staticmethod
+    def _read(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            logger.error(f"Error reading reply checkpoint {path}: {str(e)}")
+            return None
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return None
+
+        parts = [header.get('prefix', '')]
+        for line in lines[1:]:
+            try:
+                parts.append(json.loads(line)['text'])
+            except (ValueError, KeyError, TypeError):
+                # A torn final write; everything before it is intact
+                break
+        return {
+            'chat_id': header['chat_id'],
+            'prompt_index': header['prompt_index'],
+            'started': header.get('started'),
+            'content': ''.join(parts),
+            'path': str(path)
+        }
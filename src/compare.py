@@ -0,0 +1,159 @@
+"""Fan one prompt out to several models or parameter sets at once.
+
+Each variant streams on its own thread through the shared ClientPool, and
+every reply is timed on the client side:
+
+    queue_wait      seconds spent waiting for an LLMScheduler slot
+    ttft            seconds from sending the request to the first token
+    latency         seconds from sending the request to the last token
+    tokens          output tokens (Ollama's eval_count when it reports it,
+                    otherwise the number of streamed chunks)
+    tokens_per_sec  tokens over the time between first and last token
+
+Ollama may queue requests for different models behind each other depending
+on OLLAMA_NUM_PARALLEL and OLLAMA_MAX_LOADED_MODELS; that queueing shows up
+in TTFT, which is what a user waiting on the reply would see too. Waiting for
+our own scheduler is reported apart, so it does not skew the model timings.
+"""
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable
+
+from langchain.schema import HumanMessage
+
+from llm import LLM, ClientPool, normalize_base_url
+from scheduler import INTERACTIVE
+
+logger = logging.getLogger('QuantumChat.Compare')
+
+
+def variant_label(variant: Dict[str, Any]) -> str:
+    return f"{variant['model']} @ T={float(variant.get('temperature', 0.7)):.2f}"
+
+
+def output_tokens(chunk: Any) -> Optional[int]:
+    """Output token count reported on a stream's final chunk, if any"""
+    usage = getattr(chunk, 'usage_metadata', None)
+    if usage and usage.get('output_tokens'):
+        return int(usage['output_tokens'])
+    metadata = getattr(chunk, 'response_metadata', None) or {}
+    if metadata.get('eval_count'):
+        return int(metadata['eval_count'])
+    return None
+
+
+class CompareRun:
+    """One prompt sent concurrently to every variant.
+
+    Callbacks are invoked from worker threads: on_chunk(i, text) for each
+    streamed piece, on_done(i, metrics) when variant i finishes and
+    on_error(i, message) if it fails.
+    """
+
+    def __init__(self, settings: Dict[str, Any], variants: List[Dict[str, Any]],
+                 pool: Optional[ClientPool] = None, scheduler=None):
+        self.settings = settings
+        self.variants = variants
+        self.pool = pool or ClientPool()
+        self.scheduler = scheduler
+        self.cancelled = threading.Event()
+        self.results: List[Optional[Dict[str, Any]]] = [None] * len(variants)
+
+    def client_for(self, variant: Dict[str, Any]):
+        model_settings = dict(self.settings['model_settings'])
+        model_settings.update({key: value for key, value in variant.items() if key != 'model'})
+        return self.pool.get(
+            normalize_base_url(self.settings.get('api_url')),
+            variant['model'],
+            LLM.client_params(model_settings, self.settings.get('request_settings', {}))
+        )
+
+    def start(self, prompt: str, history: List[Any],
+              on_chunk: Callable[[int, str], None],
+              on_done: Callable[[int, Dict[str, Any]], None],
+              on_error: Callable[[int, str], None]) -> None:
+        # Same history window as a normal reply
+        history_limit = max(int(self.settings['memory_settings'].get('buffer_size', 8)), 1) * 2
+        messages = LLM.chat_messages(history[-history_limit:]) + [HumanMessage(content=prompt)]
+
+        for index, variant in enumerate(self.variants):
+            threading.Thread(
+                target=self._run_variant,
+                args=(index, variant, messages, on_chunk, on_done, on_error),
+                name=f'Compare-{index}',
+                daemon=True
+            ).start()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def _run_variant(self, index, variant, messages, on_chunk, on_done, on_error) -> None:
+        enqueued = time.perf_counter()
+        try:
+            if self.scheduler:
+                # The user is watching these stream, so they count as interactive
+                with self.scheduler.slot(INTERACTIVE, 'compare'):
+                    self._stream_variant(index, variant, messages, enqueued, on_chunk, on_done)
+            else:
+                self._stream_variant(index, variant, messages, enqueued, on_chunk, on_done)
+        except Exception as e:
+            logger.error(f"Compare variant {variant_label(variant)} failed: {str(e)}")
+            on_error(index, str(e))
+
+    def _stream_variant(self, index, variant, messages, enqueued, on_chunk, on_done) -> None:
+        # The clock starts once the slot is granted; the wait for it is reported apart
+        started = time.perf_counter()
+        client = self.client_for(variant)
+        first_token = None
+        chunks = 0
+        reported_tokens = None
+        parts = []
+
+        for chunk in client.stream(messages):
+            if self.cancelled.is_set():
+                break
+            reported_tokens = output_tokens(chunk) or reported_tokens
+            if chunk.content:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                chunks += 1
+                parts.append(chunk.content)
+                on_chunk(index, chunk.content)
+
+        finished = time.perf_counter()
+        tokens = reported_tokens or chunks
+        generating = finished - first_token if first_token is not None else 0.0
+        metrics = {
+            'label': variant_label(variant),
+            'queue_wait': started - enqueued,
+            'ttft': first_token - started if first_token is not None else None,
+            'latency': finished - started,
+            'tokens': tokens,
+            'tokens_per_sec': tokens / generating if generating > 0 else None,
+            'content': ''.join(parts),
+            'cancelled': self.cancelled.is_set()
+        }
+        self.results[index] = metrics
+        logger.info(
+            f"{metrics['label']}: queue_wait={format_seconds(metrics['queue_wait'])} "
+            f"ttft={format_seconds(metrics['ttft'])} "
+            f"latency={format_seconds(metrics['latency'])} tokens={tokens}"
+        )
+        on_done(index, metrics)
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return '–' if value is None else f"{value:.2f}s"
+
+
+def format_metrics(metrics: Dict[str, Any]) -> str:
+    rate = metrics['tokens_per_sec']
+    text = (
+        f"TTFT {format_seconds(metrics['ttft'])} · "
+        f"{'–' if rate is None else f'{rate:.1f}'} tok/s · "
+        f"{metrics['tokens']} tokens · total {format_seconds(metrics['latency'])}"
+    )
+    if metrics.get('queue_wait', 0.0) >= 0.01:
+        text += f" · queued {format_seconds(metrics['queue_wait'])}"
+    return text
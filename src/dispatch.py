@@ -0,0 +1,94 @@
+import time
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+from typing import Callable, Any, Optional, Tuple, Hashable
+
+logger = logging.getLogger('QuantumChat.Dispatch')
+
+
+class UIDispatcher:
+    """Thread-safe queue of UI callbacks drained by one periodic Tk ``after`` pump.
+
+    Worker threads ``post`` callbacks instead of calling ``root.after``
+    themselves. Posts that share a ``key`` coalesce while pending: with a
+    ``merge`` function their arguments are combined (e.g. streamed text
+    chunks are concatenated), otherwise the latest post replaces the earlier
+    one. Each tick runs callbacks until the frame budget is used up and
+    leaves the rest for the next tick, so Tk keeps handling input and redraws.
+    """
+
+    def __init__(self, root, interval_ms: int = 16, budget_ms: float = 8.0):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.budget = budget_ms / 1000.0
+        self._pending: "OrderedDict[Hashable, Tuple[Callable, tuple, Optional[Callable]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._running = False
+        self.stats = {'posted': 0, 'merged': 0, 'executed': 0, 'deferred_ticks': 0, 'errors': 0}
+
+    def start(self) -> None:
+        if not self._running:
+            self._running = True
+            self.root.after(self.interval_ms, self._pump)
+
+    def stop(self) -> None:
+        self._running = False
+
+    def post(self, callback: Callable, *args: Any,
+             key: Optional[Hashable] = None,
+             merge: Optional[Callable[[tuple, tuple], tuple]] = None) -> None:
+        """Queue callback(*args) to run on the Tk thread"""
+        with self._lock:
+            self.stats['posted'] += 1
+            if key is None:
+                key = ('_unique', next(self._counter))
+            elif key in self._pending:
+                if merge is not None:
+                    args = merge(self._pending[key][1], args)
+                self._pending[key] = (callback, args, merge)
+                self.stats['merged'] += 1
+                return
+            self._pending[key] = (callback, args, merge)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def drain(self, budget: Optional[float] = None) -> int:
+        """Run pending callbacks until the budget (seconds) runs out; returns how many ran"""
+        deadline = time.perf_counter() + (self.budget if budget is None else budget)
+        executed = 0
+        while True:
+            with self._lock:
+                if not self._pending:
+                    break
+                _, (callback, args, _) = self._pending.popitem(last=False)
+            try:
+                callback(*args)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"UI callback {getattr(callback, '__name__', callback)} failed: {str(e)}")
+            executed += 1
+            if time.perf_counter() >= deadline:
+                self.stats['deferred_ticks'] += 1
+                break
+        self.stats['executed'] += executed
+        return executed
+
+    def _pump(self) -> None:
+        if not self._running:
+            return
+        self.drain()
+        try:
+            self.root.after(self.interval_ms, self._pump)
+        except Exception:
+            # The root window is gone
+            self._running = False
+
+
+def concat_chunks(pending_args: tuple, new_args: tuple) -> tuple:
+    """Merge for (target, text) posts: keep the target and join the text"""
+    return pending_args[:-1] + (pending_args[-1] + new_args[-1],)
@@ -0,0 +1,703 @@
+"""Optional local engine daemon shared by several Quantum Chat windows.
+
+The engine owns the chat store, chat order, search and recall indexes,
+backups and the pooled model clients. GUI processes connect over a Unix
+socket and exchange newline-delimited JSON:
+
+    request:  {"id": 1, "method": "save_chat", "params": {...}}
+    response: {"id": 1, "result": ...} or {"id": 1, "error": "..."}
+    chunk:    {"id": 1, "chunk": "..."}          (streamed generate replies)
+    event:    {"event": "chat_saved", "data": {...}}
+
+Run it with ``python engine.py`` from the data directory and enable
+``engine_settings.enabled`` in settings.json.
+"""
+import os
+import json
+import queue
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from typing import Dict, Any, Callable, Optional, List
+
+from settings import Settings
+from utils import ChatOrderManager, BackupManager, BackupScheduler, Logger
+from llm import LLM, ClientPool
+from search import SearchIndex
+from recall import RecallService
+from scheduler import LLMScheduler
+from resilience import LLMError, LLMConnectionError, ERROR_TYPES
+from api_server import ApiServer
+from blobs import BlobStore
+from archive import ChatArchive
+from paging import PagedChatStore, RUNTIME_KEYS, message_total
+from messages import Message, messages_from_json
+from analytics import UsageRecorder
+
+logger = logging.getLogger('QuantumChat.Engine')
+
+DEFAULT_SOCKET = 'engine.sock'
+
+
+class EngineError(Exception):
+    """Raised on the client when the engine reports an error or goes away"""
+
+
+class StaleChatError(EngineError):
+    """A save was based on an older version of the chat than the stored one"""
+
+    def __init__(self, message: str, chat: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.chat = chat
+
+
+def _send(sock_file, lock: threading.Lock, message: Dict[str, Any]) -> None:
+    data = (json.dumps(message) + "\n").encode()
+    with lock:
+        sock_file.write(data)
+        sock_file.flush()
+
+
+def message_to_client(msg: Message) -> Dict[str, Any]:
+    """A stored message in the JSON schema, with blob content read back in"""
+    data = msg.to_dict()
+    if 'blob' in data:
+        del data['blob'], data['size']
+        data['content'] = msg.content
+    return data
+
+
+def chat_to_client(chat: Dict[str, Any]) -> Dict[str, Any]:
+    """Chat metadata as sent to windows: no messages, all of them still to page in"""
+    return dict(chat, messages=[], first_loaded=message_total(chat))
+
+
+class Engine:
+    """Shared state behind every connection
+
+    Chats are kept as metadata on the same paged store the GUI uses
+    standalone; windows page messages in with read_messages. Every change
+    bumps the chat's in-memory ``version``, and a save carrying any other
+    version than the current one was made from a stale copy and is
+    rejected, so windows cannot overwrite each other's changes.
+    """
+
+    def __init__(self):
+        self.settings = Settings.load_settings()
+        self.blobs = BlobStore(self.settings)
+        self.store = PagedChatStore(archive=ChatArchive(), blobs=self.blobs)
+        self.chats: Dict[str, Dict[str, Any]] = {}
+        self.chats_lock = threading.RLock()
+        self.load_chats()
+        self.chat_order = ChatOrderManager()
+        self.search_index = SearchIndex()
+        self.search_index.sync(self.chats, self.store.all_messages)
+        self.scheduler = LLMScheduler(self.settings)
+        self.recall = RecallService(self.settings, scheduler=self.scheduler)
+        self.recall.sync(self.chats, self.store.all_messages)
+        self.usage = UsageRecorder(self.settings)
+        self.usage.sync(self.chats, self.store.all_messages)
+        self.pool = ClientPool()
+        # One LLM for every window, so a settings change reaches all of them
+        self.llm = LLM(self.settings, pool=self.pool, scheduler=self.scheduler)
+        self.api_server: Optional[ApiServer] = None
+        self.backup_scheduler = BackupScheduler(BackupManager(), self.settings['backup_settings'])
+        self.backup_scheduler.start()
+        self.connections: List['EngineHandler'] = []
+        self.connections_lock = threading.Lock()
+
+    def broadcast(self, event: str, data: Dict[str, Any], origin: 'EngineHandler' = None) -> None:
+        """Send an event to every subscribed connection except the one that caused it"""
+        with self.connections_lock:
+            targets = [c for c in self.connections if c.subscribed and c is not origin]
+        for connection in targets:
+            connection.send({'event': event, 'data': data})
+
+    def load_chats(self) -> None:
+        for chat_file in self.store.chat_dir.glob('*.json'):
+            try:
+                chat = self.store.load_meta(chat_file)
+                self.chats[chat['id']] = chat
+            except Exception as e:
+                logger.error(f"Skipping unreadable chat {chat_file}: {str(e)}")
+        self.store.load_archived(self.chats)
+
+    def _check_version(self, chat_id: str, version: int) -> Optional[Dict[str, Any]]:
+        """The stored chat, if version is current; raises StaleChatError otherwise"""
+        stored = self.chats.get(chat_id)
+        current = stored.get('version', 0) if stored else 0
+        if version != current:
+            raise StaleChatError(
+                f"Chat {chat_id} was saved elsewhere (version {current}, not {version})",
+                chat_to_client(stored) if stored else None
+            )
+        return stored
+
+    def order_state(self) -> Dict[str, Any]:
+        return {
+            'order': list(self.chat_order.order),
+            'favorites': sorted(self.chat_order.favorites)
+        }
+
+    # Request handlers; each returns a JSON-serializable result
+
+    def list_chats(self, handler) -> List[Dict[str, Any]]:
+        with self.chats_lock:
+            return [chat_to_client(chat) for chat in self.chats.values()]
+
+    def read_messages(self, handler, chat_id: str, start: int, stop: int) -> List[Dict[str, Any]]:
+        return [message_to_client(msg) for msg in self.store.read_messages(chat_id, start, stop)]
+
+    def get_order(self, handler) -> Dict[str, Any]:
+        return self.order_state()
+
+    def save_chat(self, handler, chat: Dict[str, Any]) -> int:
+        """Create a chat or change its metadata and active leaf; returns its new version
+
+        Messages are only ever added with append_message, so those of an
+        existing chat are left as they are on disk.
+        """
+        chat_id = chat['id']
+        metadata = {key: value for key, value in chat.items() if key not in RUNTIME_KEYS}
+        with self.chats_lock:
+            stored = self._check_version(chat_id, chat.get('version', 0))
+            updated = dict(metadata, version=chat.get('version', 0) + 1)
+            if chat.get('active_leaf') is not None:
+                updated['active_leaf'] = chat['active_leaf']
+            if stored is None:
+                messages = messages_from_json(chat.get('messages', []))
+                self.store.save(dict(updated, messages=messages))
+                updated['first_loaded'] = len(messages)
+            else:
+                messages = []
+                updated['first_loaded'] = message_total(stored)
+                if metadata != {key: value for key, value in stored.items() if key not in RUNTIME_KEYS}:
+                    # Unloaded messages are copied over as raw bytes
+                    self.store.save(dict(updated, messages=[]))
+                else:
+                    self.store.save_active_leaf(dict(updated, messages=[]))
+            updated['messages'] = []
+            self.chats[chat_id] = updated
+
+        if stored is None or updated.get('name') != stored.get('name'):
+            self.search_index.index_chat_name(chat_id, updated.get('name', ''))
+        for index, msg in enumerate(messages):
+            self._index_message(chat_id, index, msg)
+        self.broadcast('chat_saved', {'chat': chat_to_client(updated)}, origin=handler)
+        return updated['version']
+
+    def append_message(self, handler, chat_id: str, message: Dict[str, Any], parent: int,
+                       expected_index: int) -> Dict[str, Any]:
+        """Append one message to the stored chat, whatever other windows added meanwhile
+
+        parent is the absolute index the message follows. Only the message
+        is written to the chat file and sent to other windows; if it did not
+        land at expected_index, the sender's copy is out of date and has to
+        page the chat in again.
+        """
+        with self.chats_lock:
+            chat = self.chats.get(chat_id)
+            if chat is None:
+                raise ValueError(f"Unknown chat: {chat_id}")
+            index = message_total(chat)
+            msg = Message.from_dict(message)
+            # Following the last stored message needs no explicit parent
+            msg.parent = parent if parent != index - 1 else None
+            if msg.parent is not None:
+                chat['branched'] = True
+            # The new message is the last one stored, which is the default leaf
+            chat.pop('active_leaf', None)
+            chat['version'] = chat.get('version', 0) + 1
+            chat['messages'] = [msg]
+            try:
+                self.store.append_message(chat, msg)
+            finally:
+                # The engine's copy never keeps messages loaded
+                chat['messages'] = []
+            chat['first_loaded'] = index + 1
+            version = chat['version']
+            branched = bool(chat.get('branched'))
+
+        self._index_message(chat_id, index, msg)
+        self.broadcast('message_appended', {
+            'chat_id': chat_id,
+            'index': index,
+            'message': message_to_client(msg),
+            'branched': branched,
+            'version': version
+        }, origin=handler)
+        return {'index': index, 'version': version}
+
+    def _index_message(self, chat_id: str, index: int, msg: Message) -> None:
+        self.search_index.index_message(chat_id, index, msg.content)
+        self.recall.enqueue(chat_id, index, msg.role, msg.content)
+
+    def delete_chat(self, handler, chat_id: str) -> None:
+        with self.chats_lock:
+            self.store.delete(chat_id)
+            self.chats.pop(chat_id, None)
+        self.chat_order.remove_chat(chat_id)
+        self.search_index.remove_chat(chat_id)
+        self.recall.remove_chat(chat_id)
+        self.usage.remove_chat(chat_id)
+        self.broadcast('chat_deleted', {'chat_id': chat_id}, origin=handler)
+        self.broadcast('order_changed', self.order_state())
+
+    def add_chat(self, handler, chat_id: str) -> Dict[str, Any]:
+        self.chat_order.add_chat(chat_id)
+        self.broadcast('order_changed', self.order_state())
+        return self.order_state()
+
+    def remove_chat(self, handler, chat_id: str) -> Dict[str, Any]:
+        self.chat_order.remove_chat(chat_id)
+        self.broadcast('order_changed', self.order_state())
+        return self.order_state()
+
+    def toggle_favorite(self, handler, chat_id: str) -> Dict[str, Any]:
+        self.chat_order.toggle_favorite(chat_id)
+        self.broadcast('order_changed', self.order_state())
+        return self.order_state()
+
+    def move_chat(self, handler, chat_id: str, direction: str) -> Dict[str, Any]:
+        self.chat_order.move_chat(chat_id, direction)
+        self.broadcast('order_changed', self.order_state())
+        return self.order_state()
+
+    def search(self, handler, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return self.search_index.search(query, limit)
+
+    def recall_snippets(self, handler, query: str, exclude_chat_id: Optional[str] = None) -> List[str]:
+        return self.recall.recall(query, exclude_chat_id)
+
+    def record_usage(self, handler, chat_id: str, index: int, role: str, timestamp: float, chars: int,
+                     model: Optional[str] = None, latency: Optional[float] = None,
+                     ttft: Optional[float] = None) -> None:
+        self.usage.record(chat_id, index, role, timestamp, chars, model=model, latency=latency, ttft=ttft)
+
+    def usage_summary(self, handler, days: int = 30) -> Dict[str, Any]:
+        return self.usage.summary(days)
+
+    def update_settings(self, handler, settings: Dict[str, Any]) -> None:
+        self.settings = settings
+        self.llm.update_settings(settings)
+        self.blobs.update_settings(settings)
+        self.recall.update_settings(settings)
+        self.usage.update_settings(settings)
+        self.scheduler.update_settings(settings)
+        self.backup_scheduler.update_settings(settings['backup_settings'])
+        if self.api_server:
+            self.api_server.update_settings(settings)
+
+    def generate(self, handler, message: str, context: Optional[List[str]] = None,
+                 history: Optional[List[Dict[str, Any]]] = None,
+                 on_token: Callable[[str], None] = None, prefix: Optional[str] = None) -> Dict[str, Any]:
+        """Reply with the shared LLM; returns the reply and the usage it recorded
+
+        Without history the connection's own running history is used.
+        """
+        own_history = history is None
+        if own_history:
+            history = list(handler.history)
+        usage: Dict[str, Any] = {}
+        content = self.llm.generate_response(
+            message, context=context, on_token=on_token, history=history, prefix=prefix, usage=usage
+        )
+        if own_history:
+            handler.history += [
+                {'role': 'user', 'content': message},
+                {'role': 'assistant', 'content': (prefix or '') + content}
+            ]
+            del handler.history[:-self.llm.history_limit]
+        return {'content': content, 'usage': usage}
+
+    def clear_history(self, handler) -> None:
+        handler.history = []
+
+    METHODS = {
+        'list_chats', 'read_messages', 'get_order', 'save_chat', 'append_message', 'delete_chat', 'add_chat', 'remove_chat',
+        'toggle_favorite', 'move_chat', 'search', 'recall_snippets', 'record_usage', 'usage_summary',
+        'update_settings', 'generate', 'clear_history'
+    }
+
+
+class EngineHandler(socketserver.StreamRequestHandler):
+    """One GUI connection; each window gets its own conversation history"""
+
+    def setup(self):
+        super().setup()
+        self.engine: Engine = self.server.engine
+        self.write_lock = threading.Lock()
+        self.subscribed = False
+        self.history: List[Dict[str, Any]] = []
+        with self.engine.connections_lock:
+            self.engine.connections.append(self)
+
+    def finish(self):
+        with self.engine.connections_lock:
+            if self in self.engine.connections:
+                self.engine.connections.remove(self)
+        super().finish()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        try:
+            _send(self.wfile, self.write_lock, message)
+        except OSError:
+            # The client went away; finish() will unregister it
+            pass
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            if request.get('method') == 'generate':
+                # Generation is long-running, so it must not block this connection's other requests
+                threading.Thread(target=self.dispatch, args=(request,), daemon=True).start()
+            else:
+                self.dispatch(request)
+
+    def dispatch(self, request: Dict[str, Any]) -> None:
+        request_id = request.get('id')
+        method = request.get('method')
+        params = request.get('params', {})
+        try:
+            if method == 'subscribe':
+                self.subscribed = True
+                result = None
+            elif method in Engine.METHODS:
+                if method == 'generate':
+                    params['on_token'] = lambda chunk: self.send({'id': request_id, 'chunk': chunk})
+                result = getattr(self.engine, method)(self, **params)
+            else:
+                raise ValueError(f"Unknown method: {method}")
+            self.send({'id': request_id, 'result': result})
+        except StaleChatError as e:
+            # The sender gets the stored chat so it can take it over
+            self.send({'id': request_id, 'error': str(e), 'error_type': 'StaleChatError', 'chat': e.chat})
+        except LLMError as e:
+            # Sent with its type so the GUI gets the same error it would standalone
+            self.send({'id': request_id, 'error': str(e), 'error_type': type(e).__name__, 'partial': e.partial})
+        except Exception as e:
+            logger.error(f"Engine request {method} failed: {str(e)}")
+            self.send({'id': request_id, 'error': str(e)})
+
+
+class EngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, engine: Engine):
+        self.engine = engine
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, EngineHandler)
+        os.chmod(socket_path, 0o600)
+
+
+class EngineClient:
+    """Thin client used by the GUI; events arrive on a background reader thread"""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 30.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.rfile = self.sock.makefile('rb')
+        self.wfile = self.sock.makefile('wb')
+        self.timeout = timeout
+        self.write_lock = threading.Lock()
+        self.pending: Dict[int, Dict[str, Any]] = {}
+        self.pending_lock = threading.Lock()
+        self.next_id = 0
+        self.on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self.closed = False
+        self.reader = threading.Thread(target=self._read_loop, name='EngineClient', daemon=True)
+        self.reader.start()
+        # Requests the GUI does not wait for, sent in order by one worker
+        self.outbox: "queue.Queue[tuple]" = queue.Queue()
+        self.sender = threading.Thread(target=self._send_loop, name='EngineClientSender', daemon=True)
+        self.sender.start()
+
+    @classmethod
+    def connect(cls, settings: Dict[str, Any]) -> Optional['EngineClient']:
+        """Connect if the engine is enabled and reachable, otherwise return None"""
+        engine_settings = settings.get('engine_settings', {})
+        if not engine_settings.get('enabled') or not hasattr(socket, 'AF_UNIX'):
+            return None
+        try:
+            client = cls(engine_settings.get('socket_path', DEFAULT_SOCKET))
+            logger.info("Connected to engine")
+            return client
+        except OSError as e:
+            logger.warning(f"Engine not reachable, running standalone: {str(e)}")
+            return None
+
+    def _read_loop(self) -> None:
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if 'event' in message:
+                    if self.on_event:
+                        self.on_event(message['event'], message.get('data', {}))
+                    continue
+                with self.pending_lock:
+                    waiter = self.pending.get(message.get('id'))
+                if waiter is None:
+                    continue
+                if 'chunk' in message:
+                    if waiter['on_chunk']:
+                        waiter['on_chunk'](message['chunk'])
+                    continue
+                waiter['response'] = message
+                waiter['done'].set()
+        except Exception as e:
+            logger.error(f"Engine connection lost: {str(e)}")
+        finally:
+            self.closed = True
+            with self.pending_lock:
+                for waiter in self.pending.values():
+                    waiter['done'].set()
+
+    def call(self, method: str, on_chunk: Callable[[str], None] = None,
+             timeout: Optional[float] = None, **params) -> Any:
+        """Send a request and wait for its result"""
+        if self.closed:
+            raise EngineError("Engine connection is closed")
+        with self.pending_lock:
+            self.next_id += 1
+            request_id = self.next_id
+            waiter = {'done': threading.Event(), 'response': None, 'on_chunk': on_chunk}
+            self.pending[request_id] = waiter
+        try:
+            _send(self.wfile, self.write_lock, {'id': request_id, 'method': method, 'params': params})
+            if not waiter['done'].wait(timeout or self.timeout):
+                raise EngineError(f"Engine request {method} timed out")
+            response = waiter['response']
+            if response is None:
+                raise EngineError("Engine connection lost")
+            if 'error' in response:
+                if response.get('error_type') == 'StaleChatError':
+                    raise StaleChatError(response['error'], response.get('chat'))
+                error_type = ERROR_TYPES.get(response.get('error_type'))
+                if error_type:
+                    raise error_type(response['error'], response.get('partial', ''))
+                raise EngineError(response['error'])
+            return response.get('result')
+        finally:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+
+    def submit(self, method: str, on_result: Callable[[Any], None] = None,
+               on_error: Callable[[Exception], None] = None, **params) -> None:
+        """Queue a request without waiting for it
+
+        Queued requests reach the engine in order. The callbacks run on the
+        sender thread, so GUI callers hand them on to their dispatcher.
+        """
+        self.outbox.put((method, on_result, on_error, params))
+
+    def _send_loop(self) -> None:
+        while True:
+            method, on_result, on_error, params = self.outbox.get()
+            try:
+                result = self.call(method, **params)
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+                else:
+                    logger.error(f"Engine request {method} failed: {str(e)}")
+                continue
+            if on_result:
+                on_result(result)
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RemoteChatOrder:
+    """ChatOrderManager interface backed by the engine"""
+
+    def __init__(self, client: EngineClient):
+        self.client = client
+        self.apply_state(client.call('get_order'))
+
+    def apply_state(self, state: Dict[str, Any]) -> None:
+        self.order = state['order']
+        self.favorites = set(state['favorites'])
+
+    def add_chat(self, chat_id: str) -> None:
+        self.apply_state(self.client.call('add_chat', chat_id=chat_id))
+
+    def remove_chat(self, chat_id: str) -> None:
+        self.apply_state(self.client.call('remove_chat', chat_id=chat_id))
+
+    def toggle_favorite(self, chat_id: str) -> None:
+        self.apply_state(self.client.call('toggle_favorite', chat_id=chat_id))
+
+    def move_chat(self, chat_id: str, direction: str) -> None:
+        self.apply_state(self.client.call('move_chat', chat_id=chat_id, direction=direction))
+
+    def get_ordered_chats(self) -> List[str]:
+        favorite_chats = [chat_id for chat_id in self.order if chat_id in self.favorites]
+        regular_chats = [chat_id for chat_id in self.order if chat_id not in self.favorites]
+        return favorite_chats + regular_chats
+
+
+class RemoteChatStore:
+    """The read side of PagedChatStore, paging messages in from the engine"""
+
+    PAGE_SIZE = PagedChatStore.PAGE_SIZE
+    load_tail = PagedChatStore.load_tail
+    load_older = PagedChatStore.load_older
+    all_messages = PagedChatStore.all_messages
+
+    def __init__(self, client: EngineClient):
+        self.client = client
+
+    def read_messages(self, chat_id: str, start: int, stop: int) -> List[Message]:
+        return messages_from_json(self.client.call('read_messages', chat_id=chat_id, start=start, stop=stop))
+
+
+class RemoteLLM:
+    """LLM interface backed by the engine's pooled clients"""
+
+    GENERATE_TIMEOUT = 600.0
+
+    def __init__(self, client: EngineClient):
+        self.client = client
+
+    def generate_response(self, user_input, context=None, on_token=None, history=None, prefix=None,
+                          usage=None):
+        if history is not None:
+            history = [{'role': msg.get('role'), 'content': msg.get('content')} for msg in history]
+        try:
+            result = self.client.call(
+                'generate',
+                on_chunk=on_token,
+                timeout=self.GENERATE_TIMEOUT,
+                message=user_input,
+                context=context,
+                history=history,
+                prefix=prefix
+            )
+        except EngineError as e:
+            logger.error(f"Error generating response: {str(e)}")
+            raise LLMConnectionError(f"Engine: {str(e)}")
+        if usage is not None:
+            usage.update(result['usage'])
+        return result['content']
+
+    def update_settings(self, settings):
+        self.client.call('update_settings', settings=settings)
+
+    def clear_history(self):
+        self.client.call('clear_history')
+
+
+class RemoteSearchIndex:
+    """SearchIndex interface; the engine indexes saved chats itself"""
+
+    def __init__(self, client: EngineClient):
+        self.client = client
+
+    def index_message(self, chat_id, index, content):
+        pass
+
+    def index_chat_name(self, chat_id, name):
+        pass
+
+    def remove_chat(self, chat_id):
+        pass
+
+    def sync(self, chats):
+        pass
+
+    def search(self, query, limit=50):
+        try:
+            return self.client.call('search', query=query, limit=limit)
+        except EngineError as e:
+            logger.error(f"Search failed: {str(e)}")
+            return []
+
+
+class RemoteRecall:
+    """RecallService interface; embedding happens in the engine"""
+
+    def __init__(self, client: EngineClient):
+        self.client = client
+
+    def enqueue(self, chat_id, message_index, role, content):
+        pass
+
+    def sync(self, chats):
+        pass
+
+    def remove_chat(self, chat_id):
+        pass
+
+    def update_settings(self, settings):
+        pass
+
+    def recall(self, query, exclude_chat_id=None):
+        try:
+            return self.client.call('recall_snippets', query=query, exclude_chat_id=exclude_chat_id)
+        except EngineError as e:
+            logger.error(f"Recall failed: {str(e)}")
+            return []
+
+
+class RemoteUsage:
+    """UsageRecorder interface; the engine owns the usage table so windows never write it"""
+
+    def __init__(self, client: EngineClient):
+        self.client = client
+
+    def record(self, chat_id, index, role, timestamp, chars, model=None, latency=None, ttft=None):
+        self.client.submit(
+            'record_usage', chat_id=chat_id, index=index, role=role, timestamp=timestamp,
+            chars=chars, model=model, latency=latency, ttft=ttft
+        )
+
+    def sync(self, chats, load_messages=None):
+        pass
+
+    def remove_chat(self, chat_id):
+        pass
+
+    def update_settings(self, settings):
+        pass
+
+    def summary(self, days=30):
+        return self.client.call('usage_summary', days=days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantum Chat engine daemon")
+    parser.add_argument('--socket', default=None, help="Unix socket path")
+    args = parser.parse_args()
+
+    Logger.setup_logging(Settings.load_settings()['logging_settings'])
+    engine = Engine()
+    socket_path = args.socket or engine.settings.get('engine_settings', {}).get('socket_path', DEFAULT_SOCKET)
+    server = EngineServer(socket_path, engine)
+    if engine.settings['api_server_settings']['enabled']:
+        engine.api_server = ApiServer(engine.settings, pool=engine.pool, scheduler=engine.scheduler,
+                                      blobs=engine.blobs)
+        engine.api_server.start_in_thread()
+    logger.info(f"Engine listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+import json
+import gzip
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime
+from typing import Iterator, Dict, Any, Optional, Set, Callable
+
+from branches import active_path
+from archive import ChatArchive
+from blobs import BlobStore
+
+logger = logging.getLogger('QuantumChat.Export')
+
+FORMATS = ('jsonl', 'markdown')
+
+
+class ChatExporter:
+    """Streams chats from disk into JSONL or Markdown, one chat at a time"""
+
+    def __init__(self, chat_dir: str = 'chats', archive_dir: str = 'chat_archive',
+                 blob_dir: str = 'chat_blobs', index_dir: str = 'chat_pages',
+                 blobs: Optional[BlobStore] = None):
+        self.chat_dir = Path(chat_dir)
+        self.index_dir = Path(index_dir)
+        self.archive_dir = Path(archive_dir)
+        self.blobs = blobs or BlobStore({}, blob_dir)
+
+    @staticmethod
+    def _parse_time(value: Any) -> Optional[datetime]:
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            return None
+
+    def iter_chats(self,
+                   since: Optional[datetime] = None,
+                   until: Optional[datetime] = None,
+                   favorites_only: bool = False,
+                   favorites: Optional[Set[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield matching chats, loading only one file at a time"""
+        for chat in self._read_chats():
+            if favorites_only:
+                is_favorite = chat.get('is_favorite') or (favorites and chat.get('id') in favorites)
+                if not is_favorite:
+                    continue
+
+            created = self._parse_time(chat.get('timestamp'))
+            if since and (created is None or created < since):
+                continue
+            if until and (created is None or created > until):
+                continue
+
+            yield chat
+
+    def _read_chats(self) -> Iterator[Dict[str, Any]]:
+        """Hot chat files, then archived chats that have no hot file"""
+        hot = set()
+        if self.chat_dir.exists():
+            for chat_file in sorted(self.chat_dir.glob('*.json')):
+                hot.add(chat_file.stem)
+                try:
+                    with open(chat_file, 'r') as f:
+                        chat = json.load(f)
+                except Exception as e:
+                    logger.error(f"Skipping unreadable chat {chat_file}: {str(e)}")
+                    continue
+                self._restore_leaf(chat, chat_file.stem)
+                yield self.blobs.inline(chat)
+
+        if not self.archive_dir.exists():
+            return
+        archive = ChatArchive(str(self.archive_dir))
+        for chat_id in sorted(archive.entries):
+            if chat_id in hot:
+                continue
+            try:
+                chat = archive.inflate(chat_id)
+            except Exception as e:
+                logger.error(f"Skipping unreadable archived chat {chat_id}: {str(e)}")
+                continue
+            if archive.entries[chat_id]['chat'].get('active_leaf') is not None:
+                chat['active_leaf'] = archive.entries[chat_id]['chat']['active_leaf']
+            yield self.blobs.inline(chat)
+
+    def _restore_leaf(self, chat: Dict[str, Any], chat_id: str) -> None:
+        """The active branch is kept in the page index's meta file, not the chat file"""
+        try:
+            with open(self.index_dir / f"{chat_id}.meta", 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get('active_leaf') is not None and meta.get('count') == len(chat.get('messages', [])):
+            chat['active_leaf'] = meta['active_leaf']
+
+    @staticmethod
+    def to_markdown(chat: Dict[str, Any]) -> str:
+        """Render one chat as a Markdown section"""
+        lines = [f"# {chat.get('name', 'Untitled')}", ""]
+        if chat.get('timestamp'):
+            lines += [f"_Created {chat['timestamp']}_", ""]
+        # Only the active branch; JSONL keeps every branch
+        for index in active_path(chat):
+            msg = chat['messages'][index]
+            lines.append(f"**{msg.get('role', 'unknown')}** ({msg.get('timestamp', '')})")
+            lines.append("")
+            lines.append(msg.get('content', ''))
+            lines.append("")
+        lines.append("---")
+        lines.append("")
+        return "\n".join(lines)
+
+    def export(self,
+               output_path: str,
+               fmt: str = 'jsonl',
+               compress: bool = False,
+               progress: Optional[Callable[[int], None]] = None,
+               **filters) -> int:
+        """Write matching chats to output_path and return how many were exported"""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        opener = gzip.open if compress else open
+        count = 0
+
+        try:
+            with opener(tmp_path, 'wt', encoding='utf-8') as out:
+                for chat in self.iter_chats(**filters):
+                    if fmt == 'jsonl':
+                        out.write(json.dumps(chat, ensure_ascii=False))
+                        out.write("\n")
+                    else:
+                        out.write(self.to_markdown(chat))
+                    count += 1
+                    if progress:
+                        progress(count)
+            tmp_path.replace(output_path)
+            logger.info(f"Exported {count} chats to {output_path}")
+            return count
+
+        except Exception as e:
+            logger.error(f"Error exporting chats: {str(e)}")
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+
+def guess_format(path: str) -> Dict[str, Any]:
+    """Pick format and compression from the output file name"""
+    name = path.lower()
+    compress = name.endswith('.gz')
+    if compress:
+        name = name[:-len('.gz')]
+    fmt = 'markdown' if name.endswith(('.md', '.markdown')) else 'jsonl'
+    return {'fmt': fmt, 'compress': compress}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Quantum Chat conversations")
+    parser.add_argument('output', help="Output file (.jsonl, .md, optionally .gz)")
+    parser.add_argument('--chat-dir', default='chats')
+    parser.add_argument('--archive-dir', default='chat_archive')
+    parser.add_argument('--blob-dir', default='chat_blobs')
+    parser.add_argument('--format', choices=FORMATS)
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--since', type=datetime.fromisoformat)
+    parser.add_argument('--until', type=datetime.fromisoformat)
+    parser.add_argument('--favorites', action='store_true')
+    args = parser.parse_args()
+
+    options = guess_format(args.output)
+    if args.format:
+        options['fmt'] = args.format
+    if args.gzip:
+        options['compress'] = True
+
+    count = ChatExporter(args.chat_dir, args.archive_dir, args.blob_dir).export(
+        args.output,
+        since=args.since,
+        until=args.until,
+        favorites_only=args.favorites,
+        **options
+    )
+    print(f"Exported {count} chats to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
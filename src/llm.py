@@ -1,43 +1,272 @@
 from langchain_ollama import ChatOllama
 from langchain.callbacks.manager import CallbackManager
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from langchain.schema import HumanMessage, AIMessage
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, List, Optional, Callable
+import time
+import threading
 import logging
 
+from scheduler import INTERACTIVE, Preempted
+from resilience import (
+    LLMError, LLMOverloadedError, LLMTimeoutError, CircuitOpenError,
+    RetryPolicy, breaker_for, classify, client_timeout
+)
+
 logger = logging.getLogger('QuantumChat.LLM')
 
+DEFAULT_BASE_URL = "http://127.0.0.1:11434"
+
+
+def normalize_base_url(api_url: str) -> str:
+    """ChatOllama talks to the native API, so drop the OpenAI-style /v1 suffix"""
+    url = (api_url or DEFAULT_BASE_URL).strip().rstrip('/')
+    if url.endswith('/v1'):
+        url = url[:-len('/v1')]
+    return url or DEFAULT_BASE_URL
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of nested params such as client_kwargs"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class ClientPool:
+    """Warm ChatOllama clients keyed by (endpoint, model, params)"""
+
+    def __init__(self, max_clients: int = 8):
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[Tuple, ChatOllama]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(base_url: str, model: str, params: Dict[str, Any]) -> Tuple:
+        return (base_url, model, _freeze(params))
+
+    def get(self, base_url: str, model: str, params: Dict[str, Any]) -> ChatOllama:
+        """Return a cached client for this configuration, creating it if needed"""
+        key = self.make_key(base_url, model, params)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+        client = ChatOllama(
+            model=model,
+            base_url=base_url,
+            callback_manager=CallbackManager([StreamingStdOutCallbackHandler()]),
+            **params
+        )
+        with self._lock:
+            # Another thread may have built the same client meanwhile; keep the first
+            client = self._clients.setdefault(key, client)
+            self._clients.move_to_end(key)
+            # Evicted clients stay alive for any request still holding them
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        logger.info(f"LLM client ready: {model} @ {base_url}")
+        return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+
 class LLM:
-    def __init__(self, settings):
+    def __init__(self, settings, pool: ClientPool = None, scheduler=None):
         self.settings = settings
+        self.pool = pool or ClientPool()
+        # Optional LLMScheduler shared with other model work in the process
+        self.scheduler = scheduler
         self.message_history = []
+        self.history_limit = 16
         self.setup_llm()
 
+    @staticmethod
+    def client_params(model_settings: Dict[str, Any],
+                      request_settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Map our model settings (and request timeouts) onto ChatOllama parameters"""
+        params = {
+            'temperature': float(model_settings.get('temperature', 0.7)),
+            'top_p': float(model_settings.get('top_p', 0.9)),
+            'num_predict': int(model_settings.get('max_tokens', 2000))
+        }
+        if request_settings is not None:
+            params['client_kwargs'] = {'timeout': client_timeout(request_settings)}
+        # Ollama has no frequency/presence penalties; repeat_penalty is the closest knob
+        penalty = float(model_settings.get('frequency_penalty', 0.0))
+        if penalty:
+            params['repeat_penalty'] = 1.0 + penalty
+        return params
+
     def setup_llm(self):
         try:
-            self.llm = ChatOllama(
-                model="qwen2.5:14b",
-                temperature=0.7,
-                callback_manager=CallbackManager([StreamingStdOutCallbackHandler()]),
-                base_url="http://127.0.0.1:11434"  # Removed /v1 from URL
-            )
+            model_settings = self.settings.get('model_settings', {})
+            base_url = normalize_base_url(self.settings.get('api_url'))
+            model = model_settings.get('model', 'qwen2.5:14b')
+            request_settings = self.settings.get('request_settings', {})
+            params = self.client_params(model_settings, request_settings)
+            fallback_model = (request_settings.get('fallback_model') or '').strip()
+            buffer_size = self.settings.get('memory_settings', {}).get('buffer_size', 8)
+            self.history_limit = max(int(buffer_size), 1) * 2
+            llm = self.pool.get(base_url, model, params)
+            # Swapping one reference is atomic; in-flight requests keep the config they started with
+            self.config = (base_url, model, params, request_settings, fallback_model, llm)
+            self.base_url, self.model, self.params = base_url, model, params
+            self.request_settings, self.fallback_model, self.llm = request_settings, fallback_model, llm
             logger.info("LLM initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize LLM: {str(e)}")
             raise
 
-    def generate_response(self, user_input):
-        try:
+    def update_settings(self, settings):
+        """Apply new model settings live, reusing pooled clients"""
+        self.settings = settings
+        self.setup_llm()
+
+    @staticmethod
+    def recall_message(snippets: List[str]) -> SystemMessage:
+        """System message carrying snippets recalled from earlier chats"""
+        return SystemMessage(content=(
+            "Relevant excerpts from the user's earlier conversations. "
+            "Use them only if they help with the current request:\n\n"
+            + "\n\n".join(snippets)
+        ))
+
+    @staticmethod
+    def chat_messages(history: List[Any]) -> list:
+        """LangChain messages for stored chat messages; other roles are skipped"""
+        messages = []
+        for msg in history:
+            role = msg.get('role')
+            if role == 'user':
+                messages.append(HumanMessage(content=msg.get('content', '')))
+            elif role == 'assistant':
+                messages.append(AIMessage(content=msg.get('content', '')))
+        return messages
+
+    def generate_response(self, user_input, context: Optional[List[str]] = None,
+                          on_token: Optional[Callable[[str], None]] = None,
+                          history: Optional[List[Any]] = None, prefix: Optional[str] = None,
+                          priority: str = INTERACTIVE, usage: Optional[Dict[str, Any]] = None):
+        """Reply to user_input.
+
+        With history (the messages on the chat's active branch before
+        user_input) the context is built from it; otherwise from this LLM's
+        own running history. With prefix (the start of a reply cut short)
+        the model continues that reply and only the continuation is returned.
+        A preempted background reply, or one retried after a dropped
+        connection, continues from what it had generated.
+
+        Raises LLMError when no reply could be generated; its partial
+        attribute holds whatever was streamed before the failure. A usage
+        dict, if given, gets the name of the model that served the reply.
+        """
+        if history is not None:
+            messages = self.chat_messages(history[-self.history_limit:]) + [HumanMessage(content=user_input)]
+        else:
             self.message_history.append(HumanMessage(content=user_input))
-            if len(self.message_history) > 16:
-                self.message_history = self.message_history[-16:]
-            
-            response = self.llm.invoke(self.message_history)
-            self.message_history.append(AIMessage(content=response.content))
-            return response.content
-            
-        except Exception as e:
+            if len(self.message_history) > self.history_limit:
+                self.message_history = self.message_history[-self.history_limit:]
+            messages = self.message_history
+
+        # Recalled context is sent with this request only, never kept in history
+        if context:
+            messages = [self.recall_message(context)] + messages
+        parts = []
+
+        def request(client, ticket):
+            # Ollama continues a trailing assistant message instead of starting a new one
+            continued = (prefix or '') + ''.join(parts)
+            request_messages = messages + [AIMessage(content=continued)] if continued else messages
+            if on_token is None:
+                parts.append(client.invoke(request_messages).content)
+            else:
+                for chunk in client.stream(request_messages):
+                    if ticket:
+                        ticket.check()
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        on_token(chunk.content)
+
+        def attempt(ticket=None):
+            model = self.call_with_retries(lambda client: request(client, ticket), ticket)
+            if usage is not None:
+                usage['model'] = model
+            return ''.join(parts)
+
+        try:
+            if self.scheduler:
+                content = self.scheduler.run(priority, attempt, name='reply')
+            else:
+                content = attempt()
+        except LLMError as e:
+            e.partial = ''.join(parts)
             logger.error(f"Error generating response: {str(e)}")
-            return f"Error: {str(e)}"  # Return error message instead of raising
+            raise
+
+        if history is None:
+            self.message_history.append(AIMessage(content=(prefix or '') + content))
+        return content
+
+    def call_with_retries(self, request: Callable[[Any], None], ticket=None) -> str:
+        """Run request(client) against the primary model, then the fallback; returns the model used.
+
+        Transient failures are retried with jittered backoff while the
+        model's circuit stays closed. The fallback model is tried when the
+        primary's circuit is open or it stays overloaded or times out. The
+        settings in effect at the start are used throughout, and a scheduler
+        ticket's slot is handed back while backing off.
+        """
+        base_url, primary, params, request_settings, fallback_model, llm = self.config
+        policy = RetryPolicy(request_settings)
+        candidates = [(primary, llm, breaker_for(base_url, primary, request_settings))]
+        if fallback_model and fallback_model != primary:
+            candidates.append((fallback_model, None, breaker_for(base_url, fallback_model, request_settings)))
+
+        error: Optional[LLMError] = None
+        for model, client, breaker in candidates:
+            if client is None:
+                logger.warning(f"Falling back to {model}: {str(error)}")
+                client = self.pool.get(base_url, model, params)
+            for retry in range(policy.max_retries + 1):
+                if not breaker.allow():
+                    error = CircuitOpenError(
+                        f"{model} at {base_url} is failing, next try in {breaker.retry_in():.0f}s"
+                    )
+                    break
+                try:
+                    request(client)
+                    breaker.record_success()
+                    return model
+                except Preempted:
+                    breaker.record_success()
+                    raise
+                except Exception as e:
+                    error = classify(e)
+                if not error.transient:
+                    # The server answered, so the endpoint itself is healthy
+                    breaker.record_success()
+                    raise error
+                breaker.record_failure()
+                if retry < policy.max_retries:
+                    delay = policy.delay(retry)
+                    logger.warning(f"{model} request failed ({str(error)}), retrying in {delay:.1f}s")
+                    if ticket is not None and self.scheduler:
+                        # Other replies may use the slot while this one waits
+                        with self.scheduler.paused(ticket):
+                            time.sleep(delay)
+                    else:
+                        time.sleep(delay)
+            # A fallback on the same server cannot help when the server is unreachable
+            if not isinstance(error, (CircuitOpenError, LLMOverloadedError, LLMTimeoutError)):
+                break
+        raise error
 
     def clear_history(self):
-        self.message_history = []
\ No newline at end of file
+        self.message_history = []
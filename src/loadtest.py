@@ -0,0 +1,252 @@
+"""Headless end-to-end load test of the reply pipeline.
+
+Runs the same path a reply takes in QuantumChat -- LLM.generate_response
+streaming from Ollama on worker threads, chunks posted to a UIDispatcher,
+and an IncrementalMarkdown renderer fed on the UI thread -- without Tk.
+A HeadlessRoot stands in for the Tk event loop, so the dispatcher's pump
+and a heartbeat timer run on one thread exactly as they would under
+mainloop. By default it starts a MockOllamaServer in-process.
+
+    python loadtest.py --clients 16 --requests 5 --token-rate 80 --fail-rate 0.05
+
+Reported:
+
+    stall       heartbeat ticks that ran late, i.e. time the UI thread could
+                not have handled input (max, p95 and total beyond 50 ms)
+    dropped     characters streamed by the model that never reached the
+                renderer before the reply was finished (should be 0)
+    throughput  tokens and replies per second across all clients, plus TTFT
+"""
+import json
+import time
+import heapq
+import logging
+import argparse
+import itertools
+import threading
+from typing import Dict, Any, List, Callable
+
+from llm import LLM, ClientPool
+from dispatch import UIDispatcher, concat_chunks
+from markdown_render import IncrementalMarkdown
+from mock_ollama import MockOllamaServer
+from settings import Settings
+from resilience import LLMError
+
+logger = logging.getLogger('QuantumChat.LoadTest')
+
+HEARTBEAT_MS = 10
+STALL_THRESHOLD = 0.05
+
+
+class HeadlessRoot:
+    """The parts of a Tk root the dispatcher uses, driven by run()"""
+
+    def __init__(self):
+        self._timers = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def after(self, ms: int, callback: Callable, *args) -> None:
+        with self._lock:
+            heapq.heappush(self._timers, (time.perf_counter() + ms / 1000.0, next(self._counter), callback, args))
+
+    def run(self, until: Callable[[], bool]) -> None:
+        while not until():
+            with self._lock:
+                due, _, callback, args = heapq.heappop(self._timers)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            callback(*args)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class LoadTest:
+    def __init__(self, settings: Dict[str, Any], clients: int, requests: int, draw_cost_ms: float = 0.0):
+        self.settings = settings
+        self.clients = clients
+        self.requests = requests
+        self.draw_cost = draw_cost_ms / 1000.0
+        self.root = HeadlessRoot()
+        self.dispatcher = UIDispatcher(self.root)
+        self.pool = ClientPool()
+        self.replies: Dict[int, Dict[str, Any]] = {}
+        self.lateness: List[float] = []
+        self.finished = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    # UI thread
+
+    def heartbeat(self, due: float) -> None:
+        now = time.perf_counter()
+        self.lateness.append(max(now - due, 0.0))
+        self.root.after(HEARTBEAT_MS, self.heartbeat, now + HEARTBEAT_MS / 1000.0)
+
+    def on_reply_chunk(self, reply_id: int, chunk: str) -> None:
+        reply = self.replies[reply_id]
+        reply['applied'] += len(chunk)
+        reply['renderer'].feed(chunk)
+        reply['renderer'].open_blocks()
+        if self.draw_cost:
+            # Stand-in for the canvas/Text drawing the GUI does per update
+            time.sleep(self.draw_cost)
+
+    def finish_reply(self, reply_id: int, failed: bool) -> None:
+        reply = self.replies[reply_id]
+        reply['finished'] = time.perf_counter()
+        reply['failed'] = failed
+        self.finished += 1
+
+    # Worker threads
+
+    def client(self, client_index: int) -> None:
+        llm = LLM(self.settings, pool=self.pool)
+        for request_index in range(self.requests):
+            reply_id = next(self._ids)
+            reply = {
+                'sent': 0,
+                'applied': 0,
+                'chunks': 0,
+                'renderer': IncrementalMarkdown(),
+                'started': time.perf_counter(),
+                'first_token': None,
+                'finished': None,
+                'failed': False
+            }
+            with self._lock:
+                self.replies[reply_id] = reply
+
+            def on_token(chunk, reply=reply, reply_id=reply_id):
+                if reply['first_token'] is None:
+                    reply['first_token'] = time.perf_counter()
+                reply['sent'] += len(chunk)
+                reply['chunks'] += 1
+                self.dispatcher.post(
+                    self.on_reply_chunk, reply_id, chunk,
+                    key=('reply_chunk', reply_id),
+                    merge=concat_chunks
+                )
+
+            try:
+                llm.generate_response(
+                    f"client {client_index} request {request_index}: explain caching",
+                    on_token=on_token,
+                    history=[]
+                )
+                failed = False
+            except LLMError:
+                failed = True
+            self.dispatcher.post(self.finish_reply, reply_id, failed)
+
+    def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self.client, args=(i,), name=f'LoadClient-{i}', daemon=True)
+            for i in range(self.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        self.dispatcher.start()
+        self.root.after(HEARTBEAT_MS, self.heartbeat, time.perf_counter() + HEARTBEAT_MS / 1000.0)
+        total = self.clients * self.requests
+        self.root.run(until=lambda: self.finished >= total)
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        replies = list(self.replies.values())
+        succeeded = [r for r in replies if not r['failed']]
+        ttfts = [r['first_token'] - r['started'] for r in replies if r['first_token'] is not None]
+        # Ollama streams one token per chunk
+        tokens = sum(r['chunks'] for r in succeeded)
+        stalls = [late for late in self.lateness if late > STALL_THRESHOLD]
+        return {
+            'clients': self.clients,
+            'replies': len(replies),
+            'failed': len(replies) - len(succeeded),
+            'elapsed': elapsed,
+            'throughput': {
+                'replies_per_sec': len(succeeded) / elapsed,
+                'tokens_per_sec': tokens / elapsed,
+                'ttft_p50': percentile(ttfts, 0.5),
+                'ttft_p95': percentile(ttfts, 0.95)
+            },
+            'stall': {
+                'max': max(self.lateness, default=0.0),
+                'p95': percentile(self.lateness, 0.95),
+                'count': len(stalls),
+                'total': sum(stalls)
+            },
+            'dropped': {
+                'replies': sum(1 for r in replies if r['applied'] != r['sent']),
+                'chars': sum(r['sent'] - r['applied'] for r in replies)
+            },
+            'dispatcher': dict(self.dispatcher.stats)
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    throughput, stall, dropped = report['throughput'], report['stall'], report['dropped']
+    print(f"{report['replies']} replies from {report['clients']} clients in {report['elapsed']:.1f}s "
+          f"({report['failed']} failed)")
+    print(f"throughput  {throughput['replies_per_sec']:.2f} replies/s, {throughput['tokens_per_sec']:.0f} tokens/s, "
+          f"TTFT p50 {throughput['ttft_p50'] * 1000:.0f} ms, p95 {throughput['ttft_p95'] * 1000:.0f} ms")
+    print(f"UI stall    max {stall['max'] * 1000:.1f} ms, p95 {stall['p95'] * 1000:.1f} ms, "
+          f"{stall['count']} ticks over {STALL_THRESHOLD * 1000:.0f} ms ({stall['total'] * 1000:.0f} ms total)")
+    print(f"dropped     {dropped['chars']} chars in {dropped['replies']} replies")
+    stats = report['dispatcher']
+    print(f"dispatcher  {stats['posted']} posted, {stats['merged']} coalesced, {stats['executed']} run, "
+          f"{stats['deferred_ticks']} deferred ticks, {stats['errors']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless load test of the streaming reply pipeline")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent senders")
+    parser.add_argument('--requests', type=int, default=5, help="sends per client")
+    parser.add_argument('--url', help="use this Ollama server instead of the built-in mock")
+    parser.add_argument('--token-rate', type=float, default=80.0)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--cut-rate', type=float, default=0.0)
+    parser.add_argument('--reply-tokens', type=int, default=60)
+    parser.add_argument('--draw-cost-ms', type=float, default=0.0, help="simulated drawing time per UI update")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    settings = Settings.load_settings()
+    server = None
+    if args.url:
+        settings['api_url'] = args.url
+    else:
+        server = MockOllamaServer(
+            port=0, token_rate=args.token_rate, latency=args.latency, jitter=args.jitter,
+            fail_rate=args.fail_rate, cut_rate=args.cut_rate, reply_tokens=args.reply_tokens,
+            models=[settings['model_settings']['model']]
+        )
+        settings['api_url'] = server.start_in_thread()
+
+    try:
+        report = LoadTest(settings, args.clients, args.requests, args.draw_cost_ms).run()
+    finally:
+        if server:
+            server.shutdown()
+    if server:
+        report['server'] = dict(server.stats)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# kind is one of heading, code, list_item, quote, paragraph.
+# meta holds the heading level, list marker or code language.
+Block = namedtuple('Block', ['kind', 'text', 'meta'])
+
+FENCE_RE = re.compile(r"^\s*(```|~~~)\s*([\w+-]*)\s*$")
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_RE = re.compile(r"^\s*([-*+]|\d+[.)])\s+(.*)$")
+QUOTE_RE = re.compile(r"^\s*>\s?(.*)$")
+INLINE_RE = re.compile(r"(\*\*[^*\n]+\*\*|__[^_\n]+__|`[^`\n]+`|\*[^*\n]+\*|_[^_\n]+_)")
+
+
+def _closes_fence(line: str, marker: str) -> bool:
+    return line.strip().startswith(marker) and bool(FENCE_RE.match(line))
+
+
+def _starts_block(line: str) -> bool:
+    return bool(FENCE_RE.match(line) or HEADING_RE.match(line) or LIST_RE.match(line) or QUOTE_RE.match(line))
+
+
+def parse_blocks(lines: List[str], final: bool) -> Tuple[List[Block], int]:
+    """Parse complete lines into blocks.
+
+    Returns the blocks and how many lines they consumed. Unless ``final`` is
+    set, a block that might still grow (an open code fence, a paragraph not
+    yet followed by a blank line) is left unconsumed for the next call.
+    """
+    blocks = []
+    i = consumed = 0
+    n = len(lines)
+
+    while i < n:
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            consumed = i
+            continue
+
+        fence = FENCE_RE.match(line)
+        if fence:
+            j = i + 1
+            while j < n and not _closes_fence(lines[j], fence.group(1)):
+                j += 1
+            if j < n or final:
+                blocks.append(Block('code', '\n'.join(lines[i + 1:j]), fence.group(2)))
+                i = min(j + 1, n)
+                consumed = i
+                continue
+            break
+
+        heading = HEADING_RE.match(line)
+        if heading:
+            blocks.append(Block('heading', heading.group(2), len(heading.group(1))))
+            i += 1
+            consumed = i
+            continue
+
+        item = LIST_RE.match(line)
+        quote = QUOTE_RE.match(line)
+        if item:
+            kind, meta, parts = 'list_item', item.group(1), [item.group(2)]
+        elif quote:
+            kind, meta, parts = 'quote', None, [quote.group(1)]
+        else:
+            kind, meta, parts = 'paragraph', None, [line.strip()]
+
+        # Continuation lines belong to the block until a blank line or a new block starts
+        j = i + 1
+        while j < n and lines[j].strip():
+            if kind == 'quote':
+                more = QUOTE_RE.match(lines[j])
+                if not more:
+                    break
+                parts.append(more.group(1))
+            elif _starts_block(lines[j]):
+                break
+            else:
+                parts.append(lines[j].strip())
+            j += 1
+
+        if j < n or final:
+            blocks.append(Block(kind, ' '.join(parts) if kind != 'quote' else '\n'.join(parts), meta))
+            i = j
+            consumed = i
+            continue
+        break
+
+    return blocks, consumed
+
+
+def parse_inline(text: str) -> List[Tuple[str, str]]:
+    """Split text into (text, style) runs; style is bold, italic, code or ''"""
+    runs = []
+    pos = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > pos:
+            runs.append((text[pos:match.start()], ''))
+        token = match.group(0)
+        if token.startswith(('**', '__')):
+            runs.append((token[2:-2], 'bold'))
+        elif token.startswith('`'):
+            runs.append((token[1:-1], 'code'))
+        else:
+            runs.append((token[1:-1], 'italic'))
+        pos = match.end()
+    if pos < len(text):
+        runs.append((text[pos:], ''))
+    return runs
+
+
+def plain_text(text: str) -> str:
+    """Inline text with the Markdown markers removed"""
+    return ''.join(run for run, _ in parse_inline(text))
+
+
+@lru_cache(maxsize=512)
+def render_markdown(text: str) -> Tuple[Block, ...]:
+    """Parse a finished message; results are cached by content"""
+    return tuple(parse_blocks(text.split('\n'), final=True)[0])
+
+
+class IncrementalMarkdown:
+    """Markdown parser for streamed text.
+
+    Completed blocks are parsed once and kept; each ``feed`` only reparses
+    the still-open trailing block, so a long reply costs O(n) overall rather
+    than O(n^2). An open code fence is not reparsed at all: its lines are
+    collected as they arrive and only new lines are checked for the closing
+    fence.
+    """
+
+    def __init__(self):
+        self.text_parts: List[str] = []
+        self.blocks: List[Block] = []
+        # Complete lines not yet part of a block, and the line still being streamed
+        self._lines: List[str] = []
+        self._partial = ''
+        # (marker, language, code lines) while a code fence is open
+        self._fence: Optional[Tuple[str, str, List[str]]] = None
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.text_parts)
+
+    def feed(self, chunk: str) -> bool:
+        """Append streamed text; returns True if new blocks were completed"""
+        self.text_parts.append(chunk)
+        if '\n' not in chunk:
+            # Without a new line break nothing can have been completed
+            self._partial += chunk
+            return False
+
+        complete, self._partial = (self._partial + chunk).rsplit('\n', 1)
+        lines = complete.split('\n')
+        count = len(self.blocks)
+        if self._fence is not None:
+            marker, language, code = self._fence
+            for i, line in enumerate(lines):
+                if _closes_fence(line, marker):
+                    self.blocks.append(Block('code', '\n'.join(code), language))
+                    self._fence = None
+                    lines = lines[i + 1:]
+                    break
+                code.append(line)
+            else:
+                return False
+
+        lines = self._lines + lines
+        blocks, consumed = parse_blocks(lines, final=False)
+        self.blocks.extend(blocks)
+        rest = lines[consumed:]
+        fence = FENCE_RE.match(rest[0]) if rest else None
+        if fence:
+            # parse_blocks only stops at a fence that is still open
+            self._fence = (fence.group(1), fence.group(2), rest[1:])
+            self._lines = []
+        else:
+            self._lines = rest
+        return len(self.blocks) > count
+
+    def open_fence(self) -> Optional[Tuple[str, List[str], Optional[str]]]:
+        """Language, complete lines and partial last line of an open code fence.
+
+        Returns None outside a fence. The line list only grows until the
+        fence closes, so a view can append the lines it has not drawn yet.
+        The partial line is None when it is the closing fence arriving.
+        """
+        if self._fence is None:
+            return None
+        marker, language, code = self._fence
+        partial = None if _closes_fence(self._partial, marker) else self._partial
+        return language, code, partial
+
+    def open_blocks(self) -> List[Block]:
+        """Blocks for the still-open tail, parsed as if the stream ended here"""
+        fence = self.open_fence()
+        if fence is None:
+            return parse_blocks(self._lines + [self._partial], final=True)[0]
+        language, code, partial = fence
+        return [Block('code', '\n'.join(code if partial is None else code + [partial]), language)]
+
+    def render(self) -> List[Block]:
+        return self.blocks + self.open_blocks()
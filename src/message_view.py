@@ -0,0 +1,524 @@
+"""Conversation views for the chat area.
+
+Both views take entries of (index, message, branch), where index is the
+message's absolute index in the chat, so paging in older messages does not
+renumber anything already shown, and branch is a (position, count) pair when
+the message has alternatives (see branches). Clicks on a message's controls
+are reported as on_action(action, index) with action one of 'prev', 'next',
+'edit' (user messages) or 'regenerate' (replies).
+
+CanvasMessageView draws rounded bubbles as canvas items. TextMessageView
+writes the conversation into a single read-only tk.Text with tags, which
+gives native selection and scrolling and makes appends a single insert.
+The view is chosen with ui_settings.message_view ('canvas' or 'text').
+"""
+import time
+import tkinter as tk
+
+from styles import COLORS, MARKDOWN_FONTS, MARKDOWN_BLOCK_SPACING
+from markdown_render import render_markdown, parse_inline
+
+VIEWS = ('canvas', 'text')
+
+
+def create_message_view(kind, parent, styles, images, yscrollcommand, on_action):
+    view_class = TextMessageView if kind == 'text' else CanvasMessageView
+    return view_class(parent, styles, images, yscrollcommand, on_action)
+
+
+def message_actions(msg, branch):
+    """(label, action) controls shown under a message"""
+    actions = []
+    if branch:
+        position, count = branch
+        actions += [('‹', 'prev'), (f"{position}/{count}", None), ('›', 'next')]
+    if msg.get('incomplete'):
+        actions += [('interrupted', None), ('resume', 'resume')]
+    actions.append(('edit', 'edit') if msg.role == 'user' else ('regenerate', 'regenerate'))
+    return actions
+
+
+def parse_action_tag(tags):
+    """Find the do_<action>_<index> tag of a clicked control"""
+    for tag in tags:
+        if tag.startswith('do_'):
+            _, action, index = tag.split('_')
+            return action, int(index)
+    return None
+
+
+class CanvasMessageView:
+    def __init__(self, parent, styles, images, yscrollcommand, on_action):
+        self.styles = styles
+        self.images = images
+        self.on_action = on_action
+        self.widget = tk.Canvas(
+            parent,
+            bg=COLORS['bg_chat'],
+            highlightthickness=0,
+            bd=0,
+            yscrollcommand=yscrollcommand
+        )
+        self.widget.tag_bind('action', '<Button-1>', self._on_click)
+        self.positions = {}
+        self.next_y = 20
+        self.stream = None
+
+    def clear(self):
+        self.widget.delete('all')
+        self.positions = {}
+        self.next_y = 20
+        self.stream = None
+
+    def _on_click(self, event):
+        action = parse_action_tag(self.widget.gettags('current'))
+        if action:
+            self.on_action(*action)
+
+    def render(self, entries, scroll_to_end=True):
+        """Redraw from scratch; a streaming reply has to be fed again afterwards"""
+        self.clear()
+        for index, msg, branch in entries:
+            self.positions[index] = self.next_y
+            self.next_y = self.draw_message(msg, self.next_y, index, branch)
+        self._update_scrollregion(scroll_to_end)
+
+    def append(self, msg, index, branch=None):
+        renderer = self.end_stream()
+        self.positions[index] = self.next_y
+        self.next_y = self.draw_message(msg, self.next_y, index, branch)
+        if renderer:
+            self.update_stream(renderer)
+        self._update_scrollregion(True)
+
+    def prepend(self, entries, added):
+        """Redraw with older messages on top, keeping the visible message in place"""
+        old_bbox = self.widget.bbox('all')
+        old_top = self.widget.canvasy(0)
+        renderer = self.stream['renderer'] if self.stream else None
+        self.render(entries, scroll_to_end=False)
+        if renderer:
+            self.update_stream(renderer)
+        new_bbox = self.widget.bbox('all')
+        if old_bbox and new_bbox:
+            grown = (new_bbox[3] - new_bbox[1]) - (old_bbox[3] - old_bbox[1])
+            self.widget.yview_moveto((old_top + grown - new_bbox[1]) / max(new_bbox[3] - new_bbox[1], 1))
+
+    def scroll_to(self, index):
+        bbox = self.widget.bbox('all')
+        if index not in self.positions or not bbox:
+            return
+        height = max(bbox[3] - bbox[1], 1)
+        self.widget.yview_moveto((self.positions[index] - bbox[1]) / height)
+
+    def scroll_to_end(self):
+        self.widget.yview_moveto(1.0)
+
+    def _update_scrollregion(self, scroll_to_end):
+        self.widget.configure(scrollregion=self.widget.bbox('all'))
+        if scroll_to_end:
+            self.widget.yview_moveto(1.0)
+
+    def bubble_geometry(self, is_user):
+        canvas_width = self.widget.winfo_width()
+        bubble_width = min(canvas_width * 0.7, 500)
+
+        if is_user:
+            bubble_x = canvas_width - bubble_width - 60
+            avatar_x = canvas_width - 40
+        else:
+            bubble_x = 60
+            avatar_x = 30
+        return bubble_x, bubble_width, avatar_x
+
+    def draw_message(self, msg, y_pos, index=None, branch=None):
+        """Draw one message at y_pos and return the y for the next one"""
+        is_user = msg.role == 'user'
+        bubble_x, bubble_width, avatar_x = self.bubble_geometry(is_user)
+
+        # Add avatar
+        avatar_img = self.images['user'] if is_user else self.images['robot']
+        self.widget.create_image(
+            avatar_x,
+            y_pos + 25,
+            image=avatar_img
+        )
+
+        # Create message bubble, resized once the text height is known
+        bubble = self.styles.create_rounded_rectangle(
+            self.widget,
+            bubble_x,
+            y_pos,
+            bubble_x + bubble_width,
+            y_pos + 50,
+            fill=COLORS['message_user'] if is_user else COLORS['message_bot'],
+            radius=20
+        )
+
+        # Add message text; assistant replies are rendered as Markdown
+        if is_user:
+            text_item = self.widget.create_text(
+                bubble_x + 20,
+                y_pos + 15,
+                text=msg.content,
+                fill=COLORS['text_primary'],
+                anchor=tk.NW,
+                width=bubble_width - 40,
+                font=('SF Pro Display', 13)
+            )
+            text_bottom = self.widget.bbox(text_item)[3]
+        else:
+            text_bottom = self.styles.draw_markdown_blocks(
+                self.widget,
+                render_markdown(msg.content),
+                bubble_x + 20,
+                y_pos + 15,
+                bubble_width - 40
+            )
+
+        bubble_bottom = max(y_pos + 50, text_bottom + 15)
+        self.widget.coords(
+            bubble,
+            *self.styles.rounded_rectangle_points(bubble_x, y_pos, bubble_x + bubble_width, bubble_bottom, 20)
+        )
+        self.widget.tag_lower(bubble)
+
+        # Add timestamp
+        timestamp = time.strftime('%H:%M', time.localtime(msg.timestamp))
+        self.widget.create_text(
+            bubble_x + bubble_width - 20,
+            bubble_bottom + 10,
+            text=timestamp,
+            fill=COLORS['text_secondary'],
+            anchor=tk.E,
+            font=('SF Pro Display', 10)
+        )
+
+        # Branch controls under the bubble
+        if index is not None:
+            x = bubble_x + 20
+            for label, action in message_actions(msg, branch):
+                tags = ('action', f'do_{action}_{index}') if action else ()
+                item = self.widget.create_text(
+                    x,
+                    bubble_bottom + 10,
+                    text=label,
+                    fill=COLORS['accent_tertiary'] if action else COLORS['text_secondary'],
+                    anchor=tk.W,
+                    font=('SF Pro Display', 10),
+                    tags=tags
+                )
+                x = self.widget.bbox(item)[2] + 8
+
+        return bubble_bottom + 50
+
+    def update_stream(self, renderer):
+        """Draw newly completed blocks once and redraw only the open tail"""
+        bubble_x, bubble_width, avatar_x = self.bubble_geometry(False)
+        y_pos = self.next_y
+
+        if self.stream is None:
+            self.widget.create_image(
+                avatar_x,
+                y_pos + 25,
+                image=self.images['robot'],
+                tags=('stream',)
+            )
+            bubble = self.styles.create_rounded_rectangle(
+                self.widget,
+                bubble_x,
+                y_pos,
+                bubble_x + bubble_width,
+                y_pos + 50,
+                fill=COLORS['message_bot'],
+                radius=20,
+                tags=('stream',)
+            )
+            self.stream = {
+                'renderer': renderer,
+                'bubble': bubble,
+                'drawn': 0,
+                'block_y': y_pos + 15,
+                'bottom': y_pos + 15
+            }
+        stream = self.stream
+
+        completed = renderer.blocks[stream['drawn']:]
+        if completed:
+            stream['bottom'] = self.styles.draw_markdown_blocks(
+                self.widget,
+                completed,
+                bubble_x + 20,
+                stream['block_y'],
+                bubble_width - 40,
+                tags=('stream',)
+            )
+            stream['block_y'] = stream['bottom'] + MARKDOWN_BLOCK_SPACING
+            stream['drawn'] = len(renderer.blocks)
+
+        self.widget.delete('stream_tail')
+        text_bottom = stream['bottom']
+        open_blocks = renderer.open_blocks()
+        if open_blocks:
+            text_bottom = self.styles.draw_markdown_blocks(
+                self.widget,
+                open_blocks,
+                bubble_x + 20,
+                stream['block_y'],
+                bubble_width - 40,
+                tags=('stream', 'stream_tail')
+            )
+
+        bubble_bottom = max(y_pos + 50, text_bottom + 15)
+        self.widget.coords(
+            stream['bubble'],
+            *self.styles.rounded_rectangle_points(bubble_x, y_pos, bubble_x + bubble_width, bubble_bottom, 20)
+        )
+        self.widget.tag_lower(stream['bubble'])
+        self._update_scrollregion(True)
+
+    def end_stream(self):
+        """Remove the streaming reply; returns its renderer, if there was one"""
+        if self.stream is None:
+            return None
+        renderer = self.stream['renderer']
+        self.widget.delete('stream')
+        self.stream = None
+        return renderer
+
+
+class TextMessageView:
+    USER_MARGIN = 160   # left margin that pushes user messages to the right
+    BOT_MARGIN = 50
+
+    def __init__(self, parent, styles, images, yscrollcommand, on_action):
+        self.styles = styles
+        self.images = images
+        self.on_action = on_action
+        self.widget = tk.Text(
+            parent,
+            bg=COLORS['bg_chat'],
+            fg=COLORS['text_primary'],
+            selectbackground=COLORS['accent_primary'],
+            font=MARKDOWN_FONTS['paragraph'],
+            wrap=tk.WORD,
+            padx=20,
+            pady=20,
+            bd=0,
+            highlightthickness=0,
+            cursor='arrow',
+            yscrollcommand=yscrollcommand
+        )
+        self.setup_tags()
+        self.widget.tag_bind('action', '<Button-1>', self._on_click)
+        # Read-only, but selection and copying still work
+        self.widget.configure(state=tk.DISABLED)
+        self.stream = None
+        self.first_index = None
+
+    def setup_tags(self):
+        text = self.widget
+        # Role tags first, so the block tags created after them take priority
+        text.tag_configure('user', lmargin1=self.USER_MARGIN, lmargin2=self.USER_MARGIN,
+                           rmargin=10, background=COLORS['message_user'])
+        text.tag_configure('assistant', lmargin1=self.BOT_MARGIN, lmargin2=self.BOT_MARGIN,
+                           rmargin=self.USER_MARGIN - self.BOT_MARGIN, background=COLORS['message_bot'])
+        text.tag_configure('header', spacing1=12, spacing3=4)
+        text.tag_configure('timestamp', font=('SF Pro Display', 10), foreground=COLORS['text_secondary'])
+        for level in (1, 2, 3):
+            text.tag_configure(f'heading{level}', font=MARKDOWN_FONTS[f'heading{level}'])
+        text.tag_configure('code_block', font=MARKDOWN_FONTS['code'], background=COLORS['code_bg'],
+                           lmargin1=self.BOT_MARGIN + 10, lmargin2=self.BOT_MARGIN + 10)
+        text.tag_configure('quote', font=MARKDOWN_FONTS['quote'], foreground=COLORS['quote_bar'],
+                           lmargin1=self.BOT_MARGIN + 12, lmargin2=self.BOT_MARGIN + 12)
+        text.tag_configure('list_item', lmargin1=self.BOT_MARGIN + 10, lmargin2=self.BOT_MARGIN + 24)
+        text.tag_configure('inline_bold', font=MARKDOWN_FONTS['paragraph'] + ('bold',))
+        text.tag_configure('inline_italic', font=MARKDOWN_FONTS['paragraph'] + ('italic',))
+        text.tag_configure('inline_code', font=MARKDOWN_FONTS['code'], background=COLORS['code_bg'])
+        text.tag_configure('block', spacing3=MARKDOWN_BLOCK_SPACING)
+        text.tag_configure('action', font=('SF Pro Display', 10), foreground=COLORS['accent_tertiary'])
+
+    def _on_click(self, event):
+        action = parse_action_tag(self.widget.tag_names(f'@{event.x},{event.y}'))
+        if action:
+            self.on_action(*action)
+
+    # Building tagged chunks
+
+    @staticmethod
+    def markdown_chunks(blocks, role):
+        """Flatten Markdown blocks into alternating text/tags arguments for Text.insert"""
+        args = []
+        for block in blocks:
+            if block.kind == 'code':
+                args += [block.text + '\n', (role, 'block', 'code_block')]
+                continue
+            if block.kind == 'heading':
+                block_tag = f'heading{min(block.meta, 3)}'
+            elif block.kind in ('list_item', 'quote'):
+                block_tag = block.kind
+            else:
+                block_tag = 'paragraph'
+            if block.kind == 'list_item':
+                bullet = '•' if block.meta in ('-', '*', '+') else block.meta
+                args += [f"{bullet} ", (role, block_tag)]
+            for run, style in parse_inline(block.text):
+                tags = (role, block_tag, f'inline_{style}') if style else (role, block_tag)
+                args += [run, tags]
+            args += ['\n', (role, block_tag, 'block')]
+        return args
+
+    def message_chunks(self, msg, index, branch):
+        role = 'user' if msg.role == 'user' else 'assistant'
+        timestamp = time.strftime('%H:%M', time.localtime(msg.timestamp))
+        header = [f" {timestamp}", (role, 'header', 'timestamp')]
+        for label, action in message_actions(msg, branch):
+            tags = (role, 'header', 'action', f'do_{action}_{index}') if action else (role, 'header', 'timestamp')
+            header += ['  ', (role, 'header'), label, tags]
+        header += ['\n', (role, 'header')]
+        if role == 'user':
+            body = [msg.content + '\n', (role, 'block')]
+        else:
+            body = self.markdown_chunks(render_markdown(msg.content), role)
+        return header + body
+
+    def _insert_message(self, index, msg, branch, position):
+        """Insert a message with its avatar at position; its mark moves along with later edits"""
+        text = self.widget
+        mark = f'msg{index}'
+        text.mark_set(mark, position)
+        text.mark_gravity(mark, tk.LEFT)
+        # The mark stays left of whatever is inserted at it, so the avatar goes in last
+        text.insert(mark, *self.message_chunks(msg, index, branch))
+        avatar = self.images.get('user' if msg.role == 'user' else 'robot')
+        if avatar:
+            text.image_create(mark, image=avatar)
+
+    # View interface
+
+    def clear(self):
+        text = self.widget
+        text.configure(state=tk.NORMAL)
+        text.delete('1.0', tk.END)
+        for mark in text.mark_names():
+            if mark.startswith(('msg', 'stream')):
+                text.mark_unset(mark)
+        for tag in text.tag_names():
+            if tag.startswith('do_'):
+                text.tag_delete(tag)
+        text.configure(state=tk.DISABLED)
+        self.stream = None
+        self.first_index = None
+
+    def render(self, entries, scroll_to_end=True):
+        """Rewrite from scratch; a streaming reply has to be fed again afterwards"""
+        self.clear()
+        text = self.widget
+        text.configure(state=tk.NORMAL)
+        for index, msg, branch in entries:
+            self._insert_message(index, msg, branch, 'end-1c')
+        text.configure(state=tk.DISABLED)
+        self.first_index = entries[0][0] if entries else None
+        if scroll_to_end:
+            text.see(tk.END)
+
+    def append(self, msg, index, branch=None):
+        renderer = self.end_stream()
+        text = self.widget
+        text.configure(state=tk.NORMAL)
+        self._insert_message(index, msg, branch, 'end-1c')
+        text.configure(state=tk.DISABLED)
+        if self.first_index is None:
+            self.first_index = index
+        if renderer:
+            self.update_stream(renderer)
+        text.see(tk.END)
+
+    def prepend(self, entries, added):
+        """Insert the first `added` entries above the shown ones; the view stays put"""
+        text = self.widget
+        if self.first_index is None:
+            renderer = self.end_stream()
+            self.render(entries, scroll_to_end=False)
+            if renderer:
+                self.update_stream(renderer)
+            return
+        old_first = f'msg{self.first_index}'
+        text.mark_set('view_top', '@0,0')
+        text.configure(state=tk.NORMAL)
+        # Let the old first mark and the view anchor slide down past the new text
+        text.mark_gravity(old_first, tk.RIGHT)
+        text.mark_gravity('view_top', tk.RIGHT)
+        for index, msg, branch in entries[:added]:
+            self._insert_message(index, msg, branch, old_first)
+        text.mark_gravity(old_first, tk.LEFT)
+        text.configure(state=tk.DISABLED)
+        self.first_index = entries[0][0]
+        text.yview('view_top')
+        text.mark_unset('view_top')
+
+    def scroll_to(self, index):
+        if f'msg{index}' in self.widget.mark_names():
+            self.widget.yview(f'msg{index}')
+
+    def scroll_to_end(self):
+        self.widget.see(tk.END)
+
+    def update_stream(self, renderer):
+        """Insert newly completed blocks once and rewrite only the open tail"""
+        text = self.widget
+        text.configure(state=tk.NORMAL)
+        if self.stream is None:
+            text.mark_set('stream_start', 'end-1c')
+            text.mark_gravity('stream_start', tk.LEFT)
+            text.insert('end-1c', ' …\n', ('assistant', 'header', 'timestamp'))
+            if self.images.get('robot'):
+                text.image_create('stream_start', image=self.images['robot'])
+            text.mark_set('stream_tail', 'end-1c')
+            text.mark_gravity('stream_tail', tk.LEFT)
+            self.stream = {'renderer': renderer, 'drawn': 0, 'fence_drawn': None}
+        stream = self.stream
+
+        completed = renderer.blocks[stream['drawn']:]
+        fence = renderer.open_fence()
+        if completed or fence is None or stream['fence_drawn'] is None:
+            text.delete('stream_tail', 'end-1c')
+            stream['fence_drawn'] = None
+            if completed:
+                text.insert('end-1c', *self.markdown_chunks(completed, 'assistant'))
+                text.mark_set('stream_tail', 'end-1c')
+                stream['drawn'] = len(renderer.blocks)
+        if fence is None:
+            open_blocks = renderer.open_blocks()
+            if open_blocks:
+                text.insert('end-1c', *self.markdown_chunks(open_blocks, 'assistant'))
+        else:
+            # Inside an open code fence only the new lines are appended
+            _, lines, partial = fence
+            tags = ('assistant', 'block', 'code_block')
+            if stream['fence_drawn'] is None:
+                text.mark_set('stream_fence', 'end-1c')
+                text.mark_gravity('stream_fence', tk.LEFT)
+                stream['fence_drawn'] = 0
+            text.delete('stream_fence', 'end-1c')
+            if len(lines) > stream['fence_drawn']:
+                text.insert('end-1c', ''.join(line + '\n' for line in lines[stream['fence_drawn']:]), tags)
+                text.mark_set('stream_fence', 'end-1c')
+                stream['fence_drawn'] = len(lines)
+            if partial is not None:
+                text.insert('end-1c', partial + '\n', tags)
+        text.configure(state=tk.DISABLED)
+        text.see(tk.END)
+
+    def end_stream(self):
+        """Remove the streaming reply; returns its renderer, if there was one"""
+        if self.stream is None:
+            return None
+        renderer = self.stream['renderer']
+        text = self.widget
+        text.configure(state=tk.NORMAL)
+        text.delete('stream_start', 'end-1c')
+        text.configure(state=tk.DISABLED)
+        text.mark_unset('stream_start', 'stream_tail', 'stream_fence')
+        self.stream = None
+        return renderer
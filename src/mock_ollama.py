@@ -0,0 +1,257 @@
+"""Stub Ollama server for exercising the app without a real model.
+
+Speaks enough of the Ollama API for ChatOllama and the recall embedder:
+
+    POST /api/chat      streamed NDJSON (or one JSON object with "stream": false)
+    POST /api/embed     deterministic hashed embeddings
+    GET  /api/tags      the configured model names
+    GET  /api/version
+
+Replies are canned words emitted at a configurable token rate after a
+configurable first-token latency with random jitter. Failures can be
+injected: a request can fail up front with HTTP 500, or the stream can be
+cut off partway through a reply.
+
+    python mock_ollama.py --port 11435 --token-rate 40 --latency 0.3 --fail-rate 0.05
+
+then point the app's Ollama API URL at http://127.0.0.1:11435.
+"""
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional
+
+from recall import HashingEmbedder
+
+logger = logging.getLogger('QuantumChat.MockOllama')
+
+WORDS = (
+    "quantum state entangled photon lattice vector matrix signal cache "
+    "stream token latency model buffer thread kernel render canvas"
+).split()
+
+
+class MockOllamaServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 11435,
+                 token_rate: float = 50.0, latency: float = 0.2, jitter: float = 0.1,
+                 fail_rate: float = 0.0, cut_rate: float = 0.0,
+                 reply_tokens: int = 60, models: Optional[List[str]] = None, seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.token_rate = token_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.cut_rate = cut_rate
+        self.reply_tokens = reply_tokens
+        self.models = models or ['qwen2.5:14b']
+        self.random = random.Random(seed)
+        self.embedder = HashingEmbedder(dim=64)
+        self.stats = {'requests': 0, 'failed': 0, 'cut': 0, 'tokens': 0}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start_in_thread(self) -> str:
+        """Serve on a daemon thread and return the base URL"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        self._server.daemon_threads = True
+        # Port 0 picks a free port
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='MockOllama', daemon=True).start()
+        logger.info(f"Mock Ollama listening on {self.url}")
+        return self.url
+
+    def serve_forever(self) -> None:
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        self._server.daemon_threads = True
+        logger.info(f"Mock Ollama listening on {self.url}")
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    # Behaviour
+
+    def _roll(self, probability: float) -> bool:
+        with self._lock:
+            return self.random.random() < probability
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def first_token_delay(self) -> float:
+        with self._lock:
+            return max(self.latency * (1 + self.random.uniform(-self.jitter, self.jitter)), 0.0)
+
+    def token_delay(self) -> float:
+        base = 1.0 / self.token_rate if self.token_rate > 0 else 0.0
+        with self._lock:
+            return max(base * (1 + self.random.uniform(-self.jitter, self.jitter)), 0.0)
+
+    def reply_words(self, prompt: str) -> List[str]:
+        with self._lock:
+            words = [self.random.choice(WORDS) for _ in range(self.reply_tokens)]
+        # Echo the start of the prompt so replies are distinguishable
+        return prompt.split()[:3] + words
+
+    @staticmethod
+    def timestamp() -> str:
+        return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self.send_json(200, {'models': [{'name': name, 'model': name} for name in server.models]})
+                elif self.path == '/api/version':
+                    self.send_json(200, {'version': '0.0.0-mock'})
+                else:
+                    self.send_json(404, {'error': f"not found: {self.path}"})
+
+            def do_POST(self):
+                try:
+                    request = self.read_json()
+                except ValueError:
+                    self.send_json(400, {'error': 'invalid JSON'})
+                    return
+                if self.path == '/api/chat':
+                    self.chat(request)
+                elif self.path == '/api/embed':
+                    texts = request.get('input', [])
+                    texts = [texts] if isinstance(texts, str) else texts
+                    vectors = server.embedder.embed(texts)
+                    self.send_json(200, {'model': request.get('model'), 'embeddings': vectors.tolist()})
+                else:
+                    self.send_json(404, {'error': f"not found: {self.path}"})
+
+            def chat(self, request: Dict[str, Any]) -> None:
+                server._count('requests')
+                if server._roll(server.fail_rate):
+                    server._count('failed')
+                    self.send_json(500, {'error': 'injected failure'})
+                    return
+
+                model = request.get('model', server.models[0])
+                messages = request.get('messages') or [{}]
+                words = server.reply_words(messages[-1].get('content', ''))
+                started = time.perf_counter()
+                time.sleep(server.first_token_delay())
+
+                if not request.get('stream', True):
+                    for _ in words:
+                        time.sleep(server.token_delay())
+                    server._count('tokens', len(words))
+                    self.send_json(200, self.final(model, ' '.join(words), len(words), started))
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                cut_at = self.cut_point(len(words))
+                for index, word in enumerate(words):
+                    if index == cut_at:
+                        server._count('cut')
+                        # Drop the connection without the terminating chunk
+                        self.close_connection = True
+                        return
+                    self.write_chunk({
+                        'model': model,
+                        'created_at': server.timestamp(),
+                        'message': {'role': 'assistant', 'content': word if index == 0 else ' ' + word},
+                        'done': False
+                    })
+                    server._count('tokens')
+                    time.sleep(server.token_delay())
+                final = self.final(model, '', len(words), started)
+                self.write_chunk(final)
+                self.wfile.write(b'0\r\n\r\n')
+
+            def cut_point(self, length: int) -> Optional[int]:
+                if server._roll(server.cut_rate):
+                    with server._lock:
+                        return server.random.randrange(1, max(length, 2))
+                return None
+
+            def write_chunk(self, payload: Dict[str, Any]) -> None:
+                data = json.dumps(payload).encode() + b'\n'
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+                self.wfile.flush()
+
+            @staticmethod
+            def final(model: str, content: str, count: int, started: float) -> Dict[str, Any]:
+                duration = int((time.perf_counter() - started) * 1e9)
+                return {
+                    'model': model,
+                    'created_at': server.timestamp(),
+                    'message': {'role': 'assistant', 'content': content},
+                    'done': True,
+                    'done_reason': 'stop',
+                    'total_duration': duration,
+                    'eval_count': count,
+                    'eval_duration': duration,
+                    'prompt_eval_count': 1,
+                    'prompt_eval_duration': 0
+                }
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--token-rate', type=float, default=50.0, help="tokens per second")
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument('--jitter', type=float, default=0.1, help="relative jitter on delays")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument('--cut-rate', type=float, default=0.0, help="share of streams cut off mid-reply")
+    parser.add_argument('--reply-tokens', type=int, default=60)
+    parser.add_argument('--model', action='append', dest='models')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = MockOllamaServer(
+        args.host, args.port, args.token_rate, args.latency, args.jitter,
+        args.fail_rate, args.cut_rate, args.reply_tokens, args.models, args.seed
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""Paged access to chat files.
+
+Chat files are written with ``messages`` as the last key, one message object
+after another, so any run of messages is a contiguous byte range. For each
+chat, ``chat_pages/`` keeps:
+
+    <id>.offsets   start offset of every message, as little-endian uint64
+    <id>.meta      chat metadata, message count, end offset, the size and
+                   mtime of the chat file they describe, and the chat's
+                   active leaf (see branches)
+
+Opening a chat reads the metadata, the last few offsets and the last page
+of messages, whatever the chat's length. Appending a message rewrites only
+the closing brackets of the chat file and adds one offset. Switching
+branches rewrites only the meta file. Files that do not
+match their metadata, such as files edited elsewhere or written by older
+versions, are parsed once and rewritten in the paged layout.
+
+With a ChatArchive attached, idle chats can be moved to cold storage
+(``archive_idle``). Archived chats are paged from their pack through the
+offsets kept there until the first write, which restores them as hot files.
+
+With a BlobStore attached, large message content is written to the store
+and the message on disk references it by hash; the chat's references are
+updated every time its file is written.
+"""
+import os
+import re
+import sys
+import json
+import array
+import itertools
+import logging
+import time
+import textwrap
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from messages import Message, messages_from_json
+from archive import ChatArchive
+from blobs import BlobStore
+
+logger = logging.getLogger('QuantumChat.Paging')
+
+MESSAGE_SEP = ',\n'
+FOOTER = '\n  ]\n}\n'
+# Keys that are never written to the chat file; active_leaf lives in the meta file
+# and version only counts an engine's in-memory changes
+RUNTIME_KEYS = ('messages', 'first_loaded', 'archived', 'active_leaf', 'version')
+# Matches only keys: a "blob" inside message text is escaped as \"blob\"
+BLOB_REF = re.compile(r'"blob": "([0-9a-f]{64})"')
+
+
+def message_total(chat: Dict[str, Any]) -> int:
+    """Number of messages in a chat, loaded or not"""
+    return chat.get('first_loaded', 0) + len(chat.get('messages', []))
+
+
+class PagedChatStore:
+    PAGE_SIZE = 50
+
+    def __init__(self, chat_dir: str = 'chats', index_dir: str = 'chat_pages',
+                 archive: Optional[ChatArchive] = None, blobs: Optional[BlobStore] = None):
+        self.chat_dir = Path(chat_dir)
+        self.chat_dir.mkdir(exist_ok=True)
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(exist_ok=True)
+        self.archive = archive
+        self.blobs = blobs
+
+    # Paths and serialization
+
+    def chat_path(self, chat_id: str) -> Path:
+        return self.chat_dir / f"{chat_id}.json"
+
+    def _offsets_path(self, chat_id: str) -> Path:
+        return self.index_dir / f"{chat_id}.offsets"
+
+    def _meta_path(self, chat_id: str) -> Path:
+        return self.index_dir / f"{chat_id}.meta"
+
+    @staticmethod
+    def _metadata(chat: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in chat.items() if key not in RUNTIME_KEYS}
+
+    @staticmethod
+    def _header(metadata: Dict[str, Any]) -> str:
+        # json.dumps keeps ASCII by default, so string offsets equal byte offsets
+        return json.dumps(metadata, indent=2)[:-2] + ',\n  "messages": [\n'
+
+    def _serialize(self, chat_id: str, msg: Any) -> str:
+        if isinstance(msg, Message):
+            if self.blobs and self.blobs.should_store(msg.raw_content):
+                msg.externalize(self.blobs.put(chat_id, msg.raw_content))
+            data = msg.to_dict()
+        else:
+            data = msg
+            if self.blobs and self.blobs.should_store(data.get('content')):
+                ref = self.blobs.put(chat_id, data['content'])
+                data = {}
+                for key, value in msg.items():
+                    if key == 'content':
+                        data['blob'] = ref.digest
+                        data['size'] = ref.size
+                    else:
+                        data[key] = value
+        return textwrap.indent(json.dumps(data, indent=2), '    ')
+
+    def _write_meta(self, chat_id: str, metadata: Dict[str, Any], count: int, end: int,
+                    active_leaf: Optional[int] = None) -> None:
+        stat = self.chat_path(chat_id).stat()
+        tmp_path = self._meta_path(chat_id).with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'chat': metadata,
+                'count': count,
+                'end': end,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'active_leaf': active_leaf
+            }, f)
+        tmp_path.replace(self._meta_path(chat_id))
+
+    def _read_meta(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Metadata, or None if missing or out of date with the chat file"""
+        try:
+            with open(self._meta_path(chat_id), 'r') as f:
+                meta = json.load(f)
+            stat = self.chat_path(chat_id).stat()
+            offsets_size = self._offsets_path(chat_id).stat().st_size
+        except (OSError, ValueError):
+            return None
+        if (meta.get('size') != stat.st_size or meta.get('mtime_ns') != stat.st_mtime_ns
+                or offsets_size != meta.get('count', 0) * 8):
+            return None
+        return meta
+
+    def _read_offsets(self, chat_id: str, start: int, stop: int) -> List[int]:
+        offsets = array.array('Q')
+        with open(self._offsets_path(chat_id), 'rb') as f:
+            f.seek(start * 8)
+            offsets.frombytes(f.read((stop - start) * 8))
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        return offsets.tolist()
+
+    def _read_bytes(self, chat_id: str, begin: int, end: int) -> bytes:
+        with open(self.chat_path(chat_id), 'rb') as f:
+            f.seek(begin)
+            return f.read(end - begin)
+
+    # Whole-file writes
+
+    def _write_full(self, metadata: Dict[str, Any], messages_source, active_leaf: Optional[int] = None) -> int:
+        """Write a chat in the paged layout from an iterable of serialized messages"""
+        chat_id = metadata['id']
+        chat_path = self.chat_path(chat_id)
+        tmp_path = chat_path.with_name(chat_path.name + '.tmp')
+        offsets = array.array('Q')
+        header = self._header(metadata)
+        digests = set()
+
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.write(header)
+            position = len(header)
+            for index, serialized in enumerate(messages_source):
+                if index:
+                    f.write(MESSAGE_SEP)
+                    position += len(MESSAGE_SEP)
+                offsets.append(position)
+                if self.blobs and '"blob": "' in serialized:
+                    digests.update(BLOB_REF.findall(serialized))
+                f.write(serialized)
+                position += len(serialized)
+            f.write(FOOTER)
+
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        with open(self._offsets_path(chat_id), 'wb') as f:
+            offsets.tofile(f)
+        os.replace(tmp_path, chat_path)
+        self._write_meta(chat_id, metadata, len(offsets), position, active_leaf)
+        if self.blobs:
+            self.blobs.set_refs(chat_id, digests)
+        return len(offsets)
+
+    def _migrate(self, chat_file: Path) -> Dict[str, Any]:
+        """Parse a chat file once and rewrite it in the paged layout"""
+        with open(chat_file, 'r') as f:
+            data = json.load(f)
+        messages = data.get('messages', [])
+        metadata = self._metadata(data)
+        # Chat files written before the leaf moved to the meta file may still carry it
+        self._write_full(metadata, (self._serialize(metadata['id'], msg) for msg in messages),
+                         data.get('active_leaf'))
+        logger.info(f"Indexed chat {chat_file.name} for paged loading")
+        return data
+
+    # Public API
+
+    def read_summary(self, chat_id: str) -> Tuple[Dict[str, Any], int]:
+        """A chat's metadata and message count, without writing anything
+
+        For readers outside the process that owns the store: only a missing
+        or stale sidecar costs parsing the chat file.
+        """
+        meta = self._read_meta(chat_id)
+        if meta is not None:
+            return meta['chat'], meta['count']
+        with open(self.chat_path(chat_id), 'r') as f:
+            data = json.load(f)
+        return self._metadata(data), len(data.get('messages', []))
+
+    def load_meta(self, chat_file: Path) -> Dict[str, Any]:
+        """Chat metadata with no messages loaded yet"""
+        chat_id = chat_file.stem
+        meta = self._read_meta(chat_id)
+        if meta is None:
+            data = self._migrate(chat_file)
+            chat = self._metadata(data)
+            count = len(data.get('messages', []))
+            active_leaf = data.get('active_leaf')
+        else:
+            chat = meta['chat']
+            count = meta['count']
+            active_leaf = meta.get('active_leaf')
+        if active_leaf is not None:
+            chat['active_leaf'] = active_leaf
+        chat['messages'] = []
+        chat['first_loaded'] = count
+        return chat
+
+    def read_messages(self, chat_id: str, start: int, stop: int) -> List[Message]:
+        """Messages [start, stop) read straight from their byte range"""
+        if self._archived(chat_id):
+            if not self.archive.pageable(chat_id):
+                messages = self.archive.inflate(chat_id).get('messages', [])
+                return messages_from_json(messages[max(start, 0):stop], self.blobs)
+            count, end = self.archive.extent(chat_id)
+            read_offsets, read_bytes = self.archive.read_offsets, self.archive.read_bytes
+        else:
+            meta = self._read_meta(chat_id)
+            if meta is None:
+                self._migrate(self.chat_path(chat_id))
+                meta = self._read_meta(chat_id)
+            count, end = meta['count'], meta['end']
+            read_offsets, read_bytes = self._read_offsets, self._read_bytes
+        stop = min(stop, count)
+        start = max(start, 0)
+        if start >= stop:
+            return []
+
+        offsets = read_offsets(chat_id, start, min(stop + 1, count))
+        begin = offsets[0]
+        if stop < count:
+            end = offsets[stop - start] - len(MESSAGE_SEP)
+        data = read_bytes(chat_id, begin, end)
+        return messages_from_json(json.loads(b'[' + data + b']'), self.blobs)
+
+    def load_tail(self, chat: Dict[str, Any], count: int = None) -> None:
+        """Load the last page of a chat whose messages are not loaded"""
+        total = message_total(chat)
+        start = max(total - (count or self.PAGE_SIZE), 0)
+        chat['messages'] = self.read_messages(chat['id'], start, total)
+        chat['first_loaded'] = start
+
+    def load_older(self, chat: Dict[str, Any], count: int = None) -> int:
+        """Prepend the page before the loaded messages; returns how many were added"""
+        first = chat.get('first_loaded', 0)
+        start = max(first - (count or self.PAGE_SIZE), 0)
+        older = self.read_messages(chat['id'], start, first)
+        chat['messages'][0:0] = older
+        chat['first_loaded'] = start
+        return len(older)
+
+    def append_message(self, chat: Dict[str, Any], msg: Message) -> None:
+        """Persist one message appended to chat['messages'] without rewriting the file"""
+        chat_id = chat['id']
+        self._restore_if_archived(chat)
+        meta = self._read_meta(chat_id)
+        if (meta is None or meta['count'] != message_total(chat) - 1
+                or meta['chat'] != self._metadata(chat)):
+            self.save(chat)
+            return
+
+        serialized = self._serialize(chat_id, msg)
+        prefix = MESSAGE_SEP if meta['count'] else ''
+        start = meta['end'] + len(prefix)
+        with open(self.chat_path(chat_id), 'r+b') as f:
+            f.seek(meta['end'])
+            f.write((prefix + serialized + FOOTER).encode('ascii'))
+            f.truncate()
+
+        offset = array.array('Q', [start])
+        if sys.byteorder != 'little':
+            offset.byteswap()
+        with open(self._offsets_path(chat_id), 'ab') as f:
+            offset.tofile(f)
+        self._write_meta(chat_id, meta['chat'], meta['count'] + 1, start + len(serialized),
+                         chat.get('active_leaf'))
+
+    def save_active_leaf(self, chat: Dict[str, Any]) -> None:
+        """Persist a branch switch by rewriting only the meta file"""
+        chat_id = chat['id']
+        self._restore_if_archived(chat)
+        meta = self._read_meta(chat_id)
+        if meta is None:
+            self.save(chat)
+            return
+        self._write_meta(chat_id, meta['chat'], meta['count'], meta['end'], chat.get('active_leaf'))
+
+    def save(self, chat: Dict[str, Any]) -> None:
+        """Rewrite a chat; unloaded messages are copied as raw bytes, not parsed"""
+        chat_id = chat['id']
+        self._restore_if_archived(chat)
+        first_loaded = chat.get('first_loaded', 0)
+        loaded = [self._serialize(chat_id, msg) for msg in chat.get('messages', [])]
+
+        if first_loaded == 0:
+            self._write_full(self._metadata(chat), loaded, chat.get('active_leaf'))
+            return
+
+        meta = self._read_meta(chat_id)
+        if meta is None:
+            raise ValueError(f"Cannot save partially loaded chat {chat_id}: page index is stale")
+        if first_loaded < meta['count']:
+            # The first loaded message marks where the unloaded bytes stop
+            offsets = self._read_offsets(chat_id, 0, first_loaded + 1)
+        else:
+            offsets = self._read_offsets(chat_id, 0, first_loaded)
+            offsets.append(meta['end'] + len(MESSAGE_SEP))
+
+        def unloaded():
+            # Stream the old bytes through one message at a time
+            with open(self.chat_path(chat_id), 'rb') as f:
+                f.seek(offsets[0])
+                for index in range(first_loaded):
+                    yield f.read(offsets[index + 1] - len(MESSAGE_SEP) - offsets[index]).decode('ascii')
+                    f.read(len(MESSAGE_SEP))
+
+        self._write_full(self._metadata(chat), itertools.chain(unloaded(), loaded), chat.get('active_leaf'))
+
+    def delete(self, chat_id: str) -> None:
+        for path in (self.chat_path(chat_id), self._offsets_path(chat_id), self._meta_path(chat_id)):
+            if path.exists():
+                path.unlink()
+        if self.archive:
+            self.archive.remove(chat_id)
+        if self.blobs:
+            self.blobs.release(chat_id)
+
+    # Cold storage
+
+    def _archived(self, chat_id: str) -> bool:
+        return bool(self.archive) and chat_id in self.archive and not self.chat_path(chat_id).exists()
+
+    def _restore_if_archived(self, chat: Dict[str, Any]) -> None:
+        """Bring an archived chat back to chats/ before it is written to"""
+        chat.pop('archived', None)
+        chat_id = chat['id']
+        if not self._archived(chat_id):
+            return
+        if self.archive.pageable(chat_id):
+            # The pack holds the chat file and offsets as they were; copy them back out
+            chat_path = self.chat_path(chat_id)
+            tmp_path = chat_path.with_name(chat_path.name + '.tmp')
+            with open(tmp_path, 'wb') as chat_file, open(self._offsets_path(chat_id), 'wb') as offsets_file:
+                self.archive.extract(chat_id, chat_file, offsets_file)
+            os.replace(tmp_path, chat_path)
+            count, end = self.archive.extent(chat_id)
+            metadata = {key: value for key, value in self.archive.entries[chat_id]['chat'].items()
+                        if key not in RUNTIME_KEYS}
+            self._write_meta(chat_id, metadata, count, end, chat.get('active_leaf'))
+        else:
+            data = self.archive.inflate(chat_id)
+            self._write_full(self._metadata(data),
+                             (self._serialize(chat_id, msg) for msg in data.get('messages', [])),
+                             chat.get('active_leaf'))
+        self.archive.remove(chat_id)
+        logger.info(f"Restored archived chat {chat_id}")
+
+    def load_archived(self, chats: Dict[str, Dict[str, Any]]) -> None:
+        """Add archived chats to chats as metadata, straight from the archive index"""
+        if not self.archive:
+            return
+        for chat_id, entry in list(self.archive.entries.items()):
+            if chat_id in chats:
+                # Restored but not yet dropped from the index (e.g. after a crash)
+                self.archive.remove(chat_id)
+                continue
+            chat = dict(entry['chat'])
+            chat['messages'] = []
+            chat['first_loaded'] = entry['count']
+            chat['archived'] = True
+            chats[chat_id] = chat
+
+    def archive_idle(self, chats: Dict[str, Dict[str, Any]], days: float, keep=()) -> List[str]:
+        """Move chats whose file has not changed for `days` into a new pack"""
+        if not self.archive:
+            return []
+        cutoff = time.time() - days * 86400
+        batch = []
+        for chat_id, chat in chats.items():
+            if chat_id in keep or chat.get('archived'):
+                continue
+            try:
+                if self.chat_path(chat_id).stat().st_mtime >= cutoff:
+                    continue
+                meta = self._read_meta(chat_id)
+                if meta is None:
+                    self._migrate(self.chat_path(chat_id))
+                    meta = self._read_meta(chat_id)
+                metadata = dict(meta['chat'])
+                if meta.get('active_leaf') is not None:
+                    metadata['active_leaf'] = meta['active_leaf']
+                # The pack streams the files in; nothing here holds a whole chat
+                batch.append((metadata, meta['count'], meta['end'],
+                              self.chat_path(chat_id), self._offsets_path(chat_id)))
+            except OSError as e:
+                logger.error(f"Could not archive chat {chat_id}: {str(e)}")
+
+        self.archive.add(batch)
+        archived = [item[0]['id'] for item in batch]
+        for chat_id in archived:
+            # The pack and index are synced, so the hot copy can go
+            for path in (self.chat_path(chat_id), self._offsets_path(chat_id), self._meta_path(chat_id)):
+                if path.exists():
+                    path.unlink()
+            chats[chat_id]['archived'] = True
+        return archived
+
+    def all_messages(self, chat: Dict[str, Any]) -> List[Message]:
+        """Every message of a chat, read from disk for background indexing.
+
+        The in-memory chat is not consulted, since other threads may page or
+        evict its messages meanwhile; every change is saved before it is shown.
+        """
+        return self.read_messages(chat['id'], 0, sys.maxsize)
+
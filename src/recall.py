@@ -0,0 +1,466 @@
+import json
+import queue
+import hashlib
+import logging
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+import numpy as np
+
+from llm import normalize_base_url
+from scheduler import BACKGROUND
+
+logger = logging.getLogger('QuantumChat.Recall')
+
+
+class EmbeddingModelMissing(Exception):
+    """Ollama does not have the embedding model; recall stays off until settings change"""
+
+
+class OllamaEmbedder:
+    """Embeds text batches through Ollama's /api/embed endpoint"""
+
+    def __init__(self, base_url: str, model: str = 'nomic-embed-text', timeout: float = 10.0):
+        self.url = f"{normalize_base_url(base_url)}/api/embed"
+        self.model = model
+        self.timeout = timeout
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'model': self.model, 'input': texts}).encode(),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                raise EmbeddingModelMissing(f"Embedding model {self.model} is not available in Ollama")
+            raise
+        return np.asarray(data['embeddings'], dtype=np.float32)
+
+
+class HashingEmbedder:
+    """Deterministic bag-of-words embedder for tests and offline use"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        return vectors
+
+
+class VectorIndex:
+    """Normalized float32 vectors in a growable NumPy buffer, persisted as .npy + JSON
+
+    ``vectors.npy`` and ``meta.json`` hold the merged index; every saved batch
+    after that is one ``segment-<n>.npz``, so embedding a batch never rewrites
+    the index. Segments are merged once there are MAX_SEGMENTS of them, and
+    right away when rows are dropped. meta.json names the last segment it
+    contains, so a crash mid-merge cannot load rows twice.
+    """
+
+    VECTORS_FILE = 'vectors.npy'
+    META_FILE = 'meta.json'
+    MAX_SEGMENTS = 32
+
+    def __init__(self, index_dir: str = 'recall_index'):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(exist_ok=True)
+        self._vectors: Optional[np.ndarray] = None
+        self.count = 0
+        self.meta: List[Dict[str, Any]] = []
+        self.keys = set()
+        # Chat of each row as an int code, so exclusion is a vectorized mask
+        self._chat_codes: Dict[str, int] = {}
+        self._row_chats = np.zeros(0, dtype=np.int32)
+        # Rows [0, saved) are on disk; rows were dropped if _rewrite is set
+        self.saved = 0
+        self._rewrite = False
+        self._segment = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def _segment_path(self, number: int) -> Path:
+        return self.index_dir / f"segment-{number:06d}.npz"
+
+    def _segments(self) -> List[Path]:
+        return sorted(self.index_dir.glob('segment-*.npz'))
+
+    @staticmethod
+    def _segment_number(path: Path) -> int:
+        return int(path.stem.split('-', 1)[1])
+
+    def load(self) -> None:
+        vectors_path = self.index_dir / self.VECTORS_FILE
+        meta_path = self.index_dir / self.META_FILE
+        segments = self._segments()
+        if segments:
+            self._segment = self._segment_number(segments[-1]) + 1
+        try:
+            parts = []
+            merged_through = -1
+            if vectors_path.exists() and meta_path.exists():
+                vectors = np.load(vectors_path)
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                if isinstance(meta, dict):
+                    merged_through, meta = meta['segments_through'], meta['rows']
+                if len(meta) != len(vectors):
+                    raise ValueError("vector and metadata counts differ")
+                parts.append((vectors, meta))
+            for path in segments:
+                if self._segment_number(path) <= merged_through:
+                    continue
+                with np.load(path) as segment:
+                    parts.append((segment['vectors'], json.loads(str(segment['meta']))))
+            self._segment = max(self._segment, merged_through + 1)
+
+            parts = [(vectors, meta) for vectors, meta in parts if len(meta)]
+            if parts:
+                self._vectors = np.concatenate([vectors for vectors, _ in parts])
+                self.meta = [m for _, meta in parts for m in meta]
+                self.count = self.saved = len(self.meta)
+                self.keys = {(m['chat_id'], m['message_index']) for m in self.meta}
+                self._index_chats()
+                logger.info(f"Recall index loaded: {self.count} vectors")
+        except Exception as e:
+            logger.error(f"Error loading recall index, starting empty: {str(e)}")
+            self._vectors, self.count, self.meta, self.keys = None, 0, [], set()
+            self._index_chats()
+            # Replace whatever is on disk on the next save
+            self.saved, self._rewrite = 0, True
+
+    @staticmethod
+    def _write_npz(path: Path, **arrays) -> None:
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        tmp_path.replace(path)
+
+    def save(self) -> None:
+        """Write rows added since the last save as a new segment"""
+        with self._lock:
+            rewrite = self._rewrite
+            if not rewrite:
+                if self.count == self.saved:
+                    return
+                vectors = self._vectors[self.saved:self.count].copy()
+                meta = self.meta[self.saved:self.count]
+                number = self._segment
+                self._segment += 1
+                saved = self.count
+        if rewrite:
+            self.compact()
+            return
+        try:
+            self._write_npz(self._segment_path(number), vectors=vectors, meta=np.array(json.dumps(meta)))
+        except Exception as e:
+            logger.error(f"Error saving recall index: {str(e)}")
+            return
+        with self._lock:
+            self.saved = max(self.saved, saved)
+        if len(self._segments()) >= self.MAX_SEGMENTS:
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrite vectors.npy and meta.json with every row and drop the segments"""
+        with self._lock:
+            vectors = self.vectors.copy()
+            meta = list(self.meta)
+            through = self._segment - 1
+        try:
+            tmp_vectors = self.index_dir / f"{self.VECTORS_FILE}.tmp"
+            with open(tmp_vectors, 'wb') as f:
+                np.save(f, vectors)
+            tmp_meta = self.index_dir / f"{self.META_FILE}.tmp"
+            with open(tmp_meta, 'w') as f:
+                json.dump({'segments_through': through, 'rows': meta}, f)
+            tmp_vectors.replace(self.index_dir / self.VECTORS_FILE)
+            tmp_meta.replace(self.index_dir / self.META_FILE)
+        except Exception as e:
+            logger.error(f"Error saving recall index: {str(e)}")
+            return
+        for path in self._segments():
+            if self._segment_number(path) <= through:
+                path.unlink()
+        with self._lock:
+            self.saved = len(meta)
+            self._rewrite = False
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:self.count]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def _index_chats(self) -> None:
+        self._chat_codes = {}
+        self._row_chats = np.zeros(max(len(self.meta), 64), dtype=np.int32)
+        self._append_chats(0, self.meta)
+
+    def _append_chats(self, start: int, meta: List[Dict[str, Any]]) -> None:
+        stop = start + len(meta)
+        if stop > len(self._row_chats):
+            grown = np.zeros(max(stop, len(self._row_chats) * 2), dtype=np.int32)
+            grown[:start] = self._row_chats[:start]
+            self._row_chats = grown
+        self._row_chats[start:stop] = [
+            self._chat_codes.setdefault(m['chat_id'], len(self._chat_codes)) for m in meta
+        ]
+
+    def add(self, vectors: np.ndarray, meta: List[Dict[str, Any]]) -> None:
+        vectors = self._normalize(vectors)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vectors.shape[1]:
+                if self.count:
+                    logger.warning("Embedding dimension changed, discarding old recall vectors")
+                self._vectors = np.zeros((max(len(vectors), 64), vectors.shape[1]), dtype=np.float32)
+                self.count, self.meta, self.keys = 0, [], set()
+                self.saved, self._rewrite = 0, True
+                self._index_chats()
+
+            needed = self.count + len(vectors)
+            if needed > len(self._vectors):
+                # Double capacity so appends are amortized O(1)
+                grown = np.zeros((max(needed, len(self._vectors) * 2), vectors.shape[1]), dtype=np.float32)
+                grown[:self.count] = self._vectors[:self.count]
+                self._vectors = grown
+
+            self._vectors[self.count:needed] = vectors
+            self._append_chats(self.count, meta)
+            self.count = needed
+            self.meta.extend(meta)
+            self.keys.update((m['chat_id'], m['message_index']) for m in meta)
+
+    def remove_chat(self, chat_id: str) -> None:
+        with self._lock:
+            keep = [i for i, m in enumerate(self.meta) if m['chat_id'] != chat_id]
+            if len(keep) == self.count:
+                return
+            self._vectors = self.vectors[keep].copy() if keep else None
+            self.meta = [self.meta[i] for i in keep]
+            self.count = len(keep)
+            self.keys = {(m['chat_id'], m['message_index']) for m in self.meta}
+            self._index_chats()
+            # Positions shifted, so the next save merges everything
+            self.saved, self._rewrite = 0, True
+
+    def search(self, query: np.ndarray, k: int, exclude_chat_id: Optional[str] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        with self._lock:
+            vectors = self.vectors
+            meta = self.meta
+            if not len(vectors) or query.shape[-1] != vectors.shape[1]:
+                return []
+            scores = vectors @ self._normalize(query.reshape(1, -1))[0]
+            code = self._chat_codes.get(exclude_chat_id)
+            if code is not None:
+                scores[self._row_chats[:len(scores)] == code] = -np.inf
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), meta[i]) for i in top if np.isfinite(scores[i])]
+
+
+class RecallService:
+    """Embeds chat messages in background batches and retrieves related past snippets
+
+    The prompt itself is embedded as background work too, on its own thread;
+    a send waits at most ``query_timeout`` for it and goes ahead without
+    recall otherwise. If Ollama reports the embedding model missing, recall
+    turns itself off until the settings change.
+    """
+
+    BATCH_SIZE = 32
+    BATCH_WAIT = 2.0  # seconds to wait for a batch to fill
+    MAX_SNIPPET_CHARS = 1200
+    QUERY_CACHE_SIZE = 64
+
+    def __init__(self, settings: Dict[str, Any], index_dir: str = 'recall_index', scheduler=None):
+        self.index = VectorIndex(index_dir)
+        # Embedding batches run as background work when an LLMScheduler is given
+        self.scheduler = scheduler
+        self._queue: "queue.Queue" = queue.Queue()
+        self._query_cache: OrderedDict = OrderedDict()
+        self._pending: Dict[str, threading.Event] = {}
+        self._query_lock = threading.Lock()
+        self.update_settings(settings)
+        self._worker = threading.Thread(target=self._run, name='RecallEmbedder', daemon=True)
+        self._worker.start()
+
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        self.recall_settings = settings.get('recall_settings', {})
+        if self.recall_settings.get('embedding_backend') == 'hashing':
+            self.embedder = HashingEmbedder()
+        else:
+            self.embedder = OllamaEmbedder(
+                settings.get('api_url'),
+                self.recall_settings.get('embedding_model', 'nomic-embed-text')
+            )
+        self.model_missing = False
+        with self._query_lock:
+            self._query_cache.clear()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.recall_settings.get('enabled', True)) and not self.model_missing
+
+    def _embed(self, texts: List[str], name: str) -> np.ndarray:
+        embedder = self.embedder
+        try:
+            if self.scheduler and isinstance(embedder, OllamaEmbedder):
+                return self.scheduler.run(BACKGROUND, lambda ticket: embedder.embed(texts), name=name)
+            return embedder.embed(texts)
+        except EmbeddingModelMissing as e:
+            if embedder is self.embedder and not self.model_missing:
+                self.model_missing = True
+                logger.warning(f"{str(e)}; recall is off until the settings change")
+            raise
+
+    def enqueue(self, chat_id: str, message_index: int, role: str, content: str) -> None:
+        """Queue one message for embedding"""
+        if self.enabled and role in ('user', 'assistant') and content.strip():
+            self._queue.put(('add', chat_id, message_index, role, content))
+
+    def sync(self, chats: Dict[str, Dict[str, Any]],
+             load_messages: Optional[Callable[[Dict[str, Any]], List[Any]]] = None) -> None:
+        """Queue every message that is not in the index yet, scanning on the worker thread"""
+        self._queue.put(('sync', list(chats.values()), load_messages))
+
+    def _sync(self, chats: List[Dict[str, Any]], load_messages) -> None:
+        for chat in chats:
+            chat_id = chat['id']
+            total = chat.get('first_loaded', 0) + len(chat.get('messages', []))
+            # Messages are embedded in order, so an indexed last message means the chat is done
+            if not total or (chat_id, total - 1) in self.index.keys:
+                continue
+            try:
+                messages = load_messages(chat) if load_messages else chat.get('messages', [])
+            except Exception as e:
+                logger.error(f"Could not read chat {chat_id} for recall: {str(e)}")
+                continue
+            for index, msg in enumerate(messages):
+                if (chat_id, index) not in self.index.keys:
+                    self.enqueue(chat_id, index, msg.get('role', ''), msg.get('content', ''))
+
+    def remove_chat(self, chat_id: str) -> None:
+        self._queue.put(('remove', chat_id))
+
+    def _run(self) -> None:
+        while True:
+            batch = []
+            item = self._queue.get()
+            while True:
+                if item[0] == 'remove':
+                    self._flush(batch)
+                    batch = []
+                    self.index.remove_chat(item[1])
+                    self.index.save()
+                elif item[0] == 'sync':
+                    self._sync(item[1], item[2])
+                else:
+                    batch.append(item)
+                if len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.BATCH_WAIT)
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple]) -> None:
+        if not batch:
+            return
+        texts = [content[:self.MAX_SNIPPET_CHARS] for _, _, _, _, content in batch]
+        try:
+            vectors = self._embed(texts, 'embed')
+        except EmbeddingModelMissing:
+            return
+        except Exception as e:
+            logger.error(f"Embedding batch failed, will retry on next sync: {str(e)}")
+            return
+        self.index.add(vectors, [
+            {'chat_id': chat_id, 'message_index': index, 'role': role, 'text': text}
+            for (_, chat_id, index, role, _), text in zip(batch, texts)
+        ])
+        self.index.save()
+        logger.info(f"Embedded {len(batch)} messages")
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return max(len(text) // 4, 1)
+
+    def _query_vector(self, query: str) -> Optional[np.ndarray]:
+        """The prompt's embedding, waiting at most query_timeout for it"""
+        with self._query_lock:
+            vector = self._query_cache.get(query)
+            if vector is not None:
+                self._query_cache.move_to_end(query)
+                return vector
+            done = self._pending.get(query)
+            if done is None:
+                done = self._pending[query] = threading.Event()
+                threading.Thread(target=self._embed_query, args=(query, done), name='RecallQuery', daemon=True).start()
+        if not done.wait(float(self.recall_settings.get('query_timeout', 1.0))):
+            # It is cached when it arrives, so a resend can still use it
+            logger.info("Prompt embedding not ready in time, sending without recall")
+            return None
+        with self._query_lock:
+            return self._query_cache.get(query)
+
+    def _embed_query(self, query: str, done: threading.Event) -> None:
+        try:
+            vector = self._embed([query], 'embed_query')[0]
+            with self._query_lock:
+                self._query_cache[query] = vector
+                while len(self._query_cache) > self.QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+        except Exception as e:
+            logger.error(f"Query embedding failed, continuing without recall: {str(e)}")
+        finally:
+            with self._query_lock:
+                self._pending.pop(query, None)
+            done.set()
+
+    def recall(self, query: str, exclude_chat_id: Optional[str] = None) -> List[str]:
+        """Top-k related snippets from other chats that fit in the token budget"""
+        if not self.enabled or not self.index.count:
+            return []
+        query_vector = self._query_vector(query)
+        if query_vector is None:
+            return []
+
+        top_k = int(self.recall_settings.get('top_k', 4))
+        min_score = float(self.recall_settings.get('min_score', 0.35))
+        budget = int(self.recall_settings.get('token_budget', 512))
+
+        snippets = []
+        for score, meta in self.index.search(query_vector, top_k, exclude_chat_id):
+            if score < min_score:
+                break
+            snippet = f"[{meta['role']}] {meta['text']}"
+            cost = self.estimate_tokens(snippet)
+            if cost > budget:
+                continue
+            budget -= cost
+            snippets.append(snippet)
+        return snippets
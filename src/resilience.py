@@ -0,0 +1,164 @@
+"""Typed errors, retries and circuit breaking for model requests.
+
+Failures are classified into LLMError subclasses instead of being turned
+into reply text. Transient ones (connection failures, timeouts, overload
+and 5xx responses) are retried with full-jitter exponential backoff;
+anything else fails at once.
+
+A CircuitBreaker per (endpoint URL, model) -- Ollama loads and queues each
+model separately -- opens after ``breaker_failures`` consecutive transient
+failures and fails requests fast for ``breaker_reset`` seconds. After that
+a single trial request is let through: success closes the circuit, failure
+opens it again. An open circuit or an overloaded primary model sends the
+request to the configured fallback model, if any.
+"""
+import time
+import random
+import logging
+import threading
+from typing import Dict, Any, Tuple
+
+logger = logging.getLogger('QuantumChat.Resilience')
+
+
+class LLMError(Exception):
+    """A model request failed; partial holds any text streamed before it did"""
+
+    transient = False
+
+    def __init__(self, message: str, partial: str = ''):
+        super().__init__(message)
+        self.partial = partial
+
+
+class LLMConnectionError(LLMError):
+    transient = True
+
+
+class LLMTimeoutError(LLMError):
+    transient = True
+
+
+class LLMOverloadedError(LLMError):
+    """HTTP 429/503: the server is up but cannot take the request now"""
+
+    transient = True
+
+
+class LLMServerError(LLMError):
+    transient = True
+
+
+class LLMResponseError(LLMError):
+    """The server rejected the request (unknown model, bad parameters, ...)"""
+
+
+class CircuitOpenError(LLMError):
+    """Failing fast while the endpoint's circuit is open"""
+
+
+ERROR_TYPES = {
+    cls.__name__: cls for cls in (
+        LLMError, LLMConnectionError, LLMTimeoutError, LLMOverloadedError,
+        LLMServerError, LLMResponseError, CircuitOpenError
+    )
+}
+
+
+def classify(error: Exception) -> LLMError:
+    """Map an exception from ollama/httpx (or anything else) onto an LLMError"""
+    if isinstance(error, LLMError):
+        return error
+    message = str(error) or type(error).__name__
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status in (429, 503):
+        return LLMOverloadedError(message)
+    if isinstance(status, int) and status >= 500:
+        return LLMServerError(message)
+    if isinstance(status, int) and status >= 400:
+        return LLMResponseError(message)
+
+    # httpx's exception classes are matched by name so it need not be imported here
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if isinstance(error, TimeoutError) or 'TimeoutException' in names:
+        return LLMTimeoutError(message)
+    if isinstance(error, ConnectionError) or names & {'NetworkError', 'ProtocolError', 'TransportError'}:
+        return LLMConnectionError(message)
+    return LLMResponseError(message)
+
+
+class RetryPolicy:
+    def __init__(self, request_settings: Dict[str, Any]):
+        self.max_retries = max(int(request_settings.get('max_retries', 2)), 0)
+        self.base_delay = float(request_settings.get('retry_base_delay', 0.5))
+        self.max_delay = float(request_settings.get('retry_max_delay', 8.0))
+
+    def delay(self, retry: int) -> float:
+        """Full jitter: uniform in [0, min(max_delay, base * 2^retry)]"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let exactly one trial request through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(base_url: str, model: str, request_settings: Dict[str, Any]) -> CircuitBreaker:
+    """The process-wide breaker for a model at an endpoint, with current thresholds"""
+    with _breakers_lock:
+        breaker = _breakers.get((base_url, model))
+        if breaker is None:
+            breaker = _breakers[(base_url, model)] = CircuitBreaker()
+    breaker.failure_threshold = max(int(request_settings.get('breaker_failures', 5)), 1)
+    breaker.reset_timeout = float(request_settings.get('breaker_reset', 30.0))
+    return breaker
+
+
+def client_timeout(request_settings: Dict[str, Any]) -> Tuple[float, float, float, float]:
+    """httpx (connect, read, write, pool) timeout for the Ollama client"""
+    connect = float(request_settings.get('connect_timeout', 5.0))
+    read = float(request_settings.get('read_timeout', 120.0))
+    return (connect, read, read, connect)
@@ -0,0 +1,171 @@
+"""Priority scheduling of model work.
+
+Ollama serves requests from one queue per model, so a background job
+(embedding a batch, titling a chat) that starts just before the user sends
+a message makes the user wait for it. Every request to the model goes
+through an LLMScheduler slot instead:
+
+    INTERACTIVE  replies the user is waiting for; admitted up to their own
+                 concurrency limit regardless of background work
+    BACKGROUND   housekeeping; admitted only while no interactive job is
+                 running or waiting, up to a smaller limit
+
+An interactive job preempts running background jobs: their ticket's
+``preempted`` event is set and they yield at their next check (between
+streamed chunks or batches) and are queued again. A background job that
+has waited ``background_max_wait`` seconds is promoted -- it is admitted
+despite interactive load and is no longer preempted -- so housekeeping
+cannot starve under a steady stream of sends.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger('QuantumChat.Scheduler')
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+
+class Preempted(Exception):
+    """Raised by Ticket.check() when a background job has to yield"""
+
+
+class Ticket:
+    __slots__ = ('priority', 'name', 'enqueued', 'promoted', 'preempted')
+
+    def __init__(self, priority: str, name: str, enqueued: float):
+        self.priority = priority
+        self.name = name
+        self.enqueued = enqueued
+        self.promoted = False
+        self.preempted = threading.Event()
+
+    def check(self) -> None:
+        if self.preempted.is_set():
+            raise Preempted(self.name)
+
+
+class LLMScheduler:
+    def __init__(self, settings: Dict[str, Any]):
+        self._cond = threading.Condition()
+        self._waiting = {INTERACTIVE: deque(), BACKGROUND: deque()}
+        self._running = {INTERACTIVE: set(), BACKGROUND: set()}
+        self.stats = {'interactive': 0, 'background': 0, 'preempted': 0, 'promoted': 0}
+        self.update_settings(settings)
+
+    def update_settings(self, settings: Dict[str, Any]) -> None:
+        scheduler_settings = settings.get('scheduler_settings', {})
+        with self._cond:
+            self.limits = {
+                INTERACTIVE: max(int(scheduler_settings.get('interactive_concurrency', 4)), 1),
+                BACKGROUND: max(int(scheduler_settings.get('background_concurrency', 1)), 1)
+            }
+            self.max_wait = float(scheduler_settings.get('background_max_wait', 30.0))
+            self._cond.notify_all()
+
+    # Admission
+
+    def _admissible(self, ticket: Ticket, now: float) -> bool:
+        priority = ticket.priority
+        if len(self._running[priority]) >= self.limits[priority]:
+            return False
+        if priority == INTERACTIVE:
+            return True
+        # Background work is FIFO within its class
+        if self._waiting[BACKGROUND][0] is not ticket:
+            return False
+        if now - ticket.enqueued >= self.max_wait:
+            if not ticket.promoted:
+                ticket.promoted = True
+                self.stats['promoted'] += 1
+                logger.info(f"Promoting background job {ticket.name} after {now - ticket.enqueued:.0f}s")
+            return True
+        return not self._running[INTERACTIVE] and not self._waiting[INTERACTIVE]
+
+    def _preempt_background(self) -> None:
+        for ticket in self._running[BACKGROUND]:
+            if not ticket.promoted and not ticket.preempted.is_set():
+                ticket.preempted.set()
+                self.stats['preempted'] += 1
+
+    def acquire(self, priority: str, name: str = '', enqueued: Optional[float] = None) -> Ticket:
+        """Block until a slot of this class is free; enqueued keeps a requeued job's age"""
+        ticket = Ticket(priority, name, enqueued if enqueued is not None else time.monotonic())
+        self._admit(ticket, requeued=enqueued is not None)
+        return ticket
+
+    def _admit(self, ticket: Ticket, requeued: bool) -> None:
+        priority = ticket.priority
+        with self._cond:
+            waiting = self._waiting[priority]
+            waiting.append(ticket)
+            if priority == INTERACTIVE:
+                self._preempt_background()
+            elif requeued:
+                # A requeued job keeps its place in line
+                self._waiting[BACKGROUND] = deque(sorted(waiting, key=lambda t: t.enqueued))
+            while True:
+                now = time.monotonic()
+                if self._admissible(ticket, now):
+                    break
+                timeout = None
+                if priority == BACKGROUND:
+                    # Wake up in time to promote an aging job
+                    timeout = max(ticket.enqueued + self.max_wait - now, 0.05)
+                self._cond.wait(timeout)
+            self._waiting[priority].remove(ticket)
+            self._running[priority].add(ticket)
+            self.stats[priority] += 1
+            # The next background job in line may be admissible now
+            self._cond.notify_all()
+
+    def release(self, ticket: Ticket) -> None:
+        with self._cond:
+            self._running[ticket.priority].discard(ticket)
+            self._cond.notify_all()
+
+    @contextmanager
+    def paused(self, ticket: Ticket):
+        """Hand a running ticket's slot back for the duration, e.g. while a retry backs off
+
+        The ticket waits for a slot again afterwards, keeping its place in line.
+        """
+        self.release(ticket)
+        try:
+            yield
+        finally:
+            self._admit(ticket, requeued=True)
+
+    @contextmanager
+    def slot(self, priority: str, name: str = ''):
+        ticket = self.acquire(priority, name)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def run(self, priority: str, job: Callable[[Ticket], Any], name: str = '') -> Any:
+        """Run job(ticket), requeueing it whenever it raises Preempted"""
+        enqueued = time.monotonic()
+        while True:
+            ticket = self.acquire(priority, name, enqueued)
+            try:
+                return job(ticket)
+            except Preempted:
+                logger.debug(f"Background job {name} yielded to interactive work")
+            finally:
+                self.release(ticket)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'interactive_running': len(self._running[INTERACTIVE]),
+                'interactive_waiting': len(self._waiting[INTERACTIVE]),
+                'background_running': len(self._running[BACKGROUND]),
+                'background_waiting': len(self._waiting[BACKGROUND]),
+                **self.stats
+            }
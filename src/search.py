@@ -0,0 +1,532 @@
+import json
+import math
+import queue
+import re
+import heapq
+import bisect
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict, Counter
+from itertools import chain
+from typing import Dict, List, Any, Tuple, Optional, Callable
+
+logger = logging.getLogger('QuantumChat.Search')
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Position used for a chat's name so hits on it sort above message hits
+NAME_INDEX = -1
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in TOKEN_RE.findall(text or '')]
+
+
+class SearchIndex:
+    """Persistent inverted index over chat names and message content.
+
+    Postings map each token to ``{doc: [positions]}`` where a doc is
+    ``"<chat_id>:<message_index>"``. The snapshot stores the postings and
+    document lengths only; each document's terms are rebuilt from them on
+    load. Updates are appended to a journal, and once it grows past
+    ``COMPACT_AFTER`` entries a worker thread folds it into the snapshot.
+    Syncing with the chat store also happens on the worker.
+    """
+
+    INDEX_FILE = 'search_index.json'
+    JOURNAL_FILE = 'search_index.log'
+    # Journal entries already being folded into a snapshot
+    OLD_JOURNAL_FILE = 'search_index.log.old'
+    COMPACT_AFTER = 500
+
+    def __init__(self, index_dir: str = '.'):
+        self.index_path = Path(index_dir) / self.INDEX_FILE
+        self.journal_path = Path(index_dir) / self.JOURNAL_FILE
+        self.old_journal_path = Path(index_dir) / self.OLD_JOURNAL_FILE
+        self.postings: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.chat_docs: Dict[str, set] = defaultdict(set)
+        self.chat_counts: Dict[str, int] = {}
+        self._vocab: List[str] = []
+        self._vocab_dirty = True
+        self._journal_entries = 0
+        self._compact_queued = False
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self.load()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='SearchIndex', daemon=True)
+        self._worker.start()
+
+    # Persistence
+
+    def load(self) -> None:
+        """Load the snapshot and replay the journals"""
+        try:
+            if self.index_path.exists():
+                with open(self.index_path, 'r') as f:
+                    data = json.load(f)
+                if 'postings' in data:
+                    self._load_postings(data['postings'], data.get('lengths', {}))
+                else:
+                    # Snapshots written before postings were stored kept every token list
+                    for doc, tokens in data.get('docs', {}).items():
+                        self._add_doc(doc, tokens)
+                self.chat_counts = data.get('chat_counts', {})
+
+            for journal_path in (self.old_journal_path, self.journal_path):
+                if journal_path.exists():
+                    self._replay(journal_path)
+            logger.info(f"Search index loaded: {len(self.doc_lengths)} documents")
+
+        except Exception as e:
+            logger.error(f"Error loading search index, starting empty: {str(e)}")
+            self._reset()
+
+    def _load_postings(self, postings: Dict[str, Dict[str, List[int]]], lengths: Dict[str, int]) -> None:
+        for token, docs in postings.items():
+            self.postings[token] = docs
+            for doc in docs:
+                self.doc_terms.setdefault(doc, []).append(token)
+        for doc in self.doc_terms:
+            self.doc_lengths[doc] = lengths.get(doc, 0)
+            self.chat_docs[self.split_key(doc)[0]].add(doc)
+        self._vocab_dirty = True
+
+    def _replay(self, journal_path: Path) -> None:
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                    self._journal_entries += 1
+                except ValueError:
+                    # A torn last line from a crash; everything before it is valid
+                    break
+
+    def compact(self) -> None:
+        """Write a fresh snapshot and drop the journal entries it covers
+
+        Only copying the index holds the lock; the snapshot is written while
+        updates go on to a fresh journal.
+        """
+        with self._compact_lock:
+            with self._lock:
+                try:
+                    # Position lists are replaced, never changed in place, so two levels of copy suffice
+                    snapshot = {
+                        'postings': {token: dict(docs) for token, docs in self.postings.items()},
+                        'lengths': dict(self.doc_lengths),
+                        'chat_counts': dict(self.chat_counts)
+                    }
+                    if self.journal_path.exists():
+                        if self.old_journal_path.exists():
+                            # Left over from a failed compaction; keep its entries first
+                            with open(self.old_journal_path, 'a') as old:
+                                old.write(self.journal_path.read_text())
+                            self.journal_path.unlink()
+                        else:
+                            self.journal_path.replace(self.old_journal_path)
+                    self._journal_entries = 0
+                    self._compact_queued = False
+                except Exception as e:
+                    logger.error(f"Error compacting search index: {str(e)}")
+                    return
+            try:
+                tmp_path = self.index_path.with_suffix('.tmp')
+                with open(tmp_path, 'w') as f:
+                    json.dump(dict(snapshot, last_updated=datetime.now().isoformat()), f)
+                tmp_path.replace(self.index_path)
+                if self.old_journal_path.exists():
+                    self.old_journal_path.unlink()
+                logger.info("Search index compacted")
+            except Exception as e:
+                logger.error(f"Error compacting search index: {str(e)}")
+
+    def _log(self, op: Dict[str, Any]) -> None:
+        try:
+            with open(self.journal_path, 'a') as f:
+                f.write(json.dumps(op) + "\n")
+            self._journal_entries += 1
+            if self._journal_entries >= self.COMPACT_AFTER and not self._compact_queued:
+                self._compact_queued = True
+                self._queue.put(('compact',))
+        except Exception as e:
+            logger.error(f"Error writing search journal: {str(e)}")
+
+    def _apply(self, op: Dict[str, Any]) -> None:
+        kind = op['op']
+        if kind == 'set':
+            self._remove_doc(op['doc'])
+            self._add_doc(op['doc'], op['tokens'])
+            if 'count' in op:
+                self.chat_counts[op['chat']] = op['count']
+        elif kind == 'drop':
+            self._drop_chat(op['chat'])
+
+    def _reset(self) -> None:
+        self.postings = defaultdict(dict)
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.chat_docs = defaultdict(set)
+        self.chat_counts = {}
+        self._vocab_dirty = True
+
+    # Index maintenance
+
+    @staticmethod
+    def doc_key(chat_id: str, index: int) -> str:
+        return f"{chat_id}:{index}"
+
+    @staticmethod
+    def split_key(doc: str) -> Tuple[str, int]:
+        chat_id, index = doc.rsplit(':', 1)
+        return chat_id, int(index)
+
+    def _add_doc(self, doc: str, tokens: List[str]) -> None:
+        if not tokens:
+            return
+        positions = defaultdict(list)
+        for position, token in enumerate(tokens):
+            positions[token].append(position)
+        for token, token_positions in positions.items():
+            if token not in self.postings:
+                self._vocab_dirty = True
+            self.postings[token][doc] = token_positions
+        self.doc_terms[doc] = list(positions)
+        self.doc_lengths[doc] = len(tokens)
+        self.chat_docs[self.split_key(doc)[0]].add(doc)
+
+    def _remove_doc(self, doc: str) -> None:
+        terms = self.doc_terms.pop(doc, None)
+        if terms is None:
+            return
+        self.doc_lengths.pop(doc, None)
+        for token in terms:
+            token_postings = self.postings.get(token)
+            if token_postings is None:
+                continue
+            token_postings.pop(doc, None)
+            if not token_postings:
+                del self.postings[token]
+                self._vocab_dirty = True
+        self.chat_docs[self.split_key(doc)[0]].discard(doc)
+
+    def doc_tokens(self, doc: str) -> List[str]:
+        """A document's tokens in order, rebuilt from the postings"""
+        tokens = [''] * self.doc_lengths.get(doc, 0)
+        for token in self.doc_terms.get(doc, ()):
+            for position in self.postings[token][doc]:
+                tokens[position] = token
+        return tokens
+
+    def _drop_chat(self, chat_id: str) -> None:
+        for doc in list(self.chat_docs.pop(chat_id, ())):
+            self._remove_doc(doc)
+        self.chat_docs.pop(chat_id, None)
+        self.chat_counts.pop(chat_id, None)
+
+    def _set(self, chat_id: str, index: int, text: str, count: Optional[int] = None) -> None:
+        op = {'op': 'set', 'chat': chat_id, 'doc': self.doc_key(chat_id, index), 'tokens': tokenize(text)}
+        if count is not None:
+            op['count'] = count
+        self._apply(op)
+        self._log(op)
+
+    def index_message(self, chat_id: str, index: int, content: str) -> None:
+        """Index one message; index is its position in the chat"""
+        with self._lock:
+            self._set(chat_id, index, content, count=max(self.chat_counts.get(chat_id, 0), index + 1))
+
+    def index_chat_name(self, chat_id: str, name: str) -> None:
+        """Index or re-index a chat's name"""
+        with self._lock:
+            self._set(chat_id, NAME_INDEX, name)
+
+    def remove_chat(self, chat_id: str) -> None:
+        """Drop every document belonging to a chat"""
+        with self._lock:
+            op = {'op': 'drop', 'chat': chat_id}
+            self._apply(op)
+            self._log(op)
+
+    def index_chat(self, chat: Dict[str, Any], messages: Optional[List[Any]] = None) -> None:
+        """Re-index a whole chat from scratch"""
+        with self._lock:
+            self._drop_chat(chat['id'])
+            self._log({'op': 'drop', 'chat': chat['id']})
+            self._set(chat['id'], NAME_INDEX, chat.get('name', ''))
+            if messages is None:
+                messages = chat.get('messages', [])
+            for index, msg in enumerate(messages):
+                self._set(chat['id'], index, msg.get('content', ''), count=index + 1)
+            self.chat_counts[chat['id']] = len(messages)
+
+    def sync(self, chats: Dict[str, Dict[str, Any]],
+             load_messages: Optional[Callable[[Dict[str, Any]], List[Any]]] = None) -> None:
+        """Bring the index in line with chats that changed while it was not watching.
+
+        Stale and deleted chats are dropped right away; the stale ones are
+        re-indexed on the worker thread. Chats may be only partly loaded (see
+        paging); load_messages fetches all of a stale chat's messages when
+        given. Messages indexed after this call are kept.
+        """
+        with self._lock:
+            stale = []
+            for chat_id, chat in chats.items():
+                total = chat.get('first_loaded', 0) + len(chat.get('messages', []))
+                if self.chat_counts.get(chat_id) != total:
+                    stale.append((chat, total))
+            removed = [chat_id for chat_id in list(self.chat_counts) if chat_id not in chats]
+
+            for chat_id in removed:
+                self.remove_chat(chat_id)
+            for chat, _ in stale:
+                self.remove_chat(chat['id'])
+        if stale or removed:
+            self._queue.put(('sync', stale, load_messages, len(removed)))
+
+    def _sync(self, stale: List[Tuple[Dict[str, Any], int]], load_messages, removed: int) -> None:
+        for chat, total in stale:
+            chat_id = chat['id']
+            try:
+                messages = load_messages(chat) if load_messages else chat.get('messages', [])
+            except Exception as e:
+                logger.error(f"Could not read chat {chat_id} for search: {str(e)}")
+                continue
+            # One chat at a time, so searches in between are not held up for long
+            with self._lock:
+                for index, msg in enumerate(messages[:total]):
+                    self._set(chat_id, index, msg.get('content', ''))
+                # The name goes last with the count, so a chat cut short by a crash stays stale
+                count = max(self.chat_counts.get(chat_id, 0), total)
+                self._set(chat_id, NAME_INDEX, chat.get('name', ''), count=count)
+        self.compact()
+        logger.info(f"Search index synced: {len(stale)} re-indexed, {removed} removed")
+
+    def join(self) -> None:
+        """Wait until queued syncs and compactions are done"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item[0] == 'sync':
+                    self._sync(item[1], item[2], item[3])
+                elif item[0] == 'compact':
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Search index update failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    # Queries
+
+    def _vocabulary(self) -> List[str]:
+        if self._vocab_dirty:
+            self._vocab = sorted(self.postings)
+            self._vocab_dirty = False
+        return self._vocab
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        vocab = self._vocabulary()
+        start = bisect.bisect_left(vocab, prefix)
+        end = bisect.bisect_left(vocab, prefix + '\uffff')
+        return vocab[start:end]
+
+    @staticmethod
+    def parse_query(query: str) -> List[Tuple[str, List[str]]]:
+        """Split a query into ('phrase', tokens), ('prefix', [p]) and ('term', [t]) clauses"""
+        clauses = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            if phrase:
+                tokens = tokenize(phrase)
+                if len(tokens) > 1:
+                    clauses.append(('phrase', tokens))
+                elif tokens:
+                    clauses.append(('term', tokens))
+            elif word.endswith('*'):
+                tokens = tokenize(word[:-1])
+                clauses.extend(('term', [t]) for t in tokens[:-1])
+                if tokens:
+                    clauses.append(('prefix', tokens[-1:]))
+            else:
+                clauses.extend(('term', [t]) for t in tokenize(word))
+        return clauses
+
+    def _idf(self, token: str) -> float:
+        total = max(len(self.doc_lengths), 1)
+        return math.log(1 + total / (1 + len(self.postings.get(token, ()))))
+
+    def _score_tf(self, doc: str, tf: int) -> float:
+        # BM25-style saturation so long messages do not win by length alone
+        length_norm = self.doc_lengths.get(doc, 1) / 50.0
+        return tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length_norm))
+
+    def _match_clause(self, kind: str, tokens: List[str]) -> Dict[str, float]:
+        if kind == 'term':
+            token = tokens[0]
+            idf = self._idf(token)
+            return {doc: idf * self._score_tf(doc, len(pos))
+                    for doc, pos in self.postings.get(token, {}).items()}
+
+        if kind == 'prefix':
+            scores = defaultdict(float)
+            for token in self._expand_prefix(tokens[0]):
+                idf = self._idf(token)
+                for doc, pos in self.postings[token].items():
+                    scores[doc] = max(scores[doc], idf * self._score_tf(doc, len(pos)))
+            return scores
+
+        # Phrase: intersect on the rarest token, then verify consecutive positions
+        lists = [self.postings.get(token, {}) for token in tokens]
+        if not all(lists):
+            return {}
+        candidates = min(lists, key=len)
+        idf = sum(self._idf(token) for token in tokens)
+        scores = {}
+        for doc in candidates:
+            if not all(doc in postings for postings in lists):
+                continue
+            following = [set(postings[doc]) for postings in lists[1:]]
+            hits = sum(
+                1 for start in lists[0][doc]
+                if all(start + offset + 1 in positions for offset, positions in enumerate(following))
+            )
+            if hits:
+                scores[doc] = idf * self._score_tf(doc, hits)
+        return scores
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return ranked hits as dicts with chat_id, message_index, score and snippet"""
+        with self._lock:
+            clauses = self.parse_query(query)
+            if not clauses:
+                return []
+
+            scores = None
+            for kind, tokens in clauses:
+                clause_scores = self._match_clause(kind, tokens)
+                if scores is None:
+                    scores = dict(clause_scores)
+                else:
+                    scores = {doc: score + clause_scores[doc]
+                              for doc, score in scores.items() if doc in clause_scores}
+                if not scores:
+                    return []
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            results = []
+            for doc, score in ranked:
+                chat_id, index = self.split_key(doc)
+                if index == NAME_INDEX:
+                    score *= 1.5
+                results.append({
+                    'chat_id': chat_id,
+                    'message_index': index,
+                    'score': score,
+                    'snippet': self.snippet(doc, clauses)
+                })
+            results.sort(key=lambda hit: hit['score'], reverse=True)
+            return results
+
+    def snippet(self, doc: str, clauses: List[Tuple[str, List[str]]], width: int = 12) -> str:
+        """A short window of tokens around the first query match"""
+        tokens = self.doc_tokens(doc)
+        first_terms = {tokens_[0] for kind, tokens_ in clauses if kind != 'prefix'}
+        prefixes = tuple(tokens_[0] for kind, tokens_ in clauses if kind == 'prefix')
+        start = 0
+        for position, token in enumerate(tokens):
+            if token in first_terms or (prefixes and token.startswith(prefixes)):
+                start = position
+                break
+        begin = max(start - width // 3, 0)
+        words = tokens[begin:begin + width]
+        prefix = '… ' if begin > 0 else ''
+        suffix = ' …' if begin + width < len(tokens) else ''
+        return prefix + ' '.join(words) + suffix
+
+
+class NameFilter:
+    """In-memory trigram index over chat names for the sidebar filter.
+
+    Each word is padded as ``"  word "`` before taking trigrams, so one- and
+    two-letter queries hit word starts (``"  w"``, ``" wo"``) and longer
+    queries tolerate typos and transpositions. Candidates are ranked by the
+    share of the query's trigrams they contain, with bonuses for exact
+    substring and word-prefix matches.
+    """
+
+    MIN_SCORE = 0.4
+
+    def __init__(self):
+        self.names: Dict[str, str] = {}
+        self.grams: Dict[str, set] = defaultdict(set)
+        self._chat_grams: Dict[str, set] = {}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(tokenize(text))
+
+    @classmethod
+    def trigrams(cls, text: str, open_end: bool = False) -> set:
+        """Trigrams of every word; with open_end the last word may still be growing"""
+        grams = set()
+        words = cls.normalize(text).split()
+        for position, word in enumerate(words):
+            padded = f"  {word}" if open_end and position == len(words) - 1 else f"  {word} "
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    def add(self, chat_id: str, name: str) -> None:
+        """Index a new chat or re-index a renamed one"""
+        self.remove(chat_id)
+        grams = self.trigrams(name)
+        self.names[chat_id] = self.normalize(name)
+        self._chat_grams[chat_id] = grams
+        for gram in grams:
+            self.grams[gram].add(chat_id)
+
+    def remove(self, chat_id: str) -> None:
+        for gram in self._chat_grams.pop(chat_id, ()):
+            postings = self.grams.get(gram)
+            if postings is not None:
+                postings.discard(chat_id)
+                if not postings:
+                    del self.grams[gram]
+        self.names.pop(chat_id, None)
+
+    def rebuild(self, chats: Dict[str, Dict[str, Any]]) -> None:
+        self.names.clear()
+        self.grams.clear()
+        self._chat_grams.clear()
+        for chat_id, chat in chats.items():
+            self.add(chat_id, chat.get('name', ''))
+
+    def search(self, query: str, limit: int = 50) -> List[str]:
+        """Chat ids ranked best first"""
+        # The user is typing, so the last word is matched as a prefix
+        query_grams = self.trigrams(query, open_end=True)
+        if not query_grams:
+            return []
+        normalized = self.normalize(query)
+
+        counts = Counter(chain.from_iterable(self.grams.get(gram, ()) for gram in query_grams))
+
+        scored = []
+        needed = len(query_grams) * self.MIN_SCORE
+        for chat_id, count in counts.items():
+            name = self.names[chat_id]
+            score = count / len(query_grams)
+            if normalized in name:
+                score += 1.0
+                if name.startswith(normalized) or f" {normalized}" in name:
+                    score += 0.5
+            elif count < needed:
+                continue
+            # Shorter names first among equals: "Tax" above "Tax notes 2019"
+            scored.append((-score, len(name), chat_id))
+        return [chat_id for _, _, chat_id in heapq.nsmallest(limit, scored)]
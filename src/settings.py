@@ -1,4 +1,5 @@
 import json
+import copy
 from pathlib import Path
 import logging
 from typing import Dict, Any
@@ -8,6 +9,7 @@ logger = logging.getLogger('QuantumChat.Settings')
 
 class Settings:
     SETTINGS_FILE = 'settings.json'
+    MODELS = ['qwen2.5:14b', 'qwen1.5:14b', 'qwen1.5:7b', 'qwen1.5:4b']
     
     DEFAULT_SETTINGS = {
         'api_url': "http://localhost:11434/v1",
@@ -35,12 +37,78 @@ class Settings:
             'font_size': 13,
             'show_avatars': True,
             'theme': 'cyberpunk',
-            'custom_css': ''
+            'custom_css': '',
+            'message_view': 'canvas'  # or 'text' for a single selectable Text widget
         },
         'backup_settings': {
             'auto_backup': True,
             'backup_interval': 30,  # minutes
             'max_backups': 5
+        },
+        'recall_settings': {
+            'enabled': True,
+            'embedding_backend': 'ollama',  # or 'hashing' for an offline stub
+            'embedding_model': 'nomic-embed-text',
+            'top_k': 4,
+            'token_budget': 512,
+            'min_score': 0.35,
+            'query_timeout': 1.0  # seconds a send waits for the prompt's embedding
+        },
+        'cache_settings': {
+            'max_memory_mb': 64  # loaded chat bodies kept in memory
+        },
+        'request_settings': {
+            'connect_timeout': 5,  # seconds
+            'read_timeout': 120,  # seconds without a byte from Ollama
+            'max_retries': 2,  # for connection errors, timeouts, 429 and 5xx
+            'retry_base_delay': 0.5,
+            'retry_max_delay': 8,
+            'breaker_failures': 5,  # consecutive failures that open a model's circuit
+            'breaker_reset': 30,  # seconds before a trial request
+            'fallback_model': ''  # e.g. a smaller model used when the primary is overloaded
+        },
+        'scheduler_settings': {
+            'interactive_concurrency': 4,  # replies and compare runs at once
+            'background_concurrency': 1,  # embedding batches and other housekeeping
+            'background_max_wait': 30  # seconds before waiting background work is promoted
+        },
+        'checkpoint_settings': {
+            'enabled': True,  # journal streaming replies so a crash doesn't lose them
+            'interval': 2.0,  # seconds between journal writes
+            'max_bytes': 4096  # or sooner once this much text is pending
+        },
+        'logging_settings': {
+            'level': 'INFO',
+            'file': 'quantum_chat.log',
+            'max_bytes': 5 * 1024 * 1024,  # rotate at 5 MB
+            'backup_count': 3,
+            'json': False,  # one JSON object per line instead of plain text
+            'rate_limit': 5,  # INFO messages per second per logger, 0 disables
+            'rate_burst': 20
+        },
+        'archive_settings': {
+            'enabled': True,  # pack chats untouched for inactive_days into chat_archive/
+            'inactive_days': 30
+        },
+        'analytics_settings': {
+            'enabled': True,  # record per-message usage facts in usage_analytics/
+            'dashboard_days': 30
+        },
+        'blob_settings': {
+            'enabled': True,  # keep large message content once in chat_blobs/
+            'threshold': 8192,  # characters
+            'cache_mb': 8  # recently read blobs kept in memory
+        },
+        'engine_settings': {
+            'enabled': False,  # connect to a running engine.py daemon
+            'socket_path': 'engine.sock'
+        },
+        'api_server_settings': {
+            'enabled': False,  # OpenAI-compatible API on localhost
+            'host': '127.0.0.1',
+            'port': 8765,
+            'max_concurrent': 4,
+            'max_waiting': 32
         }
     }
 
@@ -58,12 +126,13 @@ class Settings:
                     return settings
             else:
                 logger.info("No settings file found, creating default settings")
-                cls.save_settings(cls.DEFAULT_SETTINGS)
-                return cls.DEFAULT_SETTINGS
+                settings = copy.deepcopy(cls.DEFAULT_SETTINGS)
+                cls.save_settings(settings)
+                return settings
                 
         except Exception as e:
             logger.error(f"Error loading settings: {str(e)}")
-            return cls.DEFAULT_SETTINGS
+            return copy.deepcopy(cls.DEFAULT_SETTINGS)
 
     @classmethod
     def save_settings(cls, settings: Dict[str, Any]) -> None:
@@ -91,15 +160,17 @@ class Settings:
             raise Exception(f"Failed to save settings: {str(e)}")
 
     @classmethod
-    def _update_missing_settings(cls, settings: Dict[str, Any]) -> None:
+    def _update_missing_settings(cls, settings: Dict[str, Any], defaults: Dict[str, Any] = None) -> None:
         """Recursively update settings with missing default values"""
-        for key, default_value in cls.DEFAULT_SETTINGS.items():
+        if defaults is None:
+            defaults = cls.DEFAULT_SETTINGS
+        for key, default_value in defaults.items():
             if key not in settings:
-                settings[key] = default_value
+                settings[key] = copy.deepcopy(default_value)
             elif isinstance(default_value, dict):
                 if not isinstance(settings[key], dict):
                     settings[key] = {}
-                cls._update_missing_settings(settings[key])
+                cls._update_missing_settings(settings[key], default_value)
 
     @classmethod
     def _cleanup_backups(cls) -> None:
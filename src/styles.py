@@ -4,6 +4,8 @@ from PIL import Image, ImageTk
 import cairosvg
 import io
 
+from markdown_render import plain_text
+
 COLORS = {
     # Main Background Colors
     'bg_main': '#1A1B3E',          # Rich dark blue
@@ -39,8 +41,24 @@ COLORS = {
     'settings_button': '#FF61EF',    # Settings button color
     'settings_slider': '#4A4C9E',    # Settings slider background
     'settings_header': '#FF9ECD',    # Settings header text
+
+    # Markdown Elements
+    'code_bg': '#10112A',            # Code block background
+    'quote_bar': '#94FBFF',          # Blockquote bar
 }
 
+MARKDOWN_FONTS = {
+    'paragraph': ('SF Pro Display', 13),
+    'heading1': ('SF Pro Display', 18, 'bold'),
+    'heading2': ('SF Pro Display', 16, 'bold'),
+    'heading3': ('SF Pro Display', 14, 'bold'),
+    'list_item': ('SF Pro Display', 13),
+    'quote': ('SF Pro Display', 13, 'italic'),
+    'code': ('Courier', 12),
+}
+
+MARKDOWN_BLOCK_SPACING = 8
+
 class Styles:
     @staticmethod
     def load_svg_image(path, size=(24, 24)):
@@ -125,6 +143,21 @@ class Styles:
             padding=(10, 0)
         )
 
+        # Sidebar Search
+        style.configure('Search.TEntry',
+            fieldbackground=COLORS['bg_input'],
+            foreground=COLORS['text_primary'],
+            insertcolor=COLORS['text_primary'],
+            font=('SF Pro Display', 13),
+            padding=(10, 8)
+        )
+        style.configure('SearchSnippet.TLabel',
+            background=COLORS['bg_sidebar'],
+            foreground=COLORS['accent_tertiary'],
+            font=('SF Pro Display', 11),
+            padding=(10, 0)
+        )
+
         # Current Chat Label
         style.configure('CurrentChat.TLabel',
             background=COLORS['bg_chat'],
@@ -272,7 +305,12 @@ class Styles:
 
     @staticmethod
     def create_rounded_rectangle(canvas, x1, y1, x2, y2, radius=20, **kwargs):
-        points = [
+        points = Styles.rounded_rectangle_points(x1, y1, x2, y2, radius)
+        return canvas.create_polygon(points, smooth=True, **kwargs)
+
+    @staticmethod
+    def rounded_rectangle_points(x1, y1, x2, y2, radius=20):
+        return [
             x1 + radius, y1,
             x2 - radius, y1,
             x2, y1,
@@ -286,7 +324,63 @@ class Styles:
             x1, y1 + radius,
             x1, y1
         ]
-        return canvas.create_polygon(points, smooth=True, **kwargs)
+
+    @staticmethod
+    def draw_markdown_blocks(canvas, blocks, x, y, width, tags=()):
+        """Draw parsed Markdown blocks top-down and return the bottom y"""
+        bottom = y
+        for block in blocks:
+            if block.kind == 'code':
+                item = canvas.create_text(
+                    x + 10, y + 6,
+                    text=block.text,
+                    fill=COLORS['text_primary'],
+                    anchor=tk.NW,
+                    width=width - 20,
+                    font=MARKDOWN_FONTS['code'],
+                    tags=tags
+                )
+                bottom = canvas.bbox(item)[3] + 6
+                background = canvas.create_rectangle(
+                    x, y, x + width, bottom,
+                    fill=COLORS['code_bg'],
+                    outline='',
+                    tags=tags
+                )
+                canvas.tag_lower(background, item)
+            else:
+                indent = 0
+                text = plain_text(block.text)
+                font = MARKDOWN_FONTS.get(block.kind, MARKDOWN_FONTS['paragraph'])
+                if block.kind == 'heading':
+                    font = MARKDOWN_FONTS[f'heading{min(block.meta, 3)}']
+                elif block.kind == 'list_item':
+                    bullet = '•' if block.meta in ('-', '*', '+') else block.meta
+                    text = f"{bullet} {text}"
+                    indent = 10
+                elif block.kind == 'quote':
+                    indent = 12
+
+                item = canvas.create_text(
+                    x + indent, y,
+                    text=text,
+                    fill=COLORS['text_primary'],
+                    anchor=tk.NW,
+                    width=width - indent,
+                    font=font,
+                    tags=tags
+                )
+                bottom = canvas.bbox(item)[3]
+                if block.kind == 'quote':
+                    canvas.create_line(
+                        x + 3, y, x + 3, bottom,
+                        fill=COLORS['quote_bar'],
+                        width=3,
+                        tags=tags
+                    )
+
+            y = bottom + MARKDOWN_BLOCK_SPACING
+        return bottom
 
     @staticmethod
     def create_chat_tab(parent, chat_data, icons, commands):
@@ -357,4 +451,29 @@ class Styles:
             icon_label.pack(side=tk.RIGHT, padx=5)
             icon_label.bind('<Button-1>', lambda e, cmd=command: commands[cmd](chat_data['id']))
         
-        return frame
\ No newline at end of file
+        return frame
+
+    @staticmethod
+    def create_search_result(parent, chat_name, snippet, command):
+        frame = ttk.Frame(parent, style='ChatTab.TFrame')
+
+        name_label = ttk.Label(
+            frame,
+            text=chat_name,
+            style='ChatName.TLabel'
+        )
+        name_label.pack(anchor=tk.W, fill=tk.X)
+
+        snippet_label = ttk.Label(
+            frame,
+            text=snippet,
+            style='SearchSnippet.TLabel',
+            wraplength=260
+        )
+        snippet_label.pack(anchor=tk.W, fill=tk.X)
+
+        for widget in (frame, name_label, snippet_label):
+            widget.bind('<Button-1>', lambda e: command())
+            widget.configure(cursor='hand2')
+
+        return frame
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from analytics import UsageRecorder  # noqa: E402
+
+
+class UsageRecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.recorder = UsageRecorder({}, analytics_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def wait_for_rows(self, count):
+        deadline = time.time() + 5
+        while self.recorder.table.count < count and time.time() < deadline:
+            time.sleep(0.01)
+        # Give a wrongly queued extra row the chance to show up
+        time.sleep(0.05)
+
+    def test_sync_then_record_counts_each_message_once(self):
+        chat = {'id': 'c', 'messages': [
+            {'role': 'user', 'content': 'hi', 'timestamp': 1.0},
+            {'role': 'assistant', 'content': 'hello', 'timestamp': 2.0}
+        ]}
+        self.recorder.sync({'c': chat})
+        # A reply recovered after the sync was queued is recorded on its own
+        chat['messages'].append({'role': 'assistant', 'content': 'recovered', 'timestamp': 3.0})
+        self.recorder.record('c', 2, 'assistant', 3.0, len('recovered'), model='m', latency=1.5)
+
+        self.wait_for_rows(3)
+        columns = self.recorder.table.snapshot()
+        self.assertEqual(sorted(columns['index'].tolist()), [0, 1, 2])
+        self.assertEqual(self.recorder.table.chat_counts['c'], 3)
+        self.assertEqual(self.recorder.summary(days=1)['replies'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
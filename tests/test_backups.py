@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils import BackupManager, BackupScheduler  # noqa: E402
+
+
+class BackupTestCase(unittest.TestCase):
+    """Runs in a scratch working directory, since backups track paths relative to it"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        Path('chats').mkdir()
+        self.write('chats/a.json', '{"id": "a"}')
+        self.write('settings.json', '{}')
+        self.manager = BackupManager()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    @staticmethod
+    def write(name, text):
+        Path(name).parent.mkdir(parents=True, exist_ok=True)
+        Path(name).write_text(text)
+
+
+class BackupManagerTest(BackupTestCase):
+    def objects(self):
+        return sorted(p.name for p in self.manager.objects_dir.glob('*/*'))
+
+    def test_restore_round_trip_covers_every_data_dir(self):
+        self.write('chat_pages/a.meta', 'meta v1')
+        self.write('chat_blobs/ab/abcd', 'blob')
+        timestamp = self.manager.create_backup()
+
+        self.write('chats/a.json', '{"id": "a", "name": "changed"}')
+        self.write('chat_pages/a.meta', 'meta v2')
+        self.write('chats/b.json', '{"id": "b"}')
+        self.write('chat_pages/b.meta', 'meta b')
+        self.manager.restore_backup(timestamp)
+
+        self.assertEqual(Path('chats/a.json').read_text(), '{"id": "a"}')
+        self.assertEqual(Path('chat_pages/a.meta').read_text(), 'meta v1')
+        self.assertEqual(Path('chat_blobs/ab/abcd').read_text(), 'blob')
+        self.assertFalse(Path('chats/b.json').exists())
+        self.assertFalse(Path('chat_pages/b.meta').exists())
+
+    def test_snapshots_in_the_same_second_get_their_own_names(self):
+        first = self.manager.create_backup()
+        second = self.manager.create_backup()
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.manager.list_backups(), [first, second])
+
+    def test_prune_sweeps_objects_no_snapshot_uses(self):
+        self.manager.create_backup()
+        self.write('chats/a.json', '{"id": "a", "v": 2}')
+        self.manager.create_backup()
+        self.assertEqual(len(self.objects()), 3)
+
+        self.manager.prune_backups(1)
+        [latest] = self.manager.list_backups()
+        live = sorted(entry['hash'] for entry in self.manager.load_manifest(latest)['files'].values())
+        self.assertEqual(self.objects(), live)
+        self.manager.restore_backup(latest)
+        self.assertEqual(Path('chats/a.json').read_text(), '{"id": "a", "v": 2}')
+
+
+class BackupSchedulerTest(BackupTestCase):
+    def test_run_once_writes_incremental_snapshots_only_on_change(self):
+        scheduler = BackupScheduler(self.manager, {'max_backups': 5})
+        self.assertTrue(scheduler.run_once())
+        self.assertFalse(scheduler.run_once())
+        [timestamp] = self.manager.list_backups()
+        self.assertEqual(sorted(self.manager.load_manifest(timestamp)['files']), ['chats/a.json', 'settings.json'])
+        self.assertEqual(self.manager.list_archives(), [])
+
+    def test_prunes_old_snapshots_to_max_backups(self):
+        for timestamp in ('20200101_000000', '20200102_000000', '20200103_000000'):
+            backup_path = self.manager.backup_dir / f"backup_{timestamp}"
+            backup_path.mkdir()
+            (backup_path / BackupManager.MANIFEST_FILE).write_text(json.dumps({'files': {}}))
+        scheduler = BackupScheduler(self.manager, {'max_backups': 2})
+        self.assertTrue(scheduler.run_once())
+        backups = self.manager.list_backups()
+        self.assertEqual(len(backups), 2)
+        self.assertEqual(backups[0], '20200103_000000')
+
+
+if __name__ == '__main__':
+    unittest.main()
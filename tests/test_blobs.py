@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from blobs import BlobStore  # noqa: E402
+from messages import Message  # noqa: E402
+
+TEXT = 'pasted document ' * 20
+
+
+class BlobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.blob_dir = os.path.join(self.tmp.name, 'chat_blobs')
+        self.store = BlobStore({'blob_settings': {'threshold': 100}}, self.blob_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def blob_files(self):
+        return [p for p in Path(self.blob_dir).glob('*/*')]
+
+    def test_shared_content_is_stored_once_and_kept_until_its_last_reference_goes(self):
+        first = self.store.put('a', TEXT)
+        second = self.store.put('b', TEXT)
+        self.assertEqual(first.digest, second.digest)
+        self.assertEqual(len(self.blob_files()), 1)
+
+        self.store.release('a')
+        self.assertEqual(self.store.get(first.digest), TEXT)
+        self.store.set_refs('b', ())
+        self.assertEqual(self.blob_files(), [])
+        self.assertNotIn(first.digest, self.store.refs)
+
+    def test_references_survive_a_reload(self):
+        ref = self.store.put('a', TEXT)
+        reloaded = BlobStore({}, self.blob_dir)
+        self.assertEqual(reloaded.refs, {ref.digest: {'a'}})
+        reloaded.release('a')
+        self.assertEqual(self.blob_files(), [])
+
+    def test_missing_blob_reads_as_none_and_inline_keeps_the_reference(self):
+        ref = self.store.put('a', TEXT)
+        for path in self.blob_files():
+            path.unlink()
+        store = BlobStore({}, self.blob_dir)
+        self.assertIsNone(store.get(ref.digest))
+
+        chat = {'messages': [{'role': 'user', 'blob': ref.digest, 'size': ref.size}]}
+        self.assertEqual(store.inline(chat)['messages'][0], {'role': 'user', 'blob': ref.digest, 'size': ref.size})
+
+        msg = Message.from_dict(chat['messages'][0], store)
+        self.assertEqual(msg.content, '')
+        self.assertEqual(msg.to_dict()['blob'], ref.digest)
+
+
+if __name__ == '__main__':
+    unittest.main()
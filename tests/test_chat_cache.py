@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from chat_cache import ChatCache  # noqa: E402
+from paging import PagedChatStore, message_total  # noqa: E402
+from messages import Message  # noqa: E402
+
+
+class ChatCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PagedChatStore(os.path.join(self.tmp.name, 'chats'), os.path.join(self.tmp.name, 'chat_pages'))
+        self.chats = {}
+        for chat_id in ('a', 'b', 'c'):
+            self.store.save({
+                'id': chat_id,
+                'name': chat_id,
+                'messages': [Message('user', f"{chat_id} message {i}", float(i)) for i in range(20)]
+            })
+            self.chats[chat_id] = self.store.load_meta(self.store.chat_path(chat_id))
+        self.store.load_tail(self.chats['a'])
+        # Room for two chats but not three
+        self.cache = ChatCache(self.chats, self.store, int(ChatCache.estimate_size(self.chats['a']) * 2.5))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def resident(self):
+        return sorted(chat_id for chat_id, chat in self.chats.items() if chat['messages'])
+
+    def test_least_recently_used_chat_is_evicted_and_reloaded(self):
+        for chat_id in ('a', 'b', 'c'):
+            self.cache.access(self.chats[chat_id])
+        self.assertEqual(self.resident(), ['b', 'c'])
+        evicted = self.chats['a']
+        self.assertEqual(evicted['first_loaded'], 20)
+        self.assertEqual(message_total(evicted), 20)
+
+        self.cache.access(evicted)
+        self.assertEqual([msg.content for msg in evicted['messages']][-1], 'a message 19')
+        self.assertEqual(self.resident(), ['a', 'c'])
+        self.assertEqual(self.cache.stats()['evictions'], 2)
+        self.assertLessEqual(self.cache.resident_bytes, self.cache.max_bytes)
+
+    def test_pinned_chats_are_never_evicted(self):
+        self.cache.access(self.chats['a'])
+        self.cache.pin('a')
+        self.cache.access(self.chats['b'])
+        self.cache.access(self.chats['c'])
+        self.assertEqual(self.resident(), ['a', 'c'])
+
+        self.cache.unpin('a')
+        self.cache.access(self.chats['b'])
+        self.assertEqual(self.resident(), ['b', 'c'])
+
+    def test_without_a_store_nothing_is_evicted(self):
+        cache = ChatCache(self.chats, None, 1)
+        self.assertFalse(cache.enabled)
+        cache.access(self.chats['a'])
+        self.assertEqual(self.resident(), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
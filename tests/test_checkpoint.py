@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import checkpoint  # noqa: E402
+from checkpoint import CheckpointStore  # noqa: E402
+
+
+class CheckpointStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CheckpointStore({'checkpoint_settings': {'interval': 3600, 'max_bytes': 10}},
+                                     os.path.join(self.tmp.name, 'reply_checkpoints'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def journal(self, name, *lines):
+        path = self.store.dir / name
+        path.parent.mkdir(exist_ok=True)
+        header = {'chat_id': 'c', 'prompt_index': 2, 'prefix': 'Once ', 'started': 1.0}
+        path.write_text('\n'.join([json.dumps(header)] + list(lines)) + '\n')
+        return path
+
+    def test_batches_are_journaled_and_recovered_after_a_crash(self):
+        reply = self.store.begin('c', 4, prefix='Hello')
+        reply.add(', wor')
+        self.assertFalse(reply.path.exists())
+        reply.add('ld and more')
+        reply.add(' pending')
+        reply._file.close()  # the process dies without flushing the last batch
+
+        [entry] = self.store.recover()
+        self.assertEqual((entry['chat_id'], entry['prompt_index']), ('c', 4))
+        self.assertEqual(entry['content'], 'Hello, world and more')
+        self.store.remove(entry)
+        self.assertEqual(self.store.recover(), [])
+
+    def test_discard_removes_the_journal(self):
+        reply = self.store.begin('c', 0)
+        reply.add('x' * 20)
+        reply.discard()
+        self.assertFalse(reply.path.exists())
+
+    def test_torn_last_line_keeps_the_batches_before_it(self):
+        self.journal('999999999-1-0-0.journal', json.dumps({'text': 'upon'}), '{"text": " a ti')
+        [entry] = self.store.recover()
+        self.assertEqual(entry['content'], 'Once upon')
+
+    def test_live_writer_is_left_alone_but_a_reused_pid_is_not(self):
+        parent = os.getppid()
+        token = checkpoint._start_token(parent)
+        if token is None:
+            self.skipTest("process start times are not available")
+        live = self.journal(f"{parent}-{token}-0-0.journal", json.dumps({'text': 'a'}))
+        reused = self.journal(f"{parent}-{int(token) + 1}-0-1.journal", json.dumps({'text': 'b'}))
+
+        self.assertEqual([Path(entry['path']) for entry in self.store.recover()], [reused])
+        self.assertTrue(live.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from dispatch import UIDispatcher, concat_chunks  # noqa: E402
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback, *args):
+        self.scheduled.append((ms, callback))
+
+
+class UIDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.root = FakeRoot()
+        self.dispatcher = UIDispatcher(self.root)
+        self.calls = []
+
+    def record(self, *args):
+        self.calls.append(args)
+
+    def test_chunks_for_one_target_coalesce_in_order(self):
+        for chunk in ('Hel', 'lo', ', world'):
+            self.dispatcher.post(self.record, 'chat-1', chunk, key=('reply_chunk', 'chat-1'), merge=concat_chunks)
+        self.dispatcher.post(self.record, 'chat-2', 'other', key=('reply_chunk', 'chat-2'), merge=concat_chunks)
+        self.dispatcher.post(self.record, 'done')
+        self.assertEqual(self.dispatcher.pending(), 3)
+
+        self.assertEqual(self.dispatcher.drain(), 3)
+        self.assertEqual(self.calls, [('chat-1', 'Hello, world'), ('chat-2', 'other'), ('done',)])
+        self.assertEqual(self.dispatcher.stats['merged'], 2)
+
+    def test_keyed_post_without_merge_keeps_the_latest(self):
+        self.dispatcher.post(self.record, 1, key='status')
+        self.dispatcher.post(self.record, 2, key='status')
+        self.dispatcher.drain()
+        self.assertEqual(self.calls, [(2,)])
+
+    def test_work_beyond_the_budget_waits_for_the_next_tick(self):
+        for i in range(5):
+            self.dispatcher.post(lambda i=i: (self.calls.append(i), time.sleep(0.01)))
+        self.assertEqual(self.dispatcher.drain(budget=0.015), 2)
+        self.assertEqual(self.dispatcher.stats['deferred_ticks'], 1)
+        self.assertEqual(self.dispatcher.drain(budget=1.0), 3)
+        self.assertEqual(self.calls, [0, 1, 2, 3, 4])
+
+    def test_failing_callback_does_not_stop_the_pump(self):
+        self.dispatcher.post(lambda: 1 / 0)
+        self.dispatcher.post(self.record, 'after')
+        self.dispatcher.start()
+        _, pump = self.root.scheduled[-1]
+        pump()
+        self.assertEqual(self.calls, [('after',)])
+        self.assertEqual(self.dispatcher.stats['errors'], 1)
+        # The pump reschedules itself
+        self.assertEqual(len(self.root.scheduled), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import gzip
+import json
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from export import ChatExporter, guess_format  # noqa: E402
+from paging import PagedChatStore  # noqa: E402
+from archive import ChatArchive  # noqa: E402
+from blobs import BlobStore  # noqa: E402
+from messages import Message  # noqa: E402
+
+LONG = 'a long pasted document ' * 10
+
+
+class ChatExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dirs = {name: os.path.join(self.tmp.name, name)
+                     for name in ('chats', 'chat_archive', 'chat_blobs', 'chat_pages')}
+        blobs = BlobStore({'blob_settings': {'threshold': 100}}, self.dirs['chat_blobs'])
+        store = PagedChatStore(self.dirs['chats'], self.dirs['chat_pages'],
+                               archive=ChatArchive(self.dirs['chat_archive']), blobs=blobs)
+        # A favorite with a regenerated reply; the first reply is the active branch
+        store.save({
+            'id': 'a', 'name': 'Branched', 'timestamp': '2024-01-01T10:00:00',
+            'is_favorite': True, 'branched': True, 'active_leaf': 1,
+            'messages': [Message('user', 'question', 1.0), Message('assistant', 'first reply', 2.0),
+                         Message('assistant', 'second reply', 3.0, parent=0)]
+        })
+        # An archived chat whose content lives in the blob store
+        store.save({
+            'id': 'b', 'name': 'Archived', 'timestamp': '2025-06-01T10:00:00',
+            'messages': [Message('user', LONG, 1.0)]
+        })
+        chats = {chat_id: store.load_meta(store.chat_path(chat_id)) for chat_id in ('a', 'b')}
+        self.assertEqual(store.archive_idle(chats, -1, keep={'a'}), ['b'])
+        self.exporter = ChatExporter(self.dirs['chats'], self.dirs['chat_archive'],
+                                     self.dirs['chat_blobs'], self.dirs['chat_pages'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def output(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_jsonl_includes_archived_chats_with_blobs_inlined(self):
+        path = self.output('chats.jsonl.gz')
+        self.assertEqual(self.exporter.export(path, **guess_format(path)), 2)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            chats = {chat['id']: chat for chat in map(json.loads, f)}
+
+        self.assertEqual(chats['a']['active_leaf'], 1)
+        self.assertEqual(len(chats['a']['messages']), 3)
+        self.assertEqual(chats['b']['messages'][0]['content'], LONG)
+        self.assertNotIn('blob', chats['b']['messages'][0])
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+    def test_markdown_shows_only_the_active_branch_of_favorites(self):
+        path = self.output('favorites.md')
+        self.assertEqual(guess_format(path), {'fmt': 'markdown', 'compress': False})
+        self.assertEqual(self.exporter.export(path, fmt='markdown', favorites_only=True), 1)
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        self.assertIn('# Branched', text)
+        self.assertIn('first reply', text)
+        self.assertNotIn('second reply', text)
+
+    def test_date_filters(self):
+        ids = [chat['id'] for chat in self.exporter.iter_chats(since=datetime(2025, 1, 1))]
+        self.assertEqual(ids, ['b'])
+        ids = [chat['id'] for chat in self.exporter.iter_chats(until=datetime(2025, 1, 1))]
+        self.assertEqual(ids, ['a'])
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.exporter.export(self.output('chats.txt'), fmt='txt')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from scheduler import LLMScheduler, INTERACTIVE  # noqa: E402
+from resilience import RetryPolicy  # noqa: E402
+
+try:
+    from llm import LLM, ClientPool  # noqa: E402
+except ImportError as e:  # llm needs the langchain packages
+    raise unittest.SkipTest(f"llm dependencies missing: {e}")
+
+
+def settings_for(model, **request_settings):
+    request_settings.setdefault('retry_base_delay', 0.0)
+    return {
+        'api_url': 'http://127.0.0.1:9',
+        'model_settings': {'model': model},
+        'request_settings': request_settings
+    }
+
+
+class CallWithRetriesTest(unittest.TestCase):
+    def test_settings_change_mid_request_keeps_the_starting_config(self):
+        llm = LLM(settings_for('first'), pool=ClientPool())
+        started_with = llm.llm
+        clients = []
+
+        def request(client):
+            clients.append(client)
+            if len(clients) == 1:
+                llm.update_settings(settings_for('second'))
+                raise ConnectionError("dropped")
+
+        self.assertEqual(llm.call_with_retries(request), 'first')
+        self.assertEqual(clients, [started_with, started_with])
+        self.assertEqual(llm.model, 'second')
+
+    def test_backoff_hands_the_scheduler_slot_back(self):
+        scheduler = LLMScheduler({'scheduler_settings': {'interactive_concurrency': 1}})
+        llm = LLM(settings_for('m'), pool=ClientPool(), scheduler=scheduler)
+        events = []
+
+        def request(client):
+            events.append('attempt')
+            if len(events) == 1:
+                # Needs the only interactive slot, which the backoff should free
+                other = threading.Thread(target=scheduler.run, args=(INTERACTIVE, lambda t: events.append('other')))
+                other.start()
+                raise ConnectionError("dropped")
+
+        with mock.patch.object(RetryPolicy, 'delay', return_value=0.2):
+            scheduler.run(INTERACTIVE, lambda ticket: llm.call_with_retries(request, ticket))
+        self.assertEqual(events, ['attempt', 'other', 'attempt'])
+        self.assertEqual(scheduler.snapshot()['interactive_running'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from markdown_render import IncrementalMarkdown, parse_blocks  # noqa: E402
+
+
+SAMPLE = (
+    "# Title\nsome text\nmore\n\n```python\nx = 1\n\ny = 2\n```\n- a\n- b\n"
+    "> q\n> r\n\n~~~\nnot ``` closed\n~~~\ntail para"
+)
+
+
+class IncrementalMarkdownTest(unittest.TestCase):
+    def assert_streams_like_full_parse(self, text, size):
+        renderer = IncrementalMarkdown()
+        for pos in range(0, len(text), size):
+            renderer.feed(text[pos:pos + size])
+            streamed = text[:pos + size]
+            self.assertEqual(renderer.render(), parse_blocks(streamed.split('\n'), final=True)[0])
+
+    def test_matches_full_parse(self):
+        for size in (1, 2, 3, 7, 64):
+            self.assert_streams_like_full_parse(SAMPLE, size)
+            self.assert_streams_like_full_parse("```\nopen\nfence\n", size)
+            self.assert_streams_like_full_parse("```\n```\n```\na\n", size)
+
+    def test_open_fence_only_grows(self):
+        renderer = IncrementalMarkdown()
+        renderer.feed("intro\n\n```sh\n")
+        language, lines, partial = renderer.open_fence()
+        self.assertEqual((language, lines, partial), ('sh', [], ''))
+        for i in range(100):
+            renderer.feed(f"echo {i}\n")
+        self.assertIs(renderer.open_fence()[1], lines)
+        self.assertEqual(len(lines), 100)
+
+        renderer.feed("``")
+        self.assertEqual(renderer.open_fence()[2], '``')
+        renderer.feed("`\nafter\n\n")
+        self.assertIsNone(renderer.open_fence())
+        self.assertEqual([block.kind for block in renderer.blocks], ['paragraph', 'code', 'paragraph'])
+        self.assertEqual(renderer.blocks[1].text, '\n'.join(f"echo {i}" for i in range(100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import copy
+import json
+import http.client
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+try:
+    from mock_ollama import MockOllamaServer  # noqa: E402
+    from loadtest import LoadTest  # noqa: E402
+    from settings import Settings  # noqa: E402
+except ImportError as e:  # recall and llm need the langchain packages
+    raise unittest.SkipTest(f"mock server dependencies missing: {e}")
+
+
+class MockOllamaTestCase(unittest.TestCase):
+    server_options = {}
+
+    def setUp(self):
+        options = dict(port=0, token_rate=0, latency=0, jitter=0, reply_tokens=5, seed=1)
+        options.update(self.server_options)
+        self.server = MockOllamaServer(**options)
+        self.server.start_in_thread()
+
+    def tearDown(self):
+        self.server.shutdown()
+
+    def request(self, method, path, payload=None):
+        connection = http.client.HTTPConnection(self.server.host, self.server.port, timeout=5)
+        try:
+            body = json.dumps(payload).encode() if payload is not None else None
+            connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def chat(self, prompt, stream=True):
+        return self.request('POST', '/api/chat', {
+            'model': 'qwen2.5:14b',
+            'messages': [{'role': 'user', 'content': prompt}],
+            'stream': stream
+        })
+
+
+class MockOllamaServerTest(MockOllamaTestCase):
+    def test_streamed_replies_echo_the_prompt_and_end_with_done(self):
+        for prompt in ('alpha beta gamma delta', 'one two three four'):
+            status, body = self.chat(prompt)
+            self.assertEqual(status, 200)
+            chunks = [json.loads(line) for line in body.splitlines()]
+            self.assertTrue(chunks[-1]['done'])
+            self.assertEqual(chunks[-1]['eval_count'], 8)
+            text = ''.join(chunk['message']['content'] for chunk in chunks[:-1])
+            self.assertEqual(text.split()[:3], prompt.split()[:3])
+            self.assertEqual(len(text.split()), 8)
+        self.assertEqual(self.server.stats, {'requests': 2, 'failed': 0, 'cut': 0, 'tokens': 16})
+
+    def test_unstreamed_reply_tags_and_embeddings(self):
+        status, body = self.chat('hello there', stream=False)
+        self.assertEqual(status, 200)
+        reply = json.loads(body)
+        self.assertTrue(reply['done'])
+        self.assertTrue(reply['message']['content'].startswith('hello there '))
+
+        status, body = self.request('GET', '/api/tags')
+        self.assertEqual([model['name'] for model in json.loads(body)['models']], ['qwen2.5:14b'])
+
+        status, body = self.request('POST', '/api/embed', {'model': 'embed', 'input': ['a', 'b']})
+        embeddings = json.loads(body)['embeddings']
+        self.assertEqual(status, 200)
+        self.assertEqual([len(vector) for vector in embeddings], [64, 64])
+
+
+class InjectedFailureTest(MockOllamaTestCase):
+    server_options = {'fail_rate': 1.0}
+
+    def test_failures_are_answered_with_500(self):
+        for _ in range(3):
+            status, body = self.chat('anything')
+            self.assertEqual(status, 500)
+            self.assertEqual(json.loads(body)['error'], 'injected failure')
+        self.assertEqual(self.server.stats['failed'], 3)
+
+
+class LoadTestTest(MockOllamaTestCase):
+    def test_every_streamed_character_reaches_the_renderer(self):
+        settings = copy.deepcopy(Settings.DEFAULT_SETTINGS)
+        settings['model_settings']['model'] = self.server.models[0]
+        settings['api_url'] = self.server.url
+        report = LoadTest(settings, clients=3, requests=2).run()
+
+        self.assertEqual(report['replies'], 6)
+        self.assertEqual(report['failed'], 0)
+        self.assertEqual(report['dropped'], {'replies': 0, 'chars': 0})
+        self.assertEqual(self.server.stats['requests'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
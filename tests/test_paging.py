@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from paging import PagedChatStore, message_total  # noqa: E402
+from archive import ChatArchive  # noqa: E402
+from messages import Message  # noqa: E402
+
+
+class PartialSaveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PagedChatStore(
+            chat_dir=os.path.join(self.tmp.name, 'chats'),
+            index_dir=os.path.join(self.tmp.name, 'chat_pages')
+        )
+        self.store.save({
+            'id': 'long',
+            'name': 'Long chat',
+            'messages': [Message('user', f"message {i}", float(i)) for i in range(120)]
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def reload(self):
+        chat = self.store.load_meta(self.store.chat_path('long'))
+        self.store.load_tail(chat, 1000)
+        return chat
+
+    def assert_intact(self, chat, count):
+        with open(self.store.chat_path('long'), 'r') as f:
+            on_disk = json.load(f)['messages']
+        self.assertEqual(len(on_disk), count)
+        self.assertEqual([msg['content'] for msg in on_disk], [msg.content for msg in chat['messages']])
+        self.assertEqual(message_total(chat), count)
+
+    def test_rename_with_tail_loaded(self):
+        chat = self.store.load_meta(self.store.chat_path('long'))
+        self.store.load_tail(chat)
+        self.assertEqual(chat['first_loaded'], 70)
+        chat['name'] = 'Renamed'
+        self.store.save(chat)
+
+        reloaded = self.reload()
+        self.assertEqual(reloaded['name'], 'Renamed')
+        self.assertEqual([msg.content for msg in reloaded['messages']], [f"message {i}" for i in range(120)])
+        self.assert_intact(reloaded, 120)
+
+    def test_save_with_nothing_loaded(self):
+        chat = self.store.load_meta(self.store.chat_path('long'))
+        chat['name'] = 'Evicted'
+        self.store.save(chat)
+        self.assert_intact(self.reload(), 120)
+
+    def test_append_after_partial_save(self):
+        chat = self.store.load_meta(self.store.chat_path('long'))
+        self.store.load_tail(chat)
+        chat['is_favorite'] = True
+        self.store.save(chat)
+        chat['messages'].append(Message('assistant', 'reply', 200.0))
+        self.store.append_message(chat, chat['messages'][-1])
+
+        reloaded = self.reload()
+        self.assertEqual(reloaded['messages'][-1].content, 'reply')
+        self.assert_intact(reloaded, 121)
+
+    def test_active_leaf_only_touches_meta(self):
+        chat = self.store.load_meta(self.store.chat_path('long'))
+        self.store.load_tail(chat)
+        with open(self.store.chat_path('long'), 'rb') as f:
+            before = f.read()
+        chat['active_leaf'] = 100
+        self.store.save_active_leaf(chat)
+        with open(self.store.chat_path('long'), 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(self.reload()['active_leaf'], 100)
+
+        # Appending makes the new message the leaf again
+        chat.pop('active_leaf')
+        chat['messages'].append(Message('assistant', 'reply', 200.0))
+        self.store.append_message(chat, chat['messages'][-1])
+        self.assertNotIn('active_leaf', self.reload())
+
+
+class ArchivedChatTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.archive = ChatArchive(os.path.join(self.tmp.name, 'chat_archive'))
+        # Small frames so a page spans several of them
+        self.archive.FRAME_SIZE = 256
+        self.store = PagedChatStore(
+            chat_dir=os.path.join(self.tmp.name, 'chats'),
+            index_dir=os.path.join(self.tmp.name, 'chat_pages'),
+            archive=self.archive
+        )
+        self.chats = {}
+        for chat_id, count in (('old', 120), ('big', 400)):
+            self.store.save({
+                'id': chat_id,
+                'name': f"{chat_id} chat",
+                'messages': [Message('user', f"message {i}", float(i)) for i in range(count)]
+            })
+            self.chats[chat_id] = self.store.load_meta(self.store.chat_path(chat_id))
+        self.assertEqual(sorted(self.store.archive_idle(self.chats, -1)), ['big', 'old'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def contents(self, start, stop):
+        return [msg.content for msg in self.store.read_messages('old', start, stop)]
+
+    def test_pages_are_read_from_the_pack(self):
+        self.assertFalse(self.store.chat_path('old').exists())
+        self.assertTrue(self.archive.pageable('old'))
+        self.assertGreater(len(self.archive.entries['old']['frames']), 10)
+        self.assertEqual(self.contents(70, 120), [f"message {i}" for i in range(70, 120)])
+        self.assertEqual(self.contents(0, 1), ['message 0'])
+        self.assertEqual(self.contents(119, 500), ['message 119'])
+        self.assertEqual(self.archive.inflate('old')['name'], 'old chat')
+
+    def test_compacted_pack_still_pages(self):
+        pack = self.archive.entries['old']['pack']
+        self.store.delete('big')
+        self.archive.compact()
+        self.assertNotEqual(self.archive.entries['old']['pack'], pack)
+        self.assertEqual(self.contents(0, 120), [f"message {i}" for i in range(120)])
+
+    def test_write_restores_the_hot_file(self):
+        chat = self.chats['old']
+        self.store.load_tail(chat)
+        chat['messages'].append(Message('assistant', 'reply', 200.0))
+        self.store.append_message(chat, chat['messages'][-1])
+
+        self.assertNotIn('old', self.archive)
+        with open(self.store.chat_path('old'), 'r') as f:
+            on_disk = json.load(f)
+        self.assertEqual(on_disk['name'], 'old chat')
+        self.assertEqual([msg['content'] for msg in on_disk['messages']],
+                         [f"message {i}" for i in range(120)] + ['reply'])
+        self.assertEqual(self.contents(118, 121), ['message 118', 'message 119', 'reply'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+try:
+    from recall import RecallService, VectorIndex, EmbeddingModelMissing  # noqa: E402
+except ImportError as e:  # llm needs the langchain packages
+    raise unittest.SkipTest(f"recall dependencies missing: {e}")
+
+
+class SlowEmbedder:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class VectorIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_search_excludes_chat(self):
+        index = VectorIndex(self.tmp.name)
+        index.add(np.eye(3, dtype=np.float32), [
+            {'chat_id': chat_id, 'message_index': 0, 'role': 'user', 'text': chat_id}
+            for chat_id in ('a', 'b', 'c')
+        ])
+        query = np.array([1.0, 0.9, 0.0], dtype=np.float32)
+        self.assertEqual([m['chat_id'] for _, m in index.search(query, 2)], ['a', 'b'])
+        self.assertEqual([m['chat_id'] for _, m in index.search(query, 2, exclude_chat_id='a')], ['b', 'c'])
+
+    def test_segments_reload_and_remove(self):
+        index = VectorIndex(self.tmp.name)
+        for batch in range(3):
+            index.add(np.random.rand(2, 4), [{'chat_id': f"c{batch}", 'message_index': i} for i in range(2)])
+            index.save()
+        reloaded = VectorIndex(self.tmp.name)
+        self.assertEqual(reloaded.count, 6)
+        self.assertTrue(np.allclose(reloaded.vectors, index.vectors))
+
+        reloaded.remove_chat('c1')
+        reloaded.save()
+        again = VectorIndex(self.tmp.name)
+        self.assertEqual(sorted({m['chat_id'] for m in again.meta}), ['c0', 'c2'])
+        self.assertEqual(len(again.search(np.ones(4), 10, exclude_chat_id='c0')), 2)
+
+
+class RecallServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.service = RecallService(
+            {'recall_settings': {'embedding_backend': 'hashing', 'query_timeout': 0.1, 'min_score': 0.0}},
+            index_dir=self.tmp.name
+        )
+        self.service.index.add(np.ones((1, 4), dtype=np.float32), [
+            {'chat_id': 'old', 'message_index': 0, 'role': 'user', 'text': 'earlier'}
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_slow_embedding_skips_recall_then_is_cached(self):
+        embedder = self.service.embedder = SlowEmbedder(delay=0.3)
+        started = time.monotonic()
+        self.assertEqual(self.service.recall('prompt'), [])
+        self.assertLess(time.monotonic() - started, 0.25)
+
+        deadline = time.time() + 2
+        while 'prompt' not in self.service._query_cache and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.service.recall('prompt'), ['[user] earlier'])
+        self.assertEqual(embedder.calls, 1)
+
+    def test_missing_model_turns_recall_off(self):
+        embedder = self.service.embedder = SlowEmbedder(error=EmbeddingModelMissing('no model'))
+        self.assertEqual(self.service.recall('prompt'), [])
+        self.assertFalse(self.service.enabled)
+        self.assertEqual(self.service.recall('again'), [])
+        self.assertEqual(embedder.calls, 1)
+
+    def test_concurrent_sends_share_one_embedding(self):
+        embedder = self.service.embedder = SlowEmbedder(delay=0.05)
+        threads = [threading.Thread(target=self.service.recall, args=('same',)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(embedder.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
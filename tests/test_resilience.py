@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from resilience import (  # noqa: E402
+    CircuitBreaker, RetryPolicy, classify,
+    LLMConnectionError, LLMOverloadedError, LLMServerError, LLMResponseError, LLMTimeoutError
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TimeoutException(Exception):
+    """Stands in for httpx.TimeoutException, which is matched by name"""
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_transient_and_permanent_errors(self):
+        self.assertIsInstance(classify(StatusError(503)), LLMOverloadedError)
+        self.assertIsInstance(classify(StatusError(502)), LLMServerError)
+        self.assertIsInstance(classify(ConnectionRefusedError()), LLMConnectionError)
+        self.assertIsInstance(classify(TimeoutException()), LLMTimeoutError)
+        error = classify(StatusError(404))
+        self.assertIsInstance(error, LLMResponseError)
+        self.assertFalse(error.transient)
+
+    def test_retry_delay_is_capped(self):
+        policy = RetryPolicy({'retry_base_delay': 1.0, 'retry_max_delay': 3.0})
+        self.assertTrue(all(0 <= policy.delay(retry) <= 3.0 for retry in range(10)))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_threshold_and_recovers_through_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        # Only one trial request at a time
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from scheduler import LLMScheduler, INTERACTIVE, BACKGROUND  # noqa: E402
+
+
+def scheduler_with(**scheduler_settings):
+    return LLMScheduler({'scheduler_settings': scheduler_settings})
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+class LLMSchedulerTest(unittest.TestCase):
+    def test_interactive_preempts_background_which_is_requeued(self):
+        scheduler = scheduler_with(background_max_wait=60)
+        events = []
+        running = threading.Event()
+
+        def background_job(ticket):
+            events.append('background start')
+            running.set()
+            while True:
+                ticket.check()
+                if len(events) > 2:
+                    return 'background done'
+                time.sleep(0.005)
+
+        results = []
+        worker = threading.Thread(target=lambda: results.append(scheduler.run(BACKGROUND, background_job, 'embed')))
+        worker.start()
+        running.wait(1)
+        scheduler.run(INTERACTIVE, lambda ticket: events.append('interactive'), 'reply')
+        worker.join(2)
+
+        self.assertEqual(events, ['background start', 'interactive', 'background start'])
+        self.assertEqual(results, ['background done'])
+        self.assertEqual(scheduler.stats['preempted'], 1)
+
+    def test_background_waits_for_interactive_until_promoted(self):
+        scheduler = scheduler_with(background_max_wait=0.2)
+        release = threading.Event()
+        interactive = threading.Thread(target=scheduler.run, args=(INTERACTIVE, lambda t: release.wait(2)))
+        interactive.start()
+        self.assertTrue(wait_until(lambda: scheduler.snapshot()['interactive_running'] == 1))
+
+        started = time.monotonic()
+        ticket = scheduler.acquire(BACKGROUND, 'title')
+        waited = time.monotonic() - started
+        self.assertGreaterEqual(waited, 0.15)
+        self.assertTrue(ticket.promoted)
+        # A promoted job is no longer preempted by new interactive work
+        scheduler.release(scheduler.acquire(INTERACTIVE))
+        self.assertFalse(ticket.preempted.is_set())
+        scheduler.release(ticket)
+        release.set()
+        interactive.join(2)
+
+    def test_paused_ticket_frees_its_slot(self):
+        scheduler = scheduler_with(interactive_concurrency=1)
+        ticket = scheduler.acquire(INTERACTIVE)
+        with scheduler.paused(ticket):
+            other = scheduler.acquire(INTERACTIVE)
+            scheduler.release(other)
+        self.assertEqual(scheduler.snapshot()['interactive_running'], 1)
+        scheduler.release(ticket)
+        self.assertEqual(scheduler.snapshot()['interactive_running'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
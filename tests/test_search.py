@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from search import SearchIndex, NameFilter, NAME_INDEX  # noqa: E402
+
+
+def make_chat(chat_id, name, contents):
+    return {'id': chat_id, 'name': name, 'messages': [{'role': 'user', 'content': c} for c in contents]}
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.chats = {
+            'a': make_chat('a', 'Travel plans', ['Book the train to Lisbon', 'hotel near the old town']),
+            'b': make_chat('b', 'Cooking', ['old family recipe for bread', 'train the sourdough starter'])
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def synced_index(self):
+        index = SearchIndex(self.tmp.name)
+        index.sync(self.chats)
+        index.join()
+        return index
+
+    def hits(self, index, query):
+        return [(hit['chat_id'], hit['message_index']) for hit in index.search(query)]
+
+    def test_sync_then_query(self):
+        index = self.synced_index()
+        self.assertEqual(sorted(self.hits(index, 'train')), [('a', 0), ('b', 1)])
+        self.assertEqual(self.hits(index, '"old town"'), [('a', 1)])
+        self.assertEqual(self.hits(index, 'sourd*'), [('b', 1)])
+        self.assertEqual(self.hits(index, 'travel'), [('a', NAME_INDEX)])
+        self.assertEqual(index.search('lisbon')[0]['snippet'], 'book the train to lisbon')
+        self.assertEqual(index.chat_counts, {'a': 2, 'b': 2})
+
+    def test_snapshot_keeps_postings_not_token_lists(self):
+        index = self.synced_index()
+        index.index_message('a', 2, 'one more train ride')
+        index.compact()
+        with open(index.index_path) as f:
+            snapshot = json.load(f)
+        self.assertNotIn('docs', snapshot)
+        self.assertEqual(snapshot['postings']['ride'], {'a:2': [3]})
+
+        reloaded = SearchIndex(self.tmp.name)
+        self.assertEqual(self.hits(reloaded, '"train ride"'), [('a', 2)])
+        self.assertEqual(reloaded.doc_tokens('a:2'), ['one', 'more', 'train', 'ride'])
+        self.assertEqual(reloaded.chat_counts['a'], 3)
+
+    def test_journal_is_compacted_on_the_worker(self):
+        index = self.synced_index()
+        index.COMPACT_AFTER = 5
+        for i in range(2, 8):
+            index.index_message('b', i, f"note {i}")
+        index.join()
+        self.assertLess(index._journal_entries, index.COMPACT_AFTER)
+        self.assertFalse(index.old_journal_path.exists())
+        self.assertEqual(self.hits(SearchIndex(self.tmp.name), 'note'), self.hits(index, 'note'))
+
+    def test_sync_keeps_messages_indexed_meanwhile_and_drops_deleted_chats(self):
+        index = self.synced_index()
+        self.chats['a']['messages'].append({'role': 'user', 'content': 'ferry tickets'})
+        del self.chats['b']
+        index.sync(self.chats)
+        # Indexed live while the sync is still queued
+        index.index_message('a', 3, 'ferry back home')
+        index.join()
+        self.assertEqual(sorted(self.hits(index, 'ferry')), [('a', 2), ('a', 3)])
+        self.assertEqual(self.hits(index, 'sourdough'), [])
+        self.assertEqual(index.chat_counts, {'a': 4})
+
+
+class NameFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.names = NameFilter()
+        self.names.rebuild({
+            'tax': {'name': 'Tax'},
+            'notes': {'name': 'Tax notes 2019'},
+            'python': {'name': 'Python asyncio questions'},
+            'syntax': {'name': 'Syntax highlighting'}
+        })
+
+    def test_prefix_while_typing(self):
+        self.assertEqual(self.names.search('py'), ['python'])
+        self.assertEqual(self.names.search('python asy'), ['python'])
+
+    def test_shorter_names_rank_first_among_equal_matches(self):
+        self.assertEqual(self.names.search('tax')[:2], ['tax', 'notes'])
+
+    def test_typos_still_match(self):
+        self.assertEqual(self.names.search('asyncoi')[:1], ['python'])
+        self.assertEqual(self.names.search('zzzz'), [])
+
+    def test_rename_and_remove(self):
+        self.names.add('tax', 'Receipts')
+        self.assertNotIn('tax', self.names.search('tax'))
+        self.assertEqual(self.names.search('rece'), ['tax'])
+        self.names.remove('tax')
+        self.assertEqual(self.names.search('rece'), [])
+        self.assertFalse(any('tax' in postings for postings in self.names.grams.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()